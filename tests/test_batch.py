@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import click
+from xtoolCli.batch import BatchRunner, planBatch, readScript
+from xtoolCli.cli import cliShell, openDB
+
+class t_batch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.deploy = os.path.join(self.folder, "deploy")
+        os.makedirs(self.deploy)
+        for name in ("a", "b", "c"):
+            root = os.path.join(self.folder, name)
+            os.makedirs(os.path.join(root, "bin"))
+            with open(os.path.join(root, "xtool.json"), "w") as f:
+                json.dump({"version" : "1"}, f)
+            with open(os.path.join(root, "bin", name + ".bin"), "wb") as f:
+                f.write(os.urandom(4096))
+
+        self.db = openDB(self.deploy, None)
+
+    def tearDown(self) -> None:
+        self.db.trash.close()
+        self.db.engine.dispose()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def script(self, text : str):
+        return readScript(io.StringIO(text.replace("$", self.folder)), cliShell)
+
+    def test_plan(self):
+        ops = self.script(
+            "# provision\n"
+            "parse $/a $/b\n"
+            "parse $/c\n"
+            "install a b\n"
+            "install c  # last\n"
+            "install a\n"
+            "verify --all\n"
+        )
+        self.assertEqual([x.lineno for x in ops], [2, 3, 4, 5, 6, 7])
+        self.assertEqual(ops[0].targets, ["a", "b"])
+        self.assertIsNone(ops[-1].targets)
+
+        phases = planBatch(ops)
+        self.assertEqual([[x.lineno for x in phase] for phase in phases], [[2, 3], [4, 5], [6], [7]])
+
+        with self.assertRaisesRegex(click.UsageError, "^line 2: list is not available"):
+            self.script("parse $/a\nlist\n")
+        with self.assertRaisesRegex(click.UsageError, "^line 1: .*does not exist"):
+            self.script("parse $/missing\n")
+
+    def test_run(self):
+        phases = planBatch(self.script(
+            "parse $/a $/b $/c\n"
+            "install a b c missing\n"
+            "verify missing c\n"
+        ))
+        summary = BatchRunner(self.db, jobs=3).run(phases)
+
+        self.assertFalse(summary["ok"])
+        self.assertEqual(summary["counts"], {"ok" : 7, "failed" : 1, "skipped" : 1})
+        statuses = [(x["command"], x["target"], x["status"]) for x in summary["results"]]
+        self.assertEqual(statuses[-2:], [("verify", "missing", "skipped"), ("verify", "c", "ok")])
+        self.assertEqual(sorted(x.pkgname for x in self.db.iterPackages(installed=True)), ["a", "b", "c"])
+
+        # a second run finds everything parsed
+        summary = BatchRunner(self.db).run(planBatch(self.script("parse $/a\nverify --all\n")))
+        self.assertTrue(summary["ok"])
+        self.assertEqual(summary["counts"], {"unchanged" : 1, "ok" : 3})
+
+    def test_cli_output(self):
+        # one-shot commands print nothing but their own output, scripts parse it as is
+        self.db.trash.close()
+        self.db.engine.dispose()
+        cli = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "xtoolCli", "cli.py")
+
+        def run(*args, script=None):
+            result = subprocess.run(
+                [sys.executable, cli, "--path", self.deploy, "--source", self.folder, *args],
+                input=script, capture_output=True, text=True,
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            return result.stdout
+
+        script = f"parse {self.folder}/a {self.folder}/b\ninstall a\nverify a\n"
+        summary = json.loads(run("batch", "-", script=script))
+        self.assertEqual(summary["counts"], {"ok" : 4})
+
+        lines = run("list", "-f", "jsonl").splitlines()
+        self.assertEqual([json.loads(x)["pkgname"] for x in lines], ["a", "b"])
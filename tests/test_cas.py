@@ -0,0 +1,65 @@
+import io
+import os
+import random
+import time
+import unittest
+from xtool.utils.cas import GEAR, _findBoundary, iterChunks
+
+def byteBoundary(buffer : bytearray, minSize : int, maxSize : int, mask : int) -> int:
+    # the plain gear loop the bulk digests have to agree with
+    size = len(buffer)
+    if size <= minSize:
+        return size
+
+    end = min(size, maxSize)
+    digest = 0
+    for index in range(minSize, end):
+        digest = ((digest << 1) + GEAR[buffer[index]]) & 0xFFFFFFFF
+        if not digest & mask:
+            return index + 1
+    return end
+
+class t_cas(unittest.TestCase):
+    def test_findBoundary(self):
+        rng = random.Random(7)
+        for trial in range(300):
+            size = rng.randint(0, 3000)
+            if trial % 3:
+                buffer = bytearray(rng.getrandbits(8) for _ in range(size))
+            else:
+                buffer = bytearray(rng.choice(b"ab") for _ in range(size))
+            minSize = rng.randint(0, 300)
+            maxSize = minSize + rng.randint(0, 2000)
+            mask = (1 << rng.randint(0, 20)) - 1
+            self.assertEqual(_findBoundary(buffer, minSize, maxSize, mask), byteBoundary(buffer, minSize, maxSize, mask))
+
+        # boundaries past the first block
+        buffer = bytearray(os.urandom(1 << 20))
+        for mask in (0x3FFF, 0xFFFF, 0x1FFFF):
+            self.assertEqual(_findBoundary(buffer, 16 * 1024, 1 << 20, mask), byteBoundary(buffer, 16 * 1024, 1 << 20, mask))
+
+    def test_iterChunks(self):
+        data = os.urandom(4 << 20)
+        chunks = list(iterChunks(io.BytesIO(data)))
+        self.assertEqual(b"".join(chunks), data)
+
+        # an insertion only changes the chunks around it
+        edited = data[:1000] + b"inserted" + data[1000:]
+        editedChunks = list(iterChunks(io.BytesIO(edited)))
+        self.assertGreater(len(set(chunks) & set(editedChunks)), len(chunks) - 3)
+
+    def test_throughput(self):
+        data = os.urandom(8 << 20)
+        buffer = bytearray(data[:1 << 20])
+
+        start = time.perf_counter()
+        byteBoundary(buffer, 0, 1 << 20, 0xFFFFFFFF)
+        byteRate = len(buffer) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in iterChunks(io.BytesIO(data)):
+            pass
+        chunkRate = len(data) / (time.perf_counter() - start)
+
+        # relative to the byte loop on the same machine, about 5x in practice
+        self.assertGreater(chunkRate, 3 * byteRate)
@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+@unittest.skipIf(not hasattr(socket, "AF_UNIX"), "unix domain sockets are not available")
+class t_daemon(unittest.TestCase):
+    def setUp(self) -> None:
+        from xtoolCli.cli import openDB
+        from xtoolCli.daemon import XToolDaemon
+
+        self.folder = tempfile.mkdtemp()
+        self.deploy = os.path.join(self.folder, "deploy")
+        self.incoming = os.path.join(self.folder, "incoming")
+        for name in ("app", "tool"):
+            os.makedirs(os.path.join(self.incoming, name))
+            with open(os.path.join(self.incoming, name, "xtool.json"), "w") as f:
+                json.dump({"version" : "1"}, f)
+        os.makedirs(self.deploy)
+
+        self.stdout = sys.stdout
+        self.db = openDB(self.deploy, None)
+        self.socketPath = os.path.join(self.folder, "xtool.sock")
+        self.daemon = XToolDaemon(self.db, self.socketPath, workers=4)
+        self.thread = threading.Thread(target=self.daemon.serve, kwargs={"pollInterval" : 0.05})
+        self.thread.start()
+        self.assertTrue(self.daemon.ready.wait(10))
+
+    def tearDown(self) -> None:
+        self.daemon.shutdown()
+        self.thread.join()
+        self.db.trash.close()
+        self.db.engine.dispose()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def client(self):
+        from xtoolCli.client import connect
+        return connect(self.deploy, socketPath=self.socketPath, spawn=False)
+
+    def test_commands(self):
+        with self.client() as client:
+            self.assertEqual(client.ping()["pid"], os.getpid())
+
+            # relative paths resolve against the client's cwd
+            lines = []
+            code, error = client.call(["parse", "app", "tool"], lines.append, cwd=self.incoming)
+            self.assertEqual((code, error), (0, None))
+            self.assertEqual(lines, ["parsed 2, skipped 0, failed 0"])
+
+            code, error = client.call(["parse", "missing"], cwd=self.incoming)
+            self.assertEqual(code, 2)
+            self.assertIn("does not exist", error)
+            self.assertEqual(client.call(["bogus"]), (2, "no such command bogus"))
+
+            # concurrent calls on one connection get their own output
+            def listPackages(_):
+                lines = []
+                client.call(["list"], lines.append)
+                return lines
+
+            with ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(listPackages, range(8)))
+            self.assertEqual(results, [["app", "tool"]] * 8)
+
+            lines = []
+            self.assertEqual(client.call(["list", "--help"], lines.append), (0, None))
+            self.assertIn("List installed packages.", "\n".join(lines))
+
+    def test_isolation(self):
+        # owner only from the start and the process stdout is left alone
+        self.assertEqual(stat.S_IMODE(os.stat(self.socketPath).st_mode) & 0o077, 0)
+        self.assertIs(sys.stdout, self.stdout)
+
+    def test_catalogLock(self):
+        from xtoolCli.daemon import _ReadWriteLock
+
+        lock = _ReadWriteLock()
+        events = []
+
+        def write():
+            with lock.write():
+                events.append("write")
+
+        with lock.read(), lock.read():
+            writer = threading.Thread(target=write)
+            writer.start()
+            time.sleep(0.1)
+            # readers share the lock, the writer waits for both
+            events.append("read")
+        writer.join(5)
+        self.assertEqual(events, ["read", "write"])
+
+    def test_shutdown(self):
+        from xtoolCli.client import XToolDaemonError
+
+        with self.client() as client:
+            client.shutdown()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(os.path.exists(self.socketPath))
+        with self.assertRaises(XToolDaemonError):
+            self.client()
@@ -0,0 +1,206 @@
+import gc
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+from xtool.utils import FolderMFD, ZipMFD, ZstdMFD, ZipArchivePool, createMFD, repackToZstd, zipPool
+from xtool.utils.fileIndex import FileLookupIndex
+from xtool.utils.manifest import FolderManifest, manifestCachePath
+from xtool.utils.zstdInterface import HAS_ZSTANDARD
+
+class t_zipmfd(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.zipPath = os.path.join(self.folder, "pkg.zip")
+        with zipfile.ZipFile(self.zipPath, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("xtool.json", '{"version": "1"}')
+            zf.writestr("bin/pkg.exe", b"x" * 4096)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_pooled_handle_shared(self):
+        a = ZipMFD(self.zipPath)
+        b = ZipMFD(self.zipPath)
+
+        self.assertIs(a.handle, b.handle)
+        self.assertEqual(a.allFiles, ["xtool.json", "bin/pkg.exe"])
+        self.assertEqual(b.getFile("bin/pkg.exe"), b"x" * 4096)
+
+        handle = a.handle
+        zipPool.discard(self.zipPath)
+        a.close()
+        self.assertFalse(handle.closed)
+        b.close()
+        self.assertTrue(handle.closed)
+
+    def test_reacquire_releases_once(self):
+        mfd = ZipMFD(self.zipPath)
+        old = mfd.handle
+        zipPool.discard(self.zipPath)
+        old.close()
+
+        new = mfd.handle
+        self.assertIsNot(new, old)
+        self.assertEqual((old.users, new.users), (0, 1))
+
+        # only the finalizer of the current handle is left to run
+        del mfd
+        gc.collect()
+        self.assertEqual((old.users, new.users), (0, 0))
+
+    def test_pool_bounded(self):
+        pool = ZipArchivePool(maxSize=1)
+        other = os.path.join(self.folder, "other.zip")
+        shutil.copy(self.zipPath, other)
+
+        with pool.lease(self.zipPath) as handle:
+            self.assertIn("xtool.json", handle.members)
+        with pool.lease(other):
+            pass
+
+        self.assertEqual(len(pool), 1)
+        self.assertTrue(handle.closed)
+
+    def test_hasFile(self):
+        with ZipMFD(self.zipPath) as mfd:
+            self.assertTrue(mfd.hasFile_xtool_json)
+            self.assertFalse(mfd.hasFile_missing_json)
+            self.assertEqual(mfd.hasFile("xtool.json"), (True, "xtool.json"))
+            self.assertEqual(mfd.hasFile("pkg"), (True, "bin/pkg.exe"))
+            self.assertEqual(mfd.hasFile("pkg", fuzzy=False), (False, None))
+            with self.assertRaises(AttributeError):
+                mfd.notAnAttribute
+
+    def test_fuzzy_match(self):
+        from fuzzywuzzy import process
+
+        names = [f"bin/tool{i:02d}.exe" for i in range(40)] + [f"data/tool{i:02d}.dat" for i in range(40)] + ["setup.txt"]
+        index = FileLookupIndex(names)
+        scored = []
+        extractOne = process.extractOne
+
+        def record(query, choices):
+            scored.append(list(choices))
+            return extractOne(query, choices)
+
+        with mock.patch.object(process, "extractOne", record):
+            self.assertEqual(index.match("tool17.ex"), (True, "bin/tool17.exe"))
+            # the scorer only sees the short list of executables sharing n-grams with the query
+            self.assertLessEqual(len(scored[0]), index.candidateLimit)
+            self.assertTrue(all(x.endswith(".exe") for x in scored[0]))
+            self.assertIn("bin/tool17.exe", scored[0])
+
+            # no executable shares an n-gram, every file is scored and a non executable wins
+            self.assertEqual(index.match("qqqqq"), (False, None))
+            self.assertEqual(scored[1], names)
+
+        self.assertEqual(FileLookupIndex(["docs/setup.txt"]).match("setup"), (False, None))
+
+    def test_write_invalidates(self):
+        with createMFD(self.zipPath) as mfd:
+            mfd.writeJsonFile("extra.json", {"a": 1})
+            self.assertIn("extra.json", mfd.allFiles)
+            self.assertEqual(mfd.readJsonFile("extra.json"), {"a": 1})
+
+    def test_parallel_unpack(self):
+        with zipfile.ZipFile(self.zipPath, "a") as zf:
+            for i in range(40):
+                zf.writestr(f"data/{i % 4}/file{i}.bin", os.urandom(1024))
+
+        serial = os.path.join(self.folder, "serial")
+        parallel = os.path.join(self.folder, "parallel")
+        with ZipMFD(self.zipPath) as mfd:
+            mfd.unpack(serial, workers=1)
+            mfd.unpack(parallel, workers=4)
+
+            for name in mfd.allFiles:
+                with open(os.path.join(serial, name), "rb") as a, open(os.path.join(parallel, name), "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+
+class t_foldermfd(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.pkgPath = os.path.join(self.folder, "pkg")
+        os.makedirs(os.path.join(self.pkgPath, "bin", "empty"))
+        with open(os.path.join(self.pkgPath, "xtool.json"), "w") as f:
+            f.write('{"version": "1"}')
+        with open(os.path.join(self.pkgPath, "bin", "pkg.exe"), "wb") as f:
+            f.write(os.urandom(2048))
+        with open(os.path.join(self.pkgPath, "bin", "readme.txt"), "w") as f:
+            f.write("text " * 1000)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_pack(self):
+        zmfd = FolderMFD(self.pkgPath).pack(os.path.join(self.folder, "out"))
+        with zipfile.ZipFile(zmfd.file_path) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.getinfo("bin/pkg.exe").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.getinfo("bin/readme.txt").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertIn("bin/empty/", zf.namelist())
+            self.assertEqual(zf.read("bin/readme.txt"), b"text " * 1000)
+        zmfd.close()
+
+    def test_manifest(self):
+        cacheDir = os.path.join(self.folder, "cache")
+        os.makedirs(cacheDir)
+        mfd = FolderMFD(self.pkgPath, manifestCacheDir=cacheDir)
+        self.assertEqual(mfd.allFiles, ["bin/pkg.exe", "bin/readme.txt", "xtool.json"])
+        self.assertEqual(mfd.manifest.files["bin/readme.txt"][0], 5000)
+        self.assertEqual(os.path.dirname(manifestCachePath(self.pkgPath, cacheDir)), cacheDir)
+        self.assertTrue(os.path.exists(manifestCachePath(self.pkgPath, cacheDir)))
+        # nothing is written beside the folder, nor anywhere without a cache folder
+        self.assertEqual(sorted(os.listdir(self.folder)), ["cache", "pkg"])
+        self.assertEqual(FolderMFD(self.pkgPath).allFiles, mfd.allFiles)
+        self.assertEqual(len(os.listdir(cacheDir)), 1)
+
+        with open(os.path.join(self.pkgPath, "bin", "empty", "new.txt"), "w") as f:
+            f.write("new")
+        self.assertIn("bin/empty/new.txt", FolderMFD(self.pkgPath, manifestCacheDir=cacheDir).allFiles)
+
+        # folders whose mtime did not move are trusted, a fresh scan sees in-place edits
+        binFolder = os.path.join(self.pkgPath, "bin")
+        folderMtime = os.stat(binFolder).st_mtime_ns
+        with open(os.path.join(binFolder, "readme.txt"), "a") as f:
+            f.write("more")
+        os.utime(binFolder, ns=(folderMtime, folderMtime))
+        self.assertEqual(FolderManifest.load(self.pkgPath, cacheDir).files["bin/readme.txt"][0], 5000)
+        self.assertEqual(FolderManifest.load(self.pkgPath).files["bin/readme.txt"][0], 5004)
+
+@unittest.skipIf(not HAS_ZSTANDARD, "zstandard is not installed")
+class t_zstdmfd(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.zipPath = os.path.join(self.folder, "pkg.zip")
+        with zipfile.ZipFile(self.zipPath, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("xtool.json", '{"version": "1"}')
+            for i in range(20):
+                zf.writestr(f"bin/file{i}.bin", os.urandom(512) * (i + 1))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_repack(self):
+        with ZipMFD(self.zipPath) as zmfd:
+            repackToZstd(zmfd, os.path.join(self.folder, "pkg"))
+            mfd = createMFD(os.path.join(self.folder, "pkg.tar.zst"))
+
+            self.assertIsInstance(mfd, ZstdMFD)
+            self.assertEqual(mfd.pkgName, "pkg")
+            self.assertEqual(mfd.readJsonFile("xtool.json"), {"version": "1"})
+            self.assertEqual(mfd.getFile("bin/file7.bin"), zmfd.getFile("bin/file7.bin"))
+
+            target = os.path.join(self.folder, "out")
+            mfd.copyTo(target, workers=4)
+            for name in zmfd.allFiles:
+                with open(os.path.join(target, name), "rb") as f:
+                    self.assertEqual(f.read(), zmfd.getFile(name))
+
+            # zstd media repack member by member too
+            again = repackToZstd(mfd, os.path.join(self.folder, "again"))
+            self.assertEqual(again.index["members"].keys(), mfd.index["members"].keys())
+            self.assertEqual(again.getFile("bin/file7.bin"), zmfd.getFile("bin/file7.bin"))
@@ -0,0 +1,508 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from unittest import mock
+from xtool import XToolDB, XToolExtension, XToolNotImplementedException, READS_CONFIG, FILESYSTEM
+from xtool.utils import createMFD
+from xtool.utils.misc import callExtensions
+from xtool.utils.snapshot import SnapshotStore
+from xtool.utils.zstdInterface import HAS_ZSTANDARD
+
+def writeFiles(root : str, files : dict) -> None:
+    for name, data in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+class CountingExtension(XToolExtension):
+    MEMOIZE = {"parseSource" : ("config",)}
+    calls = 0
+
+    def parseSource(self, source : str) -> None:
+        CountingExtension.calls += 1
+        self.extensionContext.config["files"] = len(self.extensionContext.manifest)
+
+class PartialExtension(XToolExtension):
+    def installPackage(self, package : str) -> None:
+        self.globalContext.installed = (package, self.extensionContext.target)
+
+    def verifyPackage(self, package : str) -> None:
+        raise XToolNotImplementedException("verifyPackage")
+
+class SlowExtension(XToolExtension):
+    SCOPE = {"installPackage" : (READS_CONFIG, FILESYSTEM)}
+
+    def installPackage(self, package : str) -> None:
+        time.sleep(0.2)
+        self.extensionContext.log.append((self.name, threading.current_thread().name))
+        if self.extensionContext.fail:
+            raise ValueError(self.name)
+
+class SlowExtension2(SlowExtension):
+    pass
+
+class AfterExtension(XToolExtension):
+    DEPENDS = ("SlowExtension",)
+    SCOPE = {"installPackage" : (READS_CONFIG,)}
+
+    def installPackage(self, package : str) -> None:
+        self.extensionContext.log.append((self.name, None))
+
+class t_package_ops(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.deploy = os.path.join(self.folder, "deploy")
+        self.source = os.path.join(self.folder, "incoming", "app")
+        os.makedirs(self.deploy)
+        writeFiles(self.source, {
+            "xtool.json" : json.dumps({"version" : "1"}).encode(),
+            "bin/app.exe" : os.urandom(4096),
+            "data/old.ini" : b"old",
+            "data/keep.ini" : b"keep",
+        })
+
+        self.db = XToolDB(self.deploy)
+        self.db._createAllTables()
+
+    def tearDown(self) -> None:
+        self.db.trash.close()
+        self.db.engine.dispose()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def reopen(self, **kwargs) -> None:
+        """
+        replaces self.db with one on an empty deploy folder
+        """
+
+        self.db.trash.close()
+        self.db.engine.dispose()
+        shutil.rmtree(self.deploy)
+        os.makedirs(self.deploy)
+        self.db = XToolDB(self.deploy, **kwargs)
+        self.db._createAllTables()
+
+    def installed(self, *parts) -> str:
+        return os.path.join(self.db.targetPath, "app", *parts)
+
+    def test_updatePackage(self):
+        self.db.parseSource(self.source)
+        self.db.installPackage("app")
+
+        os.remove(os.path.join(self.source, "data", "old.ini"))
+        writeFiles(self.source, {
+            "xtool.json" : json.dumps({"version" : "2"}).encode(),
+            "data/new.ini" : b"new",
+        })
+        keepStat = os.stat(self.installed("data", "keep.ini"))
+
+        changed, removed = self.db.updatePackage(self.source)
+
+        self.assertEqual(sorted(changed), ["data/new.ini", "xtool.json"])
+        self.assertEqual(removed, ["data/old.ini"])
+        self.assertFalse(os.path.exists(self.installed("data", "old.ini")))
+        self.assertTrue(os.path.exists(self.installed("data", "new.ini")))
+        self.assertEqual(os.stat(self.installed("data", "keep.ini")).st_mtime_ns, keepStat.st_mtime_ns)
+
+        with self.db.makeSession() as session:
+            self.assertEqual(session.query(self.db.XToolEntry).first().version, "2")
+
+    def test_updatePackage_staged(self):
+        self.db.parseSource(self.source)
+        self.db.installPackage("app")
+        stored = sorted(os.listdir(self.db.sourcePath))
+
+        writeFiles(self.source, {"xtool.json" : json.dumps({"version" : "2"}).encode()})
+        with mock.patch.object(self.db, "_applyDelta", side_effect=ValueError("delta")):
+            with self.assertRaises(ValueError):
+                self.db.updatePackage(self.source)
+
+        # the failed update left the old source in place and nothing staged
+        self.assertEqual(sorted(os.listdir(self.db.sourcePath)), stored)
+        self.db.verifyPackage("app")
+        with self.db.makeSession() as session:
+            self.assertEqual(session.query(self.db.XToolEntry).first().version, "1")
+
+        self.db.updatePackage(self.source)
+        self.assertEqual(sorted(os.listdir(self.db.sourcePath)), stored)
+        with self.db.makeSession() as session:
+            self.assertEqual(session.query(self.db.XToolEntry).first().version, "2")
+
+    def test_install_from_zip(self):
+        zipPath = os.path.join(self.folder, "incoming", "zapp.zip")
+        with zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("xtool.json", "{}")
+            zf.writestr("bin/zapp.exe", b"z" * 10000)
+
+        self.db.parseSource(zipPath)
+        self.assertEqual(os.listdir(self.db.sourcePath), ["zapp.zip"])
+
+        self.db.installPackage("zapp")
+        manifest = self.db.packageFiles("zapp")
+
+        self.assertEqual(manifest["bin/zapp.exe"]["size"], 10000)
+        self.assertEqual(
+            manifest["bin/zapp.exe"]["mtime"],
+            os.stat(os.path.join(self.db.targetPath, "zapp", "bin", "zapp.exe")).st_mtime_ns,
+        )
+
+    def test_parseSources(self):
+        second = os.path.join(self.folder, "incoming", "second")
+        writeFiles(second, {"bin/second.exe" : b"2"})
+        broken = os.path.join(self.folder, "incoming", "broken.zip")
+        writeFiles(os.path.dirname(broken), {"broken.zip" : b"not a zip"})
+
+        result = self.db.parseSources([self.source, second, broken])
+
+        self.assertEqual(result["parsed"], ["app", "second"])
+        self.assertEqual(list(result["failed"].keys()), [broken])
+
+        self.assertEqual([x.pkgname for x in self.db.iterPackages(batchSize=1)], ["app", "second"])
+        self.assertEqual([x.config for x in self.db.iterPackages(withConfig=True)], [{"version" : "1"}, {}])
+
+    def test_deferWrites(self):
+        self.db.parseSource(self.source)
+        with self.db.deferWrites():
+            self.db.installPackage("app")
+            self.assertTrue(os.path.exists(self.installed("bin", "app.exe")))
+            # not committed until the block ends
+            self.assertEqual(list(self.db.iterPackages(installed=True)), [])
+            with self.assertRaises(Exception):
+                with self.db.deferWrites():
+                    pass
+
+        self.assertEqual([x.pkgname for x in self.db.iterPackages(installed=True)], ["app"])
+        self.assertIsNotNone(self.db.packageFiles("app")["bin/app.exe"]["mtime"])
+
+    def test_file_ownership(self):
+        other = os.path.join(self.folder, "incoming", "other")
+        writeFiles(other, {"data/keep.ini" : b"keep", "bin/other.exe" : b"o"})
+        self.db.parseSources([self.source, other])
+
+        self.assertEqual(self.db.fileOwners("data/keep.ini"), ["app", "other"])
+        self.assertEqual(self.db.fileConflicts("app"), {"data/keep.ini" : ["other"]})
+        self.assertEqual(self.db.fileConflicts("app", "missing"), {})
+        self.assertEqual(sorted(self.db.packageFiles("other")), ["bin/other.exe", "data/keep.ini"])
+
+    def test_verifyPackage(self):
+        self.db.parseSource(self.source)
+        self.db.installPackage("app")
+        self.assertTrue(self.db.verifyPackage("app").ok)
+
+        # same size and content, only the mtime moved
+        os.utime(self.installed("data", "keep.ini"), ns=(0, 0))
+        writeFiles(self.installed(), {"data/old.ini" : b"new", "extra.txt" : b"x"})
+        os.remove(self.installed("bin", "app.exe"))
+
+        report, = self.db.verifyAll(workers=2)
+        self.assertEqual(report.missing, ["bin/app.exe"])
+        self.assertEqual(report.modified, ["data/old.ini"])
+        self.assertEqual(report.extra, ["extra.txt"])
+        self.assertEqual(report.hashed, 2)
+
+    def test_uninstallPackage(self):
+        self.db.parseSource(self.source)
+        self.db.installPackage("app")
+        self.db.uninstallPackage("app")
+
+        self.assertFalse(os.path.exists(self.installed()))
+        with self.db.makeSession() as session:
+            self.assertFalse(session.query(self.db.XToolEntry).first().isInstalled)
+        self.assertIsNone(self.db.packageFiles("app")["data/keep.ini"]["mtime"])
+
+        self.db.trash.wait()
+        self.assertEqual(os.listdir(self.db.trash.root), [])
+
+    def test_trash_reclaim(self):
+        leftover = os.path.join(self.deploy, "trash", "app.dead")
+        writeFiles(leftover, {"a/b/c.txt" : b"c", "d.txt" : b"d"})
+
+        # opening a db queues leftovers, a second reclaim does not queue them twice
+        db = XToolDB(self.deploy)
+        db.trash.reclaim()
+        db.trash.wait()
+        db.trash.close()
+        db.engine.dispose()
+        self.assertEqual(os.listdir(os.path.join(self.deploy, "trash")), [])
+
+    def test_exportPackage(self):
+        exportPath = os.path.join(self.folder, "export")
+        zipPath = os.path.join(self.folder, "incoming", "zapp.zip")
+        with zipfile.ZipFile(zipPath, "w") as zf:
+            zf.writestr("bin/zapp.exe", b"z" * 100)
+        self.db.parseSources([self.source, zipPath])
+        self.db.installPackage("app")
+
+        # stored archive in the requested format, cloned as is
+        exported = self.db.exportPackage("zapp", exportPath)
+        with open(exported, "rb") as a, open(os.path.join(self.db.sourcePath, "zapp.zip"), "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+        # built from the installed tree
+        writeFiles(self.installed(), {"data/user.ini" : b"user"})
+        folder = self.db.exportPackage("app", exportPath, "folder")
+        self.assertEqual(sorted(os.listdir(os.path.join(folder, "data"))), ["keep.ini", "old.ini", "user.ini"])
+
+        # built from the stored source
+        folder = self.db.exportPackage("zapp", exportPath, "folder")
+        self.assertEqual(os.listdir(os.path.join(folder, "bin")), ["zapp.exe"])
+
+    def test_backupPackageUsrData(self):
+        self.db.parseSource(self.source)
+        self.db.installPackage("app")
+        save = os.urandom(2 * 1024 * 1024)
+        writeFiles(self.installed(), {"save/slot.dat" : save})
+
+        first = self.db.backupPackageUsrData("app")
+        self.assertEqual(first["files"], 1)
+        self.assertEqual(first["newBytes"], len(save))
+
+        second = self.db.backupPackageUsrData("app")
+        self.assertEqual((second["reused"], second["newChunks"]), (1, 0))
+
+        # an insertion only rewrites the chunks around it
+        edited = save[:1000000] + b"edit" + save[1000000:]
+        writeFiles(self.installed(), {"save/slot.dat" : edited})
+        third = self.db.backupPackageUsrData("app")
+        self.assertLess(third["newBytes"], len(save) // 2)
+
+        os.remove(self.installed("save", "slot.dat"))
+        self.db.restorePackageUsrData("app", first["snapshot"])
+        with open(self.installed("save", "slot.dat"), "rb") as f:
+            self.assertEqual(f.read(), save)
+
+        store = SnapshotStore(os.path.join(self.deploy, "backup"))
+        with store.openFile("app", "save/slot.dat") as f:
+            self.assertEqual(f.read(), edited)
+
+    def test_restore_hardlinked(self):
+        writeFiles(self.source, {
+            "xtool.json" : json.dumps({"version" : "1", "usrData" : ["cfg/*"]}).encode(),
+            "cfg/settings.ini" : b"DEFAULT",
+        })
+        for sourceStore in ("archive", "blob"):
+            self.reopen(installMode="hardlink", sourceStore=sourceStore)
+            self.db.parseSource(self.source)
+            self.db.installPackage("app")
+
+            settings = self.installed("cfg", "settings.ini")
+            os.remove(settings)
+            writeFiles(self.installed(), {"cfg/settings.ini" : b"BACKEDUP"})
+            self.db.backupPackageUsrData("app")
+
+            # a relinked install shares the inode with the cache or the blob
+            if sourceStore == "blob":
+                shared = self.db.blobStore.objects.path(self.db.packageFiles("app")["cfg/settings.ini"]["hash"])
+            else:
+                shared = os.path.join(self.deploy, "cache", "app", "cfg", "settings.ini")
+            os.remove(settings)
+            os.link(shared, settings)
+
+            self.db.restorePackageUsrData("app")
+            with open(settings, "rb") as f:
+                self.assertEqual(f.read(), b"BACKEDUP")
+            with open(shared, "rb") as f:
+                self.assertEqual(f.read(), b"DEFAULT")
+
+    def test_private_files_cloned(self):
+        writeFiles(self.source, {
+            "xtool.json" : json.dumps({"version" : "1", "usrData" : ["cfg/*"], "mutable" : ["data/old.ini"]}).encode(),
+            "cfg/settings.ini" : b"DEFAULT",
+        })
+        for sourceStore in ("archive", "blob"):
+            self.reopen(installMode="hardlink", sourceStore=sourceStore)
+            self.db.parseSource(self.source)
+            self.db.installPackage("app")
+
+            for name in ("cfg/settings.ini", "data/old.ini"):
+                installed = os.stat(self.installed(*name.split("/")))
+                self.assertEqual(installed.st_nlink, 1, (sourceStore, name))
+                # private copies stay writable when cloned from a read-only blob
+                self.assertTrue(installed.st_mode & stat.S_IWUSR)
+            self.assertEqual(os.stat(self.installed("data", "keep.ini")).st_nlink, 2)
+
+        blob = self.db.blobStore.objects.path(self.db.packageFiles("app")["data/keep.ini"]["hash"])
+        self.assertEqual(stat.S_IMODE(os.stat(blob).st_mode), 0o444)
+
+    def test_blob_store(self):
+        self.db.trash.close()
+        self.db.engine.dispose()
+        self.db = XToolDB(self.deploy, installMode="hardlink", sourceStore="blob")
+        self.db._createAllTables()
+
+        other = os.path.join(self.folder, "incoming", "other")
+        writeFiles(other, {"data/keep.ini" : b"keep", "bin/other.exe" : b"o"})
+        self.db.parseSources([self.source, other])
+
+        store = self.db.blobStore
+        self.assertEqual(store.packages(), ["app", "other"])
+        # data/keep.ini is stored once for both packages
+        self.assertEqual(len(list(store.objects)), 5)
+        self.assertEqual(store.references()[self.db.packageFiles("app")["data/keep.ini"]["hash"]], 2)
+
+        # exported straight from the store, the package is not installed
+        if HAS_ZSTANDARD:
+            exported = self.db.exportPackage("other", os.path.join(self.folder, "export"), "zstd")
+            with createMFD(exported) as mfd:
+                self.assertEqual(sorted(mfd.allFiles), ["bin/other.exe", "data/keep.ini"])
+                self.assertEqual(mfd.getFile("data/keep.ini"), b"keep")
+
+        self.db.installPackage("app")
+        blob = self.db.blobStore.objects.path(self.db.packageFiles("app")["bin/app.exe"]["hash"])
+        self.assertTrue(os.path.samefile(self.installed("bin", "app.exe"), blob))
+        self.assertTrue(self.db.verifyPackage("app").ok)
+
+        store.remove("other")
+        self.assertEqual(self.db.collectGarbage(), (1, 1))
+
+    def test_rescan(self):
+        writeFiles(self.db.sourcePath, {"a/bin/a.exe" : b"a"})
+        zipPath = os.path.join(self.db.sourcePath, "b.zip")
+        with zipfile.ZipFile(zipPath, "w") as zf:
+            zf.writestr("bin/b.exe", b"b")
+
+        self.assertEqual(self.db.rescan()["parsed"], ["a", "b"])
+        self.assertEqual(self.db.rescan(), {"parsed" : [], "updated" : [], "removed" : [], "failed" : {}})
+
+        with zipfile.ZipFile(zipPath, "w") as zf:
+            zf.writestr("bin/b.exe", b"b2")
+            zf.writestr("bin/b.dll", b"dll")
+        shutil.rmtree(os.path.join(self.db.sourcePath, "a"))
+
+        result = self.db.rescan()
+        self.assertEqual((result["updated"], result["removed"]), (["b"], ["a"]))
+        self.assertEqual(sorted(self.db.packageFiles("b")), ["bin/b.dll", "bin/b.exe"])
+        self.assertEqual([x.pkgname for x in self.db.iterPackages(available=True)], ["b"])
+
+        # an in-place edit below a folder source leaves every folder mtime alone
+        writeFiles(self.db.sourcePath, {"c/app/sub/lib.dll" : b"old"})
+        self.assertEqual(self.db.rescan()["parsed"], ["c"])
+        libPath = os.path.join(self.db.sourcePath, "c", "app", "sub", "lib.dll")
+        folderStat = os.stat(os.path.dirname(libPath))
+        with open(libPath, "r+b") as f:
+            f.write(b"new!")
+        os.utime(os.path.dirname(libPath), ns=(folderStat.st_atime_ns, folderStat.st_mtime_ns))
+        self.assertEqual(self.db.rescan()["updated"], ["c"])
+        self.assertEqual(self.db.packageFiles("c")["app/sub/lib.dll"]["size"], 4)
+
+        # the catalog is the truth, a purged one is filled again
+        self.db.purgeAll()
+        self.assertEqual(self.db.rescan()["parsed"], ["b", "c"])
+
+    def test_watch(self):
+        results = []
+        watcher = self.db.watch(results.append, interval=0.05)
+        try:
+            writeFiles(self.db.sourcePath, {"w/bin/w.exe" : b"w"})
+            for _ in range(100):
+                if results:
+                    break
+                time.sleep(0.05)
+
+            # folders created after the watch started are watched too
+            with open(os.path.join(self.db.sourcePath, "w", "bin", "w.exe"), "r+b") as f:
+                f.write(b"W")
+            for _ in range(100):
+                if len(results) > 1:
+                    break
+                time.sleep(0.05)
+        finally:
+            watcher.stop()
+
+        self.assertEqual(results[0]["parsed"], ["w"])
+        self.assertEqual(results[-1]["updated"], ["w"])
+
+    def test_hookCache(self):
+        CountingExtension.calls = 0
+        self.db._addExtension(CountingExtension)
+
+        self.db.parseSource(self.source)
+        with self.db.makeSession() as session:
+            stored = session.query(self.db.XToolHookCacheEntry).one()
+        self.db.parseSources([self.source], force=True)
+        self.assertEqual(CountingExtension.calls, 1)
+        self.assertEqual(next(self.db.iterPackages(withConfig=True)).config, {"version" : "1", "files" : 4})
+
+        # a hit is written once the hook is done, a bare lookup only touches memory
+        with self.db.makeSession() as session:
+            lastUsed = session.query(self.db.XToolHookCacheEntry.lastUsed).scalar()
+        self.assertGreater(lastUsed, stored.lastUsed)
+        self.assertIsNotNone(self.db.hookCache.lookup(stored.key))
+        with self.db.makeSession() as session:
+            self.assertEqual(session.query(self.db.XToolHookCacheEntry.lastUsed).scalar(), lastUsed)
+        self.db.hookCache.flush()
+        with self.db.makeSession() as session:
+            self.assertGreater(session.query(self.db.XToolHookCacheEntry.lastUsed).scalar(), lastUsed)
+
+        # new content, new key
+        writeFiles(self.source, {"data/new.ini" : b"new"})
+        self.db.parseSource(self.source, force=True)
+        self.assertEqual(CountingExtension.calls, 2)
+
+        self.db.hookCache.maxEntries = 1
+        CountingExtension.VERSION = "2"
+        try:
+            self.db.parseSource(self.source, force=True)
+        finally:
+            CountingExtension.VERSION = "0"
+        self.assertEqual(CountingExtension.calls, 3)
+        with self.db.makeSession() as session:
+            self.assertEqual(session.query(self.db.XToolHookCacheEntry).count(), 1)
+
+    def test_hook_dispatch(self):
+        self.assertEqual(sorted(PartialExtension.hooks()), ["installPackage", "verifyPackage"])
+        self.db._addExtension(PartialExtension)
+        self.db._addExtension(PartialExtension)
+        self.assertEqual(list(self.db.hookTable), ["installPackage", "verifyPackage"])
+        self.assertEqual(len(self.db.hookTable["installPackage"]), 1)
+
+        self.db.parseSource(self.source)
+        self.db.installPackage("app")
+        self.assertEqual(self.db.globalContext.installed, ("app", self.installed()))
+
+        # a hook raising XToolNotImplementedException is skipped from then on
+        self.db.verifyPackage("app")
+        ext = self.db.hookTable["verifyPackage"][0]
+        self.assertEqual(ext._unavailable, {"verifyPackage"})
+
+    def test_lazy_extension(self):
+        self.db._addExtension(f"{__name__}:PartialExtension")
+        self.db._addExtension(f"{__name__}:PartialExtension")
+        self.assertEqual(self.db.hookTable, {})
+        with self.assertRaises(Exception):
+            self.db._addExtension("PartialExtension")
+
+        # resolved by the first hook fired, even one it doesn't implement
+        self.db.parseSource(self.source)
+        self.assertEqual(self.db._pendingExtensions, [])
+        self.assertEqual(len(self.db.hookTable["installPackage"]), 1)
+
+        self.db.installPackage("app")
+        self.assertEqual(self.db.globalContext.installed, ("app", self.installed()))
+
+    def test_concurrent_hooks(self):
+        for extension in (AfterExtension, SlowExtension, SlowExtension2):
+            self.db._addExtension(extension)
+
+        plan = self.db.hookPlans["installPackage"]
+        self.assertEqual([x.name for x in plan.extensions], ["SlowExtension", "AfterExtension", "SlowExtension2"])
+        self.assertEqual(plan.waves, [[0, 2], [1]])
+
+        log = []
+        started = time.monotonic()
+        callExtensions("installPackage", self=self.db, package="app", log=log, fail=False)
+        self.assertLess(time.monotonic() - started, 0.38)
+        self.assertEqual(log[-1], ("AfterExtension", None))
+        self.assertEqual(len({x[1] for x in log[:2]}), 2)
+
+        # both slow hooks fail, the first in plan order is raised and the dependent is skipped
+        log = []
+        with self.assertRaisesRegex(ValueError, "^SlowExtension$"):
+            callExtensions("installPackage", self=self.db, package="app", log=log, fail=True)
+        self.assertEqual(len(log), 2)
@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import typing
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must stay out of a bare import, they are loaded by the code paths that need them
+HEAVY_MODULES = ("sqlalchemy", "fuzzywuzzy", "zstandard", "asyncio", "win32com")
+
+# a cold import of the package alone takes a few tens of milliseconds
+IMPORT_BUDGET_US = 300 * 1000
+
+# the client runs for every command sent to the daemon, it has to start about as fast as the interpreter
+CLIENT_BUDGET_US = 50 * 1000
+
+def importLines(args : list) -> typing.List[typing.Tuple[int, str, int]]:
+    """
+    runs python with args and -X importtime
+
+    Returns:
+        list: (nesting depth, module, cumulative import time in microseconds), top level imports have depth 0
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    lines = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            lines.append(((len(name) - len(name.lstrip()) - 1) // 2, name.strip(), int(cumulative)))
+    return lines
+
+def importTimes(statement : str) -> dict:
+    """
+    runs statement in a fresh interpreter with -X importtime
+
+    Returns:
+        dict: {module : cumulative import time in microseconds}
+    """
+
+    return {name : cumulative for _, name, cumulative in importLines(["-c", statement])}
+
+def startupCost(args : list) -> int:
+    """
+    the import time in microseconds of running python with args, minus what a bare interpreter imports (site...)
+    """
+
+    bare = {name for _, name, _ in importLines(["-c", "pass"])}
+    return sum(cumulative for depth, name, cumulative in importLines(args) if depth == 0 and name not in bare)
+
+class t_startup(unittest.TestCase):
+    def assertLight(self, times : dict) -> None:
+        loaded = [x for x in times if x.split(".")[0] in HEAVY_MODULES]
+        self.assertEqual(loaded, [])
+
+    def test_import_xtool(self):
+        times = importTimes("import xtool, xtool.ext, xtool_ext")
+        self.assertLight(times)
+        self.assertLess(times["xtool"] + times["xtool.ext"], IMPORT_BUDGET_US)
+
+    def test_import_cli(self):
+        # the cli module only needs click until the shell starts
+        times = importTimes("import xtoolCli.cli")
+        self.assertLight(times)
+        self.assertNotIn("xtool.db", times)
+
+    def test_cli_help(self):
+        # one-shot commands open the catalog on first use, help never does
+        for args in (["--help"], ["--path", "tests", "list", "--help"], ["--path", "tests", "batch", "--help"]):
+            names = {name for _, name, _ in importLines([os.path.join("xtoolCli", "cli.py"), *args])}
+            self.assertLight(names)
+            for module in ("xtool.db", "click_shell", "xtoolCli.batch"):
+                self.assertNotIn(module, names)
+
+    def test_client(self):
+        self.assertLess(startupCost(["-c", "import xtoolCli.client"]), CLIENT_BUDGET_US)
+        self.assertLess(startupCost(["-m", "xtoolCli.client", "--help"]), CLIENT_BUDGET_US)
+
+    def test_lazy_attributes(self):
+        times = importTimes("import xtool; xtool.XToolDB")
+        self.assertIn("sqlalchemy", times)
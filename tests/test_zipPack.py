@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+import zlib
+from unittest import mock
+from xtool.utils import zipPack
+from xtool.utils.zipPack import crc32Combine, packFolder
+
+class t_zipPack(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.source = os.path.join(self.folder, "pkg")
+        os.makedirs(os.path.join(self.source, "bin", "empty"))
+
+        # compressible and random content, larger than a chunk and not a multiple of it
+        self.files = {
+            "xtool.json" : b'{"version": "1"}',
+            "bin/big.dat" : b"".join(b"line %d of the big file\n" % i for i in range(12000)),
+            "bin/noise.exe" : os.urandom(300 * 1024 + 17),
+            "bin/small.txt" : b"small " * 100,
+        }
+        for name, data in self.files.items():
+            with open(os.path.join(self.source, name), "wb") as f:
+                f.write(data)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_crc32Combine(self):
+        a, b = os.urandom(1000), os.urandom(70001)
+        self.assertEqual(crc32Combine(zlib.crc32(a), zlib.crc32(b), len(b)), zlib.crc32(a + b))
+        self.assertEqual(crc32Combine(zlib.crc32(a), 0, 0), zlib.crc32(a))
+
+    def test_packFolder(self):
+        dest = os.path.join(self.folder, "pkg.zip")
+
+        # small limits so both big files go through the chunked path
+        with mock.patch.object(zipPack, "LARGE_FILE_SIZE", 64 * 1024), mock.patch.object(zipPack, "CHUNK_SIZE", 48 * 1024):
+            packFolder(self.source, dest, workers=4)
+
+        with zipfile.ZipFile(dest) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(
+                zf.namelist(),
+                ["xtool.json", "bin/", "bin/big.dat", "bin/noise.exe", "bin/small.txt", "bin/empty/"],
+            )
+            for name, data in self.files.items():
+                self.assertEqual(zf.read(name), data)
+
+            big = zf.getinfo("bin/big.dat")
+            self.assertEqual(big.compress_type, zipfile.ZIP_DEFLATED)
+            self.assertLess(big.compress_size, len(self.files["bin/big.dat"]) // 10)
+            self.assertEqual(zf.getinfo("bin/noise.exe").compress_type, zipfile.ZIP_STORED)
+            self.assertTrue(zf.getinfo("bin/empty/").is_dir())
+
+    def test_zip64(self):
+        dest = os.path.join(self.folder, "pkg64.zip")
+        with open(os.path.join(self.source, "bin", "n\u00e4me.txt"), "wb") as f:
+            f.write(b"utf-8 name")
+
+        # every size, offset and the member count past the limits, zipfile has to find them in zip64 records
+        with mock.patch.object(zipPack, "ZIP64_LIMIT", 1000), mock.patch.object(zipPack, "ZIP_FILECOUNT_LIMIT", 2), \
+                mock.patch.object(zipPack, "LARGE_FILE_SIZE", 64 * 1024), mock.patch.object(zipPack, "CHUNK_SIZE", 48 * 1024):
+            packFolder(self.source, dest, workers=2)
+
+        with zipfile.ZipFile(dest) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read("bin/n\u00e4me.txt"), b"utf-8 name")
+            for name, data in self.files.items():
+                self.assertEqual(zf.read(name), data)
+                self.assertEqual(zf.getinfo(name).external_attr >> 16, os.stat(os.path.join(self.source, name)).st_mode)
@@ -1,6 +1,18 @@
-from xtool.ctx import XToolContext
-from xtool.db import XToolDB
-from xtool.ext import XToolExtension
-from xtool.exception import XToolNotImplementedException
-from xtool.entry import XToolEntry
-from xtool.logger import xtoolLogger
+from xtool.utils.misc import lazyModule
+
+# sqlalchemy is only loaded once XToolDB or an entry class is used
+lazyModule(__name__, {
+    "XToolContext" : "xtool.ctx",
+    "XToolDB" : "xtool.db",
+    "XToolExtension" : "xtool.ext",
+    "READS_CONFIG" : "xtool.ext",
+    "WRITES_CONFIG" : "xtool.ext",
+    "WRITES_GLOBAL" : "xtool.ext",
+    "FILESYSTEM" : "xtool.ext",
+    "EXCLUSIVE" : "xtool.ext",
+    "XToolNotImplementedException" : "xtool.exception",
+    "XToolEntry" : "xtool.entry",
+    "XToolFileEntry" : "xtool.entry",
+    "XToolHookCacheEntry" : "xtool.entry",
+    "xtoolLogger" : "xtool.logger",
+})
@@ -2,33 +2,87 @@ import sqlalchemy
 import os
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from xtool.ctx import XToolContext
+from xtool.sqliteProfile import SQLiteProfile, createEngine
 from xtool.interface import XToolManageInterface
-from xtool.entry import XToolEntry
-from xtool.utils.folderInterface import FolderMFD, ZipMFD, createMFD, FileDeliveryInterface
+from xtool.entry import XToolEntry, XToolFileEntry, XToolHookCacheEntry
+from xtool.hookCache import HookCache
+from xtool.dispatch import HookPlan, planHook
+from xtool.utils.folderInterface import FolderMFD, ZipMFD, createMFD, FileDeliveryInterface, sourcePackageName
+from xtool.utils.zstdInterface import INDEX_SUFFIX, ZSTD_SUFFIX, ZstdMFD, repackToZstd
+from xtool.utils.linkInstall import INSTALL_MODES, cloneFile, isMutable, materializeTree, privatePatterns
+from xtool.utils.hashing import diffManifests, hashMFD
+from xtool.utils.manifest import manifestCachePath
+from xtool.utils.zipExtract import BUFFER_SIZE, memberTarget
+from xtool.utils.verify import VerifyReport, scanTree, verifyTree
+from xtool.utils.snapshot import SnapshotStore
+from xtool.utils.blobStore import BLOB_SUFFIX, BlobMFD, BlobStore
+from xtool.utils.sourceSnapshot import SourceSnapshot
+from xtool.utils.watcher import FolderWatcher
+from xtool.utils.trash import TrashBin
+from xtool.utils.zipPack import packFolder
 from xtool.ext import XToolExtension
-import inspect
+import importlib
 import shutil
+import threading
+import typing
+import uuid
 import contextlib
+from concurrent.futures import Executor, ThreadPoolExecutor
 
 from xtool.utils.misc import callExtensions
+from xtool.logger import xtoolLogger
+
+EXPORT_FORMATS = ("zip", "zstd", "folder")
+EXTENSION_GROUP = "xtool.extensions"
+SOURCE_STORES = ("archive", "blob")
 
 class XToolDB(XToolManageInterface):
-    def __init__(self, folderpath : str, sourceFolder : str = None, debug : bool = False) -> None:
+    def __init__(
+        self, 
+        folderpath : str, 
+        sourceFolder : str = None, 
+        debug : bool = False,
+        installMode : str = "copy",
+        profile : typing.Union[str, SQLiteProfile] = "default",
+        sourceStore : str = "archive",
+        hookCacheSize : int = 4096,
+        hookWorkers : int = 4,
+    ) -> None:
         """
         this is the xtool manager that also wraps over the sqlalchemy engine
 
+        installMode is one of "copy", "reflink" or "hardlink"
+        (the last two materialize packages from an unpacked cache under folderpath/cache)
+
+        profile tunes the sqlite connections, see xtool.sqliteProfile.PROFILES
+
+        sourceStore is "archive" (one archive per package) or "blob"
+        (files deduplicated across packages, see xtool.utils.blobStore)
+
+        hookCacheSize bounds the memoized extension results, 0 disables the cache
+
+        hookWorkers is the thread count for extension hooks declared as independent (see xtool.dispatch),
+        1 runs every hook serially
+
         NOTE: make sure folderPath is a valid path
         NOTE: in order for all the tables to be created, you must call _createAllTables()
         """
 
+        if installMode not in INSTALL_MODES:
+            raise Exception("Unknown install mode")
+
+        if sourceStore not in SOURCE_STORES:
+            raise Exception("Unknown source store")
+
         if not os.path.isdir(folderpath):
             raise Exception("Folderpath is not a directory")
 
         if not os.path.exists(folderpath):
             os.makedirs(folderpath, exist_ok=True)
 
-        self.engine = sqlalchemy.create_engine(f'sqlite:///{folderpath}/xtool.db', echo=debug)
+        self.engine = createEngine(os.path.join(folderpath, "xtool.db"), profile, debug)
         self._base = declarative_base(self.engine)
+        self._sessionFactory = sessionmaker(bind=self.engine)
 
         # parse source path
         if sourceFolder is None:
@@ -47,11 +101,44 @@ class XToolDB(XToolManageInterface):
 
         self._targetPath = os.path.abspath(self._targetPath)
         self._sourcePath = os.path.abspath(self._sourcePath)
+        self._cachePath = os.path.abspath(os.path.join(folderpath, "cache"))
+        # folder manifests are cached here instead of beside the folders they describe,
+        # hidden so it never collides with the unpacked cache of a package
+        self._manifestCachePath = os.path.join(self._cachePath, ".manifests")
+        os.makedirs(self._manifestCachePath, exist_ok=True)
+        self._backupPath = os.path.abspath(os.path.join(folderpath, "backup"))
+        self._sourceSnapshotPath = os.path.abspath(os.path.join(folderpath, "sources.json"))
+        self.installMode = installMode
+        self.sourceStore = sourceStore
+        self.blobStore = BlobStore(self._sourcePath)
+
+        # removed trees are renamed here and deleted on a daemon thread that never delays exit,
+        # leftovers of a previous process are queued for it right away
+        self.trash = TrashBin(os.path.abspath(os.path.join(folderpath, "trash")))
+        self.trash.reclaim()
 
         self.XToolEntry : XToolEntry = self._createTable(XToolEntry)
+        self.XToolFileEntry : XToolFileEntry = self._createTable(XToolFileEntry)
+        self.XToolHookCacheEntry : XToolHookCacheEntry = self._createTable(XToolHookCacheEntry)
+        self.hookCache = HookCache(self, hookCacheSize) if hookCacheSize > 0 else None
 
         self.extensions = {}
+        # "module:Class" specs imported when the first hook fires
+        self._pendingExtensions : typing.List[str] = []
+        self._extensionLock = threading.Lock()
+        # hook name -> extensions implementing it, in registration order
+        self.hookTable : typing.Dict[str, typing.List[XToolExtension]] = {}
+        self.hookPlans : typing.Dict[str, HookPlan] = {}
+        # independent hooks of different extensions share this pool
+        self.hookExecutor = ThreadPoolExecutor(hookWorkers, thread_name_prefix="xtool-hook") if hookWorkers > 1 else None
         self.globalContext = XToolContext()
+        # extension contexts are per instance, concurrent package operations fire hooks one at a time
+        self.hookLock = threading.RLock()
+        # writes collected by deferWrites, None when every operation commits on its own
+        self._deferredWrites : typing.Optional[typing.List[typing.Callable[[Session], None]]] = None
+        # run once the deferred writes are committed, or dropped when the commit fails
+        self._afterCommit : typing.List[typing.Tuple[typing.Callable[[], None], typing.Callable[[], None]]] = []
+        self._deferLock = threading.Lock()
         
     @contextlib.contextmanager
     def makeSession(self,
@@ -69,7 +156,7 @@ class XToolDB(XToolManageInterface):
             Session: the session
         """
 
-        session : Session = sessionmaker(bind=self.engine)()
+        session : Session = self._sessionFactory()
         try:
             yield session
             if commit:
@@ -80,30 +167,169 @@ class XToolDB(XToolManageInterface):
             
             session.close()
 
-    def _addExtension(self, extension : type) -> None:
+    def _commitWrite(
+        self,
+        write : typing.Callable[[Session], None],
+        committed : typing.Callable[[], None] = None,
+        failed : typing.Callable[[], None] = None,
+    ) -> None:
+        """
+        runs write in its own transaction, or queues it while writes are deferred
+
+        Args:
+            write (typing.Callable): writes to the session
+            committed (typing.Callable, optional): runs once the write is committed. Defaults to None.
+            failed (typing.Callable, optional): runs if the commit fails. Defaults to None.
+        """
+
+        with self._deferLock:
+            if self._deferredWrites is not None:
+                self._deferredWrites.append(write)
+                self._afterCommit.append((committed, failed))
+                return
+
+        try:
+            with self.makeSession() as session:
+                write(session)
+                session.commit()
+        except:
+            if failed is not None:
+                failed()
+            raise
+
+        if committed is not None:
+            committed()
+
+    @contextlib.contextmanager
+    def deferWrites(self) -> None:
+        """
+        collects the catalog writes of package operations and commits them in one transaction on exit
+
+        reads inside the block don't see the collected writes yet, the writes are committed
+        even if the block raises so the catalog matches what was done on disk
+        """
+
+        with self._deferLock:
+            if self._deferredWrites is not None:
+                raise Exception("Writes are already deferred")
+            self._deferredWrites = []
+
+        try:
+            yield
+        finally:
+            with self._deferLock:
+                writes, self._deferredWrites = self._deferredWrites, None
+                callbacks, self._afterCommit = self._afterCommit, []
+
+            if writes:
+                try:
+                    with self.makeSession() as session:
+                        for write in writes:
+                            write(session)
+                        session.commit()
+                except:
+                    for _, failed in callbacks:
+                        if failed is not None:
+                            failed()
+                    raise
+
+                for committed, _ in callbacks:
+                    if committed is not None:
+                        committed()
+
+    def _addExtension(self, extension : typing.Union[type, str]) -> None:
         """
         add an extension to the manager
 
         this should be the only way to append extensions to the manager
 
         Args:
-            extension (type): the extension class to add
+            extension (type | str): the extension class to add, or a "module:Class" spec
+                that is imported only when the first hook fires
 
         """
 
+        if isinstance(extension, str):
+            if ":" not in extension:
+                raise Exception(f"Extension spec {extension} is not in the module:Class form")
+            if extension not in self._pendingExtensions:
+                self._pendingExtensions.append(extension)
+            return
+
         if not issubclass(extension, XToolExtension) or extension is XToolExtension:
             raise Exception("Extension is not a subclass of XToolExtension")
 
         ext = extension(self)
 
+        if ext not in self.extensions:
+            for hook in extension.hooks():
+                self.hookTable.setdefault(hook, []).append(ext)
+                self.hookPlans[hook] = planHook(hook, self.hookTable[hook])
+
         self.extensions[ext] = XToolContext()
 
+    def _resolveExtensions(self) -> None:
+        """
+        imports and adds the pending extension specs
+
+        hooks fired from worker threads wait here until every spec is added
+        """
+
+        with self._extensionLock:
+            while self._pendingExtensions:
+                moduleName, _, clsName = self._pendingExtensions[0].partition(":")
+                extension = importlib.import_module(moduleName)
+                for attr in clsName.split("."):
+                    extension = getattr(extension, attr)
+                self._addExtension(extension)
+                self._pendingExtensions.pop(0)
+
+    def discoverExtensions(self, group : str = EXTENSION_GROUP) -> typing.List[str]:
+        """
+        registers the extensions installed distributions advertise under an entry point group
+
+        only the entry point metadata is read here, the extension modules are imported
+        when the first hook fires
+
+        Args:
+            group (str, optional): the entry point group. Defaults to EXTENSION_GROUP.
+
+        Returns:
+            list: the registered specs
+        """
+
+        from importlib.metadata import entry_points
+
+        specs = [x.value for x in entry_points(group=group)]
+        for spec in specs:
+            self._addExtension(spec)
+        return specs
+
     def _createAllTables(self) -> None:
         """
         create all the tables (sqlalchemy.engine)
         """
 
         self._base.metadata.create_all(self.engine)
+        self._addMissingColumns()
+
+    def _addMissingColumns(self) -> None:
+        """
+        adds columns introduced after a database was created
+
+        create_all never alters existing tables
+        """
+
+        inspector = sqlalchemy.inspect(self.engine)
+        for table in self._base.metadata.sorted_tables:
+            existing = {x["name"] for x in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                columnType = column.type.compile(self.engine.dialect)
+                with self.engine.begin() as conn:
+                    conn.execute(sqlalchemy.text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {columnType}'))
 
     def _createTable(self, table : type, tablename : str = None) -> None:
         """
@@ -123,6 +349,52 @@ class XToolDB(XToolManageInterface):
         new_type = type(table.__name__, (table, self._base,), {"__tablename__": tablename})
         return new_type
 
+    def packageQuery(self, session : Session, withConfig : bool = False) -> sqlalchemy.orm.Query:
+        """
+        a query over XToolEntry
+
+        config is a deferred column, entries used outside the session must be loaded withConfig
+
+        Args:
+            session (Session): the session
+            withConfig (bool, optional): load config with the row. Defaults to False.
+        """
+
+        query = session.query(self.XToolEntry)
+        if withConfig:
+            query = query.options(sqlalchemy.orm.undefer(self.XToolEntry.config))
+        return query
+
+    def iterPackages(
+        self,
+        installed : bool = None,
+        available : bool = None,
+        withConfig : bool = False,
+        batchSize : int = 500,
+    ) -> typing.Iterator[XToolEntry]:
+        """
+        streams package entries in batches instead of loading the whole catalog
+
+        entries are only valid while iterating
+
+        Args:
+            installed (bool, optional): filter on isInstalled. Defaults to None (no filter).
+            available (bool, optional): filter on isAvailable. Defaults to None (no filter).
+            withConfig (bool, optional): load config with the row. Defaults to False.
+            batchSize (int, optional): rows fetched per round trip. Defaults to 500.
+        """
+
+        with self.makeSession() as session:
+            session : Session
+            query = self.packageQuery(session, withConfig)
+            if installed is not None:
+                query = query.filter(self.XToolEntry.isInstalled == installed)
+            if available is not None:
+                query = query.filter(self.XToolEntry.isAvailable == available)
+
+            for entry in query.order_by(self.XToolEntry.pkgname).yield_per(batchSize):
+                yield entry
+
     @property
     def sourcePath(self) -> str:
         """
@@ -138,75 +410,485 @@ class XToolDB(XToolManageInterface):
     def targetPath(self) -> str:
         return self._targetPath
     
-    def parseSource(self, source : str) -> None:
+    def parseSource(self, source : str, force : bool = False) -> None:
         """
         this methods parses a not available package and adds it to the database
 
         Args:
             source (str): the source path to the package
+            force (bool, optional): parse even if the package is already available. Defaults to False.
 
         """
 
         if not os.path.exists(source):
             raise Exception("Source file does not exist")
 
-        if not os.path.isdir(source):
-            raise Exception("Source is not a directory")
-
         source = os.path.abspath(source)
 
-        mfd : FileDeliveryInterface = createMFD(source)
+        # checks if the package and the source are both ready and valid, before opening the source
+        if not force:
+            with self.makeSession() as session:
+                session : Session
+                existingPackage : XToolEntry = session.query(self.XToolEntry).filter(self.XToolEntry.pkgname == sourcePackageName(source)).first()
+                if self._isParsed(existingPackage):
+                    return
 
-        # checks if the package and the source are both ready and valid
-        with self.makeSession() as session:
-            session : Session
-            existingPackage : XToolEntry = session.query(self.XToolEntry).filter(self.XToolEntry.pkgname == mfd.pkgName).first()
-            if (
-                existingPackage is not None 
-                and existingPackage.isAvailable 
-                and os.path.exists(os.path.join(self._targetPath, existingPackage.pkgname))
-            ):
-                return
+        mfd : FileDeliveryInterface = createMFD(source, self._manifestCachePath)
 
         if mfd is None:
             raise Exception("Could not create MFD")
 
-        # if source is in sourcepath
-        if not source.startswith(self._sourcePath) and isinstance(mfd, FolderMFD):
-            mfd = mfd.pack(os.path.join(self._sourcePath, mfd.pkgName))
-        elif not source.startswith(self._sourcePath) and isinstance(mfd, ZipMFD):
-            mfd = mfd.copyTo(os.path.join(self._sourcePath, mfd.pkgName))
-        
-        # parse config
-        config = {}
-        try:
-            config = mfd.readJsonFile("xtool.json")
-        except:
-            pass
+        mfd, config, manifest = self._scanSource(source, mfd)
 
         # call extensions
-        callExtensions(**locals())
+        callExtensions("parseSource", **locals())
+
+        # add to database
+        def write(session : Session) -> None:
+            session.merge(self._newEntry(mfd, config))
+            self._writeFiles(session, mfd.pkgName, manifest)
 
+        self._commitWrite(write)
+
+    def _isParsed(self, existingPackage : XToolEntry) -> bool:
+        return (
+            existingPackage is not None 
+            and existingPackage.isAvailable 
+            and os.path.exists(os.path.join(self._targetPath, existingPackage.pkgname))
+        )
+
+    def _scanSource(self, source : str, mfd : FileDeliveryInterface) -> typing.Tuple[FileDeliveryInterface, dict, dict]:
+        """
+        ingests a source and reads everything the database entry needs
+
+        Returns:
+            tuple: (stored medium, config, content manifest)
+        """
+
+        mfd = self._ingestSource(source, mfd)
+        config = self._readConfig(mfd)
+        manifest = self._contentManifest(mfd)
+        return mfd, config, manifest
+
+    def _contentManifest(self, mfd : FileDeliveryInterface) -> typing.Dict[str, dict]:
+        # blob packages already know the hash of every file
+        if isinstance(mfd, BlobMFD):
+            return mfd.contentManifest()
+        return hashMFD(mfd)
+
+    def _newEntry(self, mfd : FileDeliveryInterface, config : dict) -> XToolEntry:
         # creates the xtoolentry object
-        pkgObj : XToolEntry = self.XToolEntry(
+        return self.XToolEntry(
             pkgname = mfd.pkgName,
             config=config,
             isAvailable=True,
             isInstalled=False,
-            filesList = mfd.allFiles,
-        )        
+            version = config.get("version", None),
+        )
+
+    def parseSources(self, sources : typing.List[str], workers : int = None, force : bool = False) -> dict:
+        """
+        parses many sources at once
+
+        sources are scanned and packed in a thread pool, extensions run per package
+        in the given order and every entry is written in a single transaction
+
+        a failing source is reported and does not abort the batch
+
+        Args:
+            sources (list): the source paths
+            workers (int, optional): the scanning thread count. Defaults to os.cpu_count().
+            force (bool, optional): parse packages that are already available. Defaults to False.
+
+        Returns:
+            dict: {"parsed" : [package], "skipped" : [package], "failed" : {source : error}}
+        """
+
+        result = {"parsed" : [], "skipped" : [], "failed" : {}}
+
+        mfds = {}
+        for source in sources:
+            path = os.path.abspath(source)
+            mfd = createMFD(path, self._manifestCachePath) if os.path.exists(path) else None
+            if mfd is None:
+                result["failed"][source] = "Could not create MFD"
+                continue
+            mfds[source] = (path, mfd)
+
+        with self.makeSession() as session:
+            session : Session
+            names = [x[1].pkgName for x in mfds.values()]
+            existing = {
+                x.pkgname : x for x in 
+                session.query(self.XToolEntry).filter(self.XToolEntry.pkgname.in_(names)).all()
+            }
+
+        pending = {}
+        for source, (path, mfd) in mfds.items():
+            if not force and self._isParsed(existing.get(mfd.pkgName)):
+                result["skipped"].append(mfd.pkgName)
+                continue
+            pending[source] = (path, mfd)
+
+        entries = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                source : executor.submit(self._scanSource, path, mfd) 
+                for source, (path, mfd) in pending.items()
+            }
+
+            # extensions are not thread safe, they run here in submission order
+            for source, future in futures.items():
+                try:
+                    mfd, config, manifest = future.result()
+                    callExtensions(
+                        "parseSource", self=self, source=pending[source][0], 
+                        mfd=mfd, config=config, manifest=manifest,
+                    )
+                except Exception as e:
+                    xtoolLogger.error(f"failed to parse {source}: {e}")
+                    result["failed"][source] = str(e)
+                    continue
+
+                entries.append((self._newEntry(mfd, config), manifest))
+
+        def write(session : Session) -> None:
+            for entry, manifest in entries:
+                session.merge(entry)
+                self._writeFiles(session, entry.pkgname, manifest)
+
+        self._commitWrite(write)
+
+        result["parsed"] = [x.pkgname for x, _ in entries]
+        return result
+
+    def parseSourceFolder(self, folder : str = None, workers : int = None) -> dict:
+        """
+        parses every package found directly inside a folder (see parseSources)
+
+        Args:
+            folder (str, optional): the folder to scan. Defaults to the source path.
+        """
+
+        if folder is None:
+            folder = self._sourcePath
+
+        return self.parseSources(self._listSources(folder), workers)
+
+    def rescan(self, workers : int = None) -> dict:
+        """
+        brings the catalog in line with the source path, touching only what changed
+
+        every source is signed (see sourceSignature) and compared with the snapshot of the
+        previous rescan, new packages are parsed, changed ones updated and packages whose
+        source disappeared are marked unavailable, sources of packages missing from the catalog
+        or marked unavailable are picked up again even if the snapshot calls them unchanged
+
+        the first rescan adopts the sources of packages that are already available
+
+        Args:
+            workers (int, optional): the scanning thread count for new packages. Defaults to os.cpu_count().
+
+        Returns:
+            dict: {"parsed" : [package], "updated" : [package], "removed" : [package], "failed" : {source : error}}
+        """
+
+        snapshot = SourceSnapshot.load(self._sourceSnapshotPath)
+        current = SourceSnapshot.scan(self._listSources(self._sourcePath))
+
+        with self.makeSession() as session:
+            session : Session
+            known = {name : available for name, available in session.query(self.XToolEntry.pkgname, self.XToolEntry.isAvailable).all()}
+
+        if not snapshot.exists:
+            snapshot.entries = {x : y for x, y in current.items() if known.get(sourcePackageName(x))}
+
+        added, changed, removed = snapshot.diff(current)
+
+        # the snapshot only says what moved on disk, a source it calls unchanged is still
+        # parsed when the catalog lost its package and updated when the package is unavailable
+        for source in current:
+            if source in added or source in changed:
+                continue
+            available = known.get(sourcePackageName(source))
+            if available is None:
+                added.append(source)
+            elif not available:
+                changed.append(source)
+
+        result = {"parsed" : [], "updated" : [], "removed" : [], "failed" : {}}
+
+        newSources = []
+        for source in added + changed:
+            if sourcePackageName(source) not in known:
+                newSources.append(source)
+                continue
+            try:
+                self.updatePackage(source)
+                result["updated"].append(sourcePackageName(source))
+            except Exception as e:
+                xtoolLogger.error(f"failed to update {source}: {e}")
+                result["failed"][source] = str(e)
+
+        if newSources:
+            parsed = self.parseSources(newSources, workers, force=True)
+            result["parsed"] = parsed["parsed"]
+            result["failed"].update(parsed["failed"])
+
+        # a package stays available as long as any of its sources is left
+        remaining = {sourcePackageName(x) for x in current}
+        gone = sorted({sourcePackageName(x) for x in removed} - remaining)
+        gone = [x for x in gone if known.get(x)]
+        if gone:
+            with self.makeSession() as session:
+                session : Session
+                session.query(self.XToolEntry).filter(self.XToolEntry.pkgname.in_(gone)).update(
+                    {"isAvailable" : False}, synchronize_session=False
+                )
+                session.commit()
+        result["removed"] = gone
+
+        # failed sources are left out so the next rescan retries them
+        if added or changed or removed:
+            snapshot.entries = {x : y for x, y in current.items() if x not in result["failed"]}
+            snapshot.save()
+        elif not snapshot.exists:
+            snapshot.save()
+
+        return result
+
+    def watch(self, callback : typing.Callable[[dict], None] = None, interval : float = 5.0) -> FolderWatcher:
+        """
+        keeps the catalog live by rescanning the source path whenever it changes
+
+        Args:
+            callback (typing.Callable, optional): receives the result of every rescan. Defaults to None.
+            interval (float, optional): the polling interval where inotify is unavailable. Defaults to 5.0.
+
+        Returns:
+            FolderWatcher: the started watcher, stop() it when done
+        """
+
+        def onChange():
+            result = self.rescan()
+            if callback is not None:
+                callback(result)
+
+        return FolderWatcher(self._sourcePath, onChange, interval).start()
+
+    def _listSources(self, folder : str) -> typing.List[str]:
+        """
+        lists the package candidates of a folder, skipping hidden and bookkeeping files
+        """
+
+        sources = []
+        for entry in sorted(os.scandir(folder), key=lambda x: x.name):
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir() or entry.name.endswith((".zip", ZSTD_SUFFIX, BLOB_SUFFIX)):
+                sources.append(entry.path)
+
+        return sources
+
+    def _ingestSource(self, source : str, mfd : FileDeliveryInterface, storedName : str = None) -> FileDeliveryInterface:
+        """
+        brings a source outside the source path into the source store
+
+        Args:
+            source (str): the source path
+            mfd (FileDeliveryInterface): the medium of source
+            storedName (str, optional): the stored file name without suffix. Defaults to mfd.pkgName.
+
+        Returns:
+            FileDeliveryInterface: the stored medium
+        """
+
+        if source.startswith(self._sourcePath):
+            return mfd
+
+        storedName = storedName or mfd.pkgName
+
+        if self.sourceStore == "blob":
+            return self.blobStore.ingest(mfd, storedName)
+
+        if isinstance(mfd, FolderMFD):
+            return mfd.pack(os.path.join(self._sourcePath, storedName))
+
+        # archives are stored as is and streamed into the target at install time
+        if isinstance(mfd, ZipMFD):
+            storedPath = os.path.join(self._sourcePath, storedName + ".zip")
+            cloneFile(mfd.file_path, storedPath)
+            return ZipMFD(storedPath)
+
+        if isinstance(mfd, ZstdMFD):
+            storedPath = os.path.join(self._sourcePath, storedName + ZSTD_SUFFIX)
+            cloneFile(mfd.file_path + INDEX_SUFFIX, storedPath + INDEX_SUFFIX)
+            cloneFile(mfd.file_path, storedPath)
+            return ZstdMFD(storedPath)
+
+        return mfd
+
+    def _readConfig(self, mfd : FileDeliveryInterface) -> dict:
+        # parse config
+        config = {}
+        try:
+            config = mfd.readJsonFile("xtool.json")
+        except:
+            pass
+
+        return config
+
+    def _removeStoredSource(self, package : str) -> None:
+        """
+        removes every stored form of a package from the source store
+        """
+
+        storedPath = os.path.join(self._sourcePath, package)
+        if os.path.isdir(storedPath):
+            self.trash.discard(storedPath)
+        
+        if os.path.exists(storedPath + ".zip"):
+            ZipMFD.pool.discard(storedPath + ".zip")
+
+        self.blobStore.remove(package)
+
+        for path in (
+            storedPath + ".zip",
+            storedPath + ".tar.zst",
+            storedPath + ".tar.zst.idx",
+            manifestCachePath(storedPath, self._manifestCachePath),
+            os.path.join(self._cachePath, package + ".stamp"),
+        ):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def updatePackage(self, source : str) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """
+        replaces the stored version of a package with a new one
+
+        file hashes of both versions are compared, an installed package only gets
+        the changed files written and the deleted ones removed
+
+        Args:
+            source (str): the source path to the new version
+
+        Returns:
+            tuple: (added or changed paths, removed paths)
+        """
+
+        if not os.path.exists(source):
+            raise Exception("Source file does not exist")
+
+        source = os.path.abspath(source)
+
+        mfd : FileDeliveryInterface = createMFD(source, self._manifestCachePath)
+
+        if mfd is None:
+            raise Exception("Could not create MFD")
 
-        # add to database
         with self.makeSession() as session:
             session : Session
+            pkgObj : XToolEntry = self.packageQuery(session, withConfig=True).filter(self.XToolEntry.pkgname == mfd.pkgName).first()
+
+        if pkgObj is None:
+            raise Exception("Package does not exist")
+
+        # the new version is stored under a staging name, the old one stays until the catalog commit
+        staging = None
+        if not source.startswith(self._sourcePath):
+            staging = f"{pkgObj.pkgname}.staging-{uuid.uuid4().hex}"
+
+        def promote() -> None:
+            mfd.close()
+            self._removeStoredSource(pkgObj.pkgname)
+            for stagedPath, storedPath in self._stagedPaths(staging, pkgObj.pkgname):
+                os.replace(stagedPath, storedPath)
+
+        def discard() -> None:
+            mfd.close()
+            for stagedPath, _ in self._stagedPaths(staging, pkgObj.pkgname):
+                os.remove(stagedPath)
+
+        try:
+            if staging is not None:
+                mfd = self._ingestSource(source, mfd, staging)
+
+            config = self._readConfig(mfd)
+            manifest = self._contentManifest(mfd)
+            changed, removed = diffManifests(self.packageFiles(pkgObj.pkgname), manifest)
+
+            if pkgObj.isInstalled:
+                target = os.path.join(self._targetPath, pkgObj.pkgname)
+                self._applyDelta(mfd, target, changed, removed)
+                manifest = self._statManifest(target, manifest)
+
+            callExtensions("updatePackage", **locals())
+        except:
+            if staging is not None:
+                discard()
+            raise
+
+        def write(session : Session) -> None:
+            pkgObj.config = config
+            pkgObj.version = config.get("version", None)
+            pkgObj.isAvailable = True
             session.merge(pkgObj)
-            session.commit()
+            self._writeFiles(session, pkgObj.pkgname, manifest)
+
+        if staging is None:
+            self._commitWrite(write)
+        else:
+            self._commitWrite(write, promote, discard)
+
+        return changed, removed
 
+    def _stagedPaths(self, staging : str, package : str) -> typing.List[typing.Tuple[str, str]]:
+        """
+        the (staged, final) paths of a source ingested under a staging name
+        """
+
+        paths = []
+        for suffix in (".zip", ZSTD_SUFFIX, ZSTD_SUFFIX + INDEX_SUFFIX, BLOB_SUFFIX):
+            stagedPath = os.path.join(self._sourcePath, staging + suffix)
+            if os.path.exists(stagedPath):
+                ZipMFD.pool.discard(stagedPath)
+                paths.append((stagedPath, os.path.join(self._sourcePath, package + suffix)))
+        return paths
+
+    def _applyDelta(
+        self, 
+        mfd : FileDeliveryInterface, 
+        target : str, 
+        changed : typing.List[str], 
+        removed : typing.List[str],
+    ) -> None:
+        """
+        writes changed files from mfd into target and deletes removed ones
+        """
+
+        for name in changed:
+            dest = memberTarget(target, name)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            # replace instead of overwrite so hardlinked files never write through
+            with mfd.openFile(name) as src, open(dest + ".xtool-part", "wb") as dst:
+                shutil.copyfileobj(src, dst, BUFFER_SIZE)
+            os.replace(dest + ".xtool-part", dest)
+
+        for name in removed:
+            dest = memberTarget(target, name)
+            if os.path.exists(dest):
+                os.remove(dest)
+
+            # prune folders left empty
+            folder = os.path.dirname(dest)
+            while folder != target and os.path.isdir(folder) and len(os.listdir(folder)) == 0:
+                os.rmdir(folder)
+                folder = os.path.dirname(folder)
 
     def installPackage(self, package: str) -> None:
         # get package
         with self.makeSession() as session:
-            pkgObj : XToolEntry = session.query(self.XToolEntry).filter(self.XToolEntry.pkgname == package).first()
+            pkgObj : XToolEntry = self.packageQuery(session, withConfig=True).filter(self.XToolEntry.pkgname == package).first()
         
         if pkgObj is None:
             raise Exception("Package does not exist")
@@ -217,34 +899,436 @@ class XToolDB(XToolManageInterface):
         if pkgObj.isAvailable is False:
             raise Exception("Package is not available")
 
-        sourceMfd : FileDeliveryInterface = createMFD(os.path.join(self._sourcePath, package))
+        sourceMfd : FileDeliveryInterface = createMFD(os.path.join(self._sourcePath, package), self._manifestCachePath)
 
         if sourceMfd is None:
             raise Exception("Could not create MFD")
 
         # copy source files to target
-        sourceMfd.copyTo(os.path.join(self._targetPath, package))
+        target = os.path.join(self._targetPath, package)
+        if self.installMode == "copy":
+            # single pass, every file is hashed while it is written
+            manifest = sourceMfd.unpack(target, record=True)
+        elif isinstance(sourceMfd, BlobMFD):
+            # linked straight from the shared blobs, no unpacked cache needed
+            sourceMfd.linkTo(target, self.installMode, privatePatterns(pkgObj.config))
+            manifest = self._statManifest(target, self.packageFiles(package))
+        else:
+            materializeTree(
+                self._unpackedSource(sourceMfd),
+                target,
+                self.installMode,
+                privatePatterns(pkgObj.config),
+            )
+            manifest = self._statManifest(target, self.packageFiles(package))
 
-        callExtensions(**locals())
+        callExtensions("installPackage", **locals())
 
         # set package as installed
-        with self.makeSession() as session:
-            session : Session
+        def write(session : Session) -> None:
             pkgObj.isInstalled = True
             session.merge(pkgObj)
-            session.commit()
+            self._writeFiles(session, package, manifest)
+
+        self._commitWrite(write)
         
+    def uninstallPackage(self, package : str) -> None:
+        """
+        uninstalls a package
+
+        the installed folder is renamed into the trash and deleted in the background,
+        the package is marked as not installed before this returns
+        """
+
+        with self.makeSession() as session:
+            pkgObj : XToolEntry = self.packageQuery(session, withConfig=True).filter(self.XToolEntry.pkgname == package).first()
+
+        if pkgObj is None:
+            raise Exception("Package does not exist")
+
+        if not pkgObj.isInstalled:
+            raise Exception("Package is not installed")
+
+        self.trash.discard(os.path.join(self._targetPath, package))
+
+        callExtensions("uninstallPackage", **locals())
+
+        def write(session : Session) -> None:
+            pkgObj.isInstalled = False
+            session.merge(pkgObj)
+            # the rows stay as the content manifest of the source, only the install state is dropped
+            session.query(self.XToolFileEntry).filter(
+                self.XToolFileEntry.pkgname == package
+            ).update({"mtime" : None}, synchronize_session=False)
+
+        self._commitWrite(write)
+
+    def verifyPackage(self, package : str, executor : Executor = None) -> VerifyReport:
+        """
+        compares an installed package against its file rows
+
+        Args:
+            package (str): the package name
+            executor (Executor, optional): the pool hashing suspect files. Defaults to a private pool.
+
+        Returns:
+            VerifyReport: the missing, modified and extra files
+        """
+
+        with self.makeSession() as session:
+            pkgObj : XToolEntry = self.packageQuery(session).filter(self.XToolEntry.pkgname == package).first()
+
+        if pkgObj is None:
+            raise Exception("Package does not exist")
+
+        if not pkgObj.isInstalled:
+            raise Exception("Package is not installed")
+
+        report = verifyTree(package, os.path.join(self._targetPath, package), self.packageFiles(package), executor)
+
+        callExtensions("verifyPackage", **locals())
+
+        return report
+
+    def verifyAll(self, workers : int = None) -> typing.List[VerifyReport]:
+        """
+        verifies every installed package
+
+        packages are checked one after another while a single pool hashes the suspects of all of them
+
+        Args:
+            workers (int, optional): the hashing thread count. Defaults to the executor default.
+        """
+
+        packages = [x.pkgname for x in self.iterPackages(installed=True)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [self.verifyPackage(x, executor) for x in packages]
+
+    def exportPackage(
+        self,
+        package : str,
+        target : str,
+        fmt : str = "zip",
+        workers : int = None,
+        level : int = 3,
+    ) -> str:
+        """
+        writes a package into the target folder
+
+        a stored archive already in the requested format is cloned (reflink, copy_file_range or sendfile),
+        otherwise the archive is streamed straight into target from the installed tree,
+        or from the stored source when the package is not installed
+
+        Args:
+            package (str): the package name
+            target (str): the folder to export to
+            fmt (str, optional): one of EXPORT_FORMATS. Defaults to "zip".
+            workers (int, optional): compression or extraction threads. Defaults to None.
+            level (int, optional): the zstd level. Defaults to 3.
+
+        Returns:
+            str: the exported path
+        """
+
+        if fmt not in EXPORT_FORMATS:
+            raise Exception(f"Unknown export format {fmt}")
+
+        with self.makeSession() as session:
+            pkgObj : XToolEntry = self.packageQuery(session).filter(self.XToolEntry.pkgname == package).first()
+
+        if pkgObj is None:
+            raise Exception("Package does not exist")
+
+        installed = os.path.join(self._targetPath, package) if pkgObj.isInstalled else None
+        sourceMfd : FileDeliveryInterface = createMFD(os.path.join(self._sourcePath, package), self._manifestCachePath)
+        if sourceMfd is None and installed is None:
+            raise Exception("Could not create MFD")
+
+        os.makedirs(target, exist_ok=True)
+        dest = os.path.join(target, package)
+
+        try:
+            if fmt == "zip" and isinstance(sourceMfd, ZipMFD):
+                exported = dest + ".zip"
+                cloneFile(sourceMfd.file_path, exported)
+            elif fmt == "zstd" and isinstance(sourceMfd, ZstdMFD):
+                exported = dest + ZSTD_SUFFIX
+                cloneFile(sourceMfd.file_path + INDEX_SUFFIX, exported + INDEX_SUFFIX)
+                cloneFile(sourceMfd.file_path, exported)
+            elif fmt == "folder":
+                exported = dest
+                if installed is not None:
+                    materializeTree(installed, exported, "reflink")
+                else:
+                    sourceMfd.unpack(exported, workers)
+            elif fmt == "zip":
+                exported = dest + ".zip"
+                if installed is not None:
+                    packFolder(installed, exported, workers)
+                elif isinstance(sourceMfd, FolderMFD):
+                    sourceMfd.zipTo(dest, workers)
+                else:
+                    sourceMfd.zipTo(dest)
+            else:
+                exported = repackToZstd(FolderMFD(installed) if installed is not None else sourceMfd, dest, level).file_path
+        finally:
+            if sourceMfd is not None:
+                sourceMfd.close()
+
+        callExtensions("exportPackage", **locals())
+
+        return exported
+
+    def backupPackageUsrData(self, package : str, target : str = None) -> dict:
+        """
+        snapshots the user data of an installed package into a deduplicated store
+
+        user data is every file matching the "usrData" globs of xtool.json (falling back to "mutable")
+        plus every file the package does not own, unchanged files are not read again
+
+        Args:
+            package (str): the package name
+            target (str, optional): the snapshot store. Defaults to folderpath/backup.
+
+        Returns:
+            dict: {"snapshot", "files", "reused", "newChunks", "newBytes"}
+        """
+
+        with self.makeSession() as session:
+            pkgObj : XToolEntry = self.packageQuery(session, withConfig=True).filter(self.XToolEntry.pkgname == package).first()
+
+        if pkgObj is None:
+            raise Exception("Package does not exist")
+
+        if not pkgObj.isInstalled:
+            raise Exception("Package is not installed")
+
+        patterns = pkgObj.config.get("usrData") or pkgObj.config.get("mutable") or []
+        owned = self.packageFiles(package)
+        root = os.path.join(self._targetPath, package)
+        files = {
+            name : stat for name, stat in scanTree(root).items()
+            if name not in owned or isMutable(name, patterns)
+        }
+
+        result = SnapshotStore(target or self._backupPath).backup(package, root, files)
+
+        callExtensions("backupPackageUsrData", **locals())
+
+        return result
+
+    def restorePackageUsrData(
+        self,
+        package : str,
+        snapshot : str = None,
+        files : typing.List[str] = None,
+        target : str = None,
+    ) -> typing.List[str]:
+        """
+        writes backed up user data back into the installed package
+
+        Args:
+            package (str): the package name
+            snapshot (str, optional): the snapshot id. Defaults to the latest.
+            files (list, optional): the files to restore. Defaults to every file of the snapshot.
+            target (str, optional): the snapshot store. Defaults to folderpath/backup.
+
+        Returns:
+            list: the restored files
+        """
+
+        return SnapshotStore(target or self._backupPath).restore(
+            package, os.path.join(self._targetPath, package), snapshot, files
+        )
+
+    def _writeFiles(self, session : Session, package : str, manifest : typing.Dict[str, dict]) -> None:
+        """
+        replaces the file rows of a package with a bulk insert
+
+        Args:
+            session (Session): the session of the surrounding transaction
+            package (str): the package name
+            manifest (dict): {path : {"size", "hash", "mtime"}}
+        """
+
+        session.query(self.XToolFileEntry).filter(self.XToolFileEntry.pkgname == package).delete(synchronize_session=False)
+        if len(manifest) == 0:
+            return
+
+        session.execute(
+            self.XToolFileEntry.__table__.insert(),
+            [
+                {
+                    "pkgname" : package,
+                    "path" : name,
+                    "size" : entry.get("size"),
+                    "mtime" : entry.get("mtime"),
+                    "hash" : entry.get("hash"),
+                }
+                for name, entry in manifest.items()
+            ],
+        )
+
+    def packageFiles(self, package : str) -> typing.Dict[str, dict]:
+        """
+        returns the files owned by a package
+
+        Returns:
+            dict: {path : {"size", "hash", "mtime"}}
+        """
+
+        table = self.XToolFileEntry
+        with self.makeSession() as session:
+            rows = session.query(table.path, table.size, table.hash, table.mtime).filter(table.pkgname == package).all()
+
+        return {
+            path : {"size" : size, "hash" : digest, "mtime" : mtime}
+            for path, size, digest, mtime in rows
+        }
+
+    def fileOwners(self, path : str) -> typing.List[str]:
+        """
+        returns the packages that own a relative path
+        """
+
+        table = self.XToolFileEntry
+        with self.makeSession() as session:
+            return [x for x, in session.query(table.pkgname).filter(table.path == path).order_by(table.pkgname).all()]
+
+    def fileConflicts(self, package : str, other : str = None) -> typing.Dict[str, typing.List[str]]:
+        """
+        returns the paths of a package that are also owned by other packages
+
+        Args:
+            package (str): the package to check
+            other (str, optional): only compare against this package. Defaults to every package.
+
+        Returns:
+            dict: {path : [other owners]}
+        """
+
+        table = self.XToolFileEntry
+        otherTable = sqlalchemy.orm.aliased(table)
+        with self.makeSession() as session:
+            query = (
+                session.query(table.path, otherTable.pkgname)
+                .join(otherTable, otherTable.path == table.path)
+                .filter(table.pkgname == package, otherTable.pkgname != package)
+            )
+            if other is not None:
+                query = query.filter(otherTable.pkgname == other)
+
+            conflicts = {}
+            for path, owner in query.order_by(table.path, otherTable.pkgname).all():
+                conflicts.setdefault(path, []).append(owner)
+
+        return conflicts
+
+    def _statManifest(self, target : str, manifest : typing.Dict[str, dict]) -> typing.Dict[str, dict]:
+        """
+        adds the installed mtime of every file to a content manifest
+        """
+
+        installed = {}
+        for name, entry in manifest.items():
+            path = memberTarget(target, name)
+            if os.path.exists(path):
+                installed[name] = {**entry, "mtime" : os.stat(path).st_mtime_ns}
+
+        return installed
+
+    def _unpackedSource(self, mfd : FileDeliveryInterface) -> str:
+        """
+        returns a folder holding the unpacked content of a source
+
+        folder sources are used as is, archives are unpacked once into the cache
+        and unpacked again only when the archive changes
+
+        Args:
+            mfd (FileDeliveryInterface): the source medium
+
+        Returns:
+            str: the unpacked folder
+        """
+
+        if isinstance(mfd, FolderMFD):
+            return mfd.file_path
+
+        cacheDir = os.path.join(self._cachePath, mfd.pkgName)
+        stampPath = cacheDir + ".stamp"
+        stat = os.stat(mfd.file_path)
+        stamp = f"{os.path.basename(mfd.file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+        if os.path.isdir(cacheDir) and os.path.exists(stampPath):
+            with open(stampPath, "r") as f:
+                if f.read() == stamp:
+                    return cacheDir
+
+        self.trash.discard(cacheDir)
+        self.trash.discard(cacheDir + ".part")
+        mfd.unpack(cacheDir + ".part")
+        os.replace(cacheDir + ".part", cacheDir)
+        with open(stampPath, "w") as f:
+            f.write(stamp)
+
+        return cacheDir
+
+    def repackSource(self, package : str, level : int = 3) -> None:
+        """
+        converts the stored zip of a package into a .tar.zst with a member index
+
+        the zip is removed once the new archive is in place
+
+        Args:
+            package (str): the package name
+            level (int, optional): the zstd level. Defaults to 3.
+        """
+
+        sourceMfd : FileDeliveryInterface = createMFD(os.path.join(self._sourcePath, package), self._manifestCachePath)
+
+        if sourceMfd is None:
+            raise Exception("Could not create MFD")
+
+        if isinstance(sourceMfd, ZstdMFD):
+            return
+
+        if not isinstance(sourceMfd, ZipMFD):
+            raise Exception("Only zip sources can be repacked")
+
+        repackToZstd(sourceMfd, os.path.join(self._sourcePath, package), level)
+
+        sourceMfd.close()
+        sourceMfd.pool.discard(sourceMfd.file_path)
+        os.remove(sourceMfd.file_path)
+
+    def collectGarbage(self) -> typing.Tuple[int, int]:
+        """
+        deletes the blobs of the source store no package references anymore
+
+        Returns:
+            tuple: (removed blobs, freed bytes)
+        """
+
+        return self.blobStore.collectGarbage()
+
     def purgeAll(self):
         # remove everything in the db
         with self.makeSession() as session:
             session : Session
             session.query(self.XToolEntry).delete()
+            session.query(self.XToolFileEntry).delete()
+            session.query(self.XToolHookCacheEntry).delete()
             session.commit()
 
-        # remove target folder
-        shutil.rmtree(self._targetPath, ignore_errors=True)
+        # swap the target folder for an empty one, the old tree is deleted in the background
+        self.trash.discard(self._targetPath)
+        os.makedirs(self._targetPath, exist_ok=True)
+
+        # the next rescan starts over
+        if os.path.exists(self._sourceSnapshotPath):
+            os.remove(self._sourceSnapshotPath)
 
-        callExtensions(**locals())
+        callExtensions("purgeAll", **locals())
 
 
         
@@ -0,0 +1,147 @@
+from concurrent.futures import Executor
+import threading
+import typing
+from xtool.exception import XToolNotImplementedException
+from xtool.ext import XToolExtension, scopesConflict
+
+_worker = threading.local()
+
+class HookPlan(typing.NamedTuple):
+    """
+    how the extensions of one hook are run
+
+    extensions are in dependency order, waves group the indices that may run
+    at the same time, every wave starts once the previous one finished
+    """
+
+    extensions : typing.List[XToolExtension]
+    waves : typing.List[typing.List[int]]
+    after : typing.List[typing.FrozenSet[int]]     # the indices each extension waits for
+
+def _dependencyOrder(extensions : typing.List[XToolExtension]) -> typing.List[XToolExtension]:
+    # stable topological sort, registration order breaks ties
+    byName = {x.name : x for x in extensions}
+    ordered = []
+    done = set()
+    visiting = set()
+
+    # extensions are tracked by name, XToolExtension.__eq__ only compares parents
+    def visit(ext : XToolExtension) -> None:
+        if ext.name in done:
+            return
+        if ext.name in visiting:
+            raise Exception(f"Circular extension dependency on {ext.name}")
+        visiting.add(ext.name)
+        for name in ext.DEPENDS:
+            if name in byName:
+                visit(byName[name])
+        visiting.discard(ext.name)
+        done.add(ext.name)
+        ordered.append(ext)
+
+    for ext in extensions:
+        visit(ext)
+    return ordered
+
+def planHook(hook : str, extensions : typing.List[XToolExtension]) -> HookPlan:
+    """
+    orders the extensions of a hook and groups the ones that can run concurrently
+
+    an extension waits for the extensions it DEPENDS on and for every earlier
+    extension whose scope for this hook conflicts with its own
+    """
+
+    ordered = _dependencyOrder(extensions)
+    index = {x.name : i for i, x in enumerate(ordered)}
+    scopes = [x.hooks()[hook].scope for x in ordered]
+
+    after = []
+    levels = []
+    for i, ext in enumerate(ordered):
+        waits = {index[x] for x in ext.DEPENDS if x in index}
+        waits.update(j for j in range(i) if scopesConflict(scopes[i], scopes[j]))
+        after.append(frozenset(waits))
+        levels.append(max((levels[j] + 1 for j in waits), default=0))
+
+    waves = [[] for _ in range(max(levels, default=-1) + 1)]
+    for i, level in enumerate(levels):
+        waves[level].append(i)
+
+    return HookPlan(ordered, waves, after)
+
+def _runHook(ext : XToolExtension, hook : str, kwargs : dict, cache) -> None:
+    if hook in ext._unavailable:
+        return
+
+    outputs = ext.MEMOIZE.get(hook) if cache is not None else None
+    key = cache.key(ext, hook, kwargs, outputs) if outputs else None
+    if key is not None:
+        cached = cache.lookup(key)
+        if cached is not None:
+            cache.apply(kwargs, cached)
+            return
+
+    try:
+        ext.callMethod(hook, **kwargs)
+    except XToolNotImplementedException:
+        return
+
+    if key is not None:
+        cache.store(key, ext, hook, {x : kwargs[x] for x in outputs})
+
+def _runInWorker(ext : XToolExtension, hook : str, kwargs : dict, cache) -> None:
+    _worker.active = True
+    try:
+        _runHook(ext, hook, kwargs, cache)
+    finally:
+        _worker.active = False
+
+def runHook(hook : str, plan : HookPlan, kwargs : dict, cache = None, executor : Executor = None) -> None:
+    """
+    runs a hook on every extension of a plan
+
+    without an executor (or from inside a hook) the extensions run one after another and
+    the first error stops the hook, otherwise every wave runs concurrently, an extension
+    whose predecessors failed is skipped and the error of the first failed extension
+    (in plan order) is raised once the hook settled, so the outcome never depends on timing
+    """
+
+    try:
+        _runPlan(hook, plan, kwargs, cache, executor)
+    finally:
+        # hits only touch memory, their access times are written once per hook call
+        if cache is not None:
+            cache.flush()
+
+def _runPlan(hook : str, plan : HookPlan, kwargs : dict, cache, executor : Executor) -> None:
+    if executor is None or len(plan.extensions) == 1 or len(plan.waves) == len(plan.extensions) or getattr(_worker, "active", False):
+        for ext in plan.extensions:
+            _runHook(ext, hook, kwargs, cache)
+        return
+
+    errors : typing.Dict[int, BaseException] = {}
+    skipped = set()
+    for wave in plan.waves:
+        runnable = []
+        for i in wave:
+            if plan.after[i] & (skipped | errors.keys()):
+                skipped.add(i)
+            else:
+                runnable.append(i)
+
+        if len(runnable) == 1:
+            try:
+                _runHook(plan.extensions[runnable[0]], hook, kwargs, cache)
+            except Exception as e:
+                errors[runnable[0]] = e
+            continue
+
+        futures = {i : executor.submit(_runInWorker, plan.extensions[i], hook, kwargs, cache) for i in runnable}
+        for i, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                errors[i] = e
+
+    if errors:
+        raise errors[min(errors)]
@@ -1,5 +1,6 @@
 from pprint import pformat
 import sqlalchemy
+from sqlalchemy.orm import declared_attr, deferred
 
 class XToolEntry:
     """
@@ -9,13 +10,62 @@ class XToolEntry:
     """
 
     pkgname = sqlalchemy.Column(sqlalchemy.String, primary_key=True)
-    config = sqlalchemy.Column(sqlalchemy.JSON, default=dict)
     isAvailable = sqlalchemy.Column(sqlalchemy.Boolean, default=False)
     isInstalled = sqlalchemy.Column(sqlalchemy.Boolean, default=False)
-    filesList = sqlalchemy.Column(sqlalchemy.JSON, default=list)
+    version = sqlalchemy.Column(sqlalchemy.String, nullable=True)
+
+    @declared_attr
+    def config(cls):
+        # deferred, only loaded on access or with XToolDB.packageQuery(withConfig=True)
+        return deferred(sqlalchemy.Column(sqlalchemy.JSON, default=dict))
 
     def __str__(self) -> str:
         return self.pkgname
 
+    def toDict(self, withConfig : bool = False) -> dict:
+        data = {
+            "pkgname" : self.pkgname,
+            "version" : self.version,
+            "isAvailable" : self.isAvailable,
+            "isInstalled" : self.isInstalled,
+        }
+        if withConfig:
+            data["config"] = self.config
+        return data
+
     def __repr__(self) -> str:
-        return f"{self.pkgname}\n{pformat(self.config)}\n{pformat(self.filesList)}"
\ No newline at end of file
+        return f"{self.pkgname}\n{pformat(self.config)}"
+
+class XToolFileEntry:
+    """
+    this is a class that represents one file owned by a package
+
+    (this class is not sqlalchemy-based)
+    """
+
+    pkgname = sqlalchemy.Column(sqlalchemy.String, primary_key=True)
+    path = sqlalchemy.Column(sqlalchemy.String, primary_key=True, index=True)
+    size = sqlalchemy.Column(sqlalchemy.Integer)
+    # mtime (ns) of the installed file, None until the package is installed
+    mtime = sqlalchemy.Column(sqlalchemy.Integer, nullable=True)
+    hash = sqlalchemy.Column(sqlalchemy.String, nullable=True)
+
+    def __str__(self) -> str:
+        return f"{self.pkgname}:{self.path}"
+
+class XToolHookCacheEntry:
+    """
+    this is a class that represents the memoized outputs of one extension hook call
+
+    (this class is not sqlalchemy-based)
+    """
+
+    key = sqlalchemy.Column(sqlalchemy.String, primary_key=True)
+    extension = sqlalchemy.Column(sqlalchemy.String)
+    hook = sqlalchemy.Column(sqlalchemy.String)
+    outputs = sqlalchemy.Column(sqlalchemy.JSON, default=dict)
+    # time.time_ns() of the last hit, the oldest rows are evicted first
+    lastUsed = sqlalchemy.Column(sqlalchemy.Integer, index=True)
+
+    def __str__(self) -> str:
+        return f"{self.extension}.{self.hook}:{self.key}"
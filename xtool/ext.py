@@ -1,4 +1,3 @@
-import abc
 from functools import cached_property
 import inspect
 import typing
@@ -7,6 +6,48 @@ from xtool.interface import XToolManageInterface
 from xtool.exception import XToolNotImplementedException
 from xtool.logger import xtoolLogger
 
+# hook scopes, "<resource>:read" / "<resource>:write" entries, hooks sharing a resource
+# conflict when one of them writes, own side effects (shortcut files...) never conflict
+READS_CONFIG = "config:read"
+WRITES_CONFIG = "config:write"
+WRITES_GLOBAL = "global:write"      # XToolExtension.globalContext
+FILESYSTEM = "filesystem:own"
+EXCLUSIVE = "exclusive"             # conflicts with everything, the default of undeclared hooks
+
+def scopesConflict(a : typing.Iterable[str], b : typing.Iterable[str]) -> bool:
+    """
+    checks if two hooks must not run at the same time
+    """
+
+    if EXCLUSIVE in a or EXCLUSIVE in b:
+        return True
+
+    modes = {}
+    for entry in a:
+        resource, _, mode = entry.partition(":")
+        modes.setdefault(resource, set()).add(mode)
+
+    for entry in b:
+        resource, _, mode = entry.partition(":")
+        if resource not in modes or mode == "own" or modes[resource] == {"own"}:
+            continue
+        if mode == "write" or "write" in modes[resource]:
+            return True
+
+    return False
+
+class XToolHook(typing.NamedTuple):
+    """
+    a resolved extension hook
+    """
+
+    name : str
+    func : typing.Callable
+    params : typing.FrozenSet[str]  # the arguments passed to func, the rest goes to the context
+    ctxCls : type                   # BIND_<hook> or XToolContext
+    scope : typing.FrozenSet[str]   # SCOPE[<hook>] or EXCLUSIVE
+    isAsync : bool                  # async def hooks are run to completion on their own loop
+
 class XToolExtension(XToolManageInterface):
     """
     an extension of XToolDB,
@@ -18,9 +59,13 @@ class XToolExtension(XToolManageInterface):
     """
 
 
-    _METHODS_NOT_AVAILABLE = []     # this var stores historic methods that raises not implemented exception
     _IS_INITIALIZED = False         # flag to indicate if initCls has been called
 
+    VERSION = "0"                   # bump when hook results change, invalidates memoized results
+    MEMOIZE = {}                    # {hook : (names of the dict arguments it fills)}, see xtool.hookCache
+    DEPENDS = ()                    # names of extensions whose hooks run before the hooks of this one
+    SCOPE = {}                      # {hook : (scopes)}, hooks with disjoint scopes may run concurrently
+
     @classmethod
     def initCls(cls):
         """
@@ -31,64 +76,83 @@ class XToolExtension(XToolManageInterface):
 
         cls._IS_INITIALIZED = True
 
-    def __init__(self, parent : XToolManageInterface) -> None:
-        if isinstance(parent, XToolManageInterface) and not isinstance(parent, XToolExtension):
-            pass
-        else:
-            raise Exception("Parent must not be a XToolExtension")
+    @classmethod
+    def hooks(cls) -> typing.Dict[str, XToolHook]:
+        """
+        the hooks this class implements, resolved once per class
 
-        self._parent = parent
-        self.initCls()
-    
+        a hook is any public method defined or overridden below XToolExtension
+        """
 
-    def _actualCallMethod(self, method : str, *args, **kwargs) -> None:
-        
-        func = getattr(self, method)
+        registry = cls.__dict__.get("_HOOKS")
+        if registry is not None:
+            return registry
 
-        ctx_args, func_args = self._parseCallKwargs(func, **kwargs)
+        registry = {}
+        for name in dir(cls):
+            if name.startswith("_"):
+                continue
+            func = inspect.getattr_static(cls, name)
+            if not inspect.isfunction(func) or getattr(XToolExtension, name, None) is func:
+                continue
 
-        ctxCls = XToolContext
-        if hasattr(self.__class__,f"BIND_{method}"):
-            ctxCls = getattr(self.__class__,f"BIND_{method}")
+            ctxCls = getattr(cls, f"BIND_{name}", XToolContext)
             if not issubclass(ctxCls, XToolContext):
                 raise Exception("BIND_ method must be a subclass of XToolContext")
 
-        self.extensionContext = ctxCls(**ctx_args)
+            params = frozenset(inspect.signature(func).parameters) - {"self"}
+            scope = frozenset(cls.SCOPE.get(name, (EXCLUSIVE,)))
+            registry[name] = XToolHook(name, func, params, ctxCls, scope, inspect.iscoroutinefunction(func))
 
-        func(**func_args)
+        cls._HOOKS = registry
+        return registry
 
-    def _parseCallKwargs(self, func :typing.Callable, **kwargs) -> dict:
-        # get parameters of func
-        inspect_result = inspect.signature(func).parameters
+    def __init__(self, parent : XToolManageInterface) -> None:
+        if isinstance(parent, XToolManageInterface) and not isinstance(parent, XToolExtension):
+            pass
+        else:
+            raise Exception("Parent must not be a XToolExtension")
 
-        ctx_args = {}
+        self._parent = parent
+        # hooks that raised XToolNotImplementedException, skipped afterwards
+        self._unavailable = set()
+        self.initCls()
+
+    def _actualCallMethod(self, hook : XToolHook, **kwargs) -> None:
+        params = hook.params
         func_args = {}
+        ctx_args = {}
         for key, value in kwargs.items():
-            if key in inspect_result:
+            if key in params:
                 func_args[key] = value
             else:
                 ctx_args[key] = value
-                
-        
-        return ctx_args, func_args
 
+        self.extensionContext = hook.ctxCls(**ctx_args)
+
+        if hook.isAsync:
+            # asyncio is slow to import and only needed by async hooks
+            import asyncio
+            asyncio.run(hook.func(self, **func_args))
+        else:
+            hook.func(self, **func_args)
 
     def callMethod(self, method : str, **kwargs) -> None:
-        if method not in self.methods:
+        hook = self.hooks().get(method)
+        if hook is None or method in self._unavailable:
             raise XToolNotImplementedException("Method does not exist")
 
-        self._actualCallMethod(method, **kwargs)
+        try:
+            self._actualCallMethod(hook, **kwargs)
+        except XToolNotImplementedException:
+            self._unavailable.add(method)
+            raise
 
     def callMethodNoRaise(self, method : str, **kwargs) -> None:
-        if method not in self.methods:
+        try:
+            self.callMethod(method, **kwargs)
+        except XToolNotImplementedException:
             xtoolLogger.debug(f"Method does not exist for {self.name}")
-            return
-
-        self._actualCallMethod(method, **kwargs)
-
-    @cached_property
-    def methods(self):
-        return [x for x in dir(self) if not x.startswith("_")]
 
     @cached_property
     def name(self):
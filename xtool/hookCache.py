@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+import typing
+import sqlalchemy
+from sqlalchemy.orm import Session
+from xtool.utils.hashing import manifestDigest, newHasher
+
+class HookCache:
+    """
+    memoizes the effect of extension hooks on their declared outputs
+
+    an extension lists memoizable hooks in MEMOIZE ({hook : (output names)}), outputs are
+    dicts of the hook call (config for parseSource) that the hook mutates in place
+
+    a call is keyed by extension name, extension VERSION, hook, package name, the content
+    hash of the package manifest and the outputs as they were before the call,
+    calls without a manifest are never cached
+
+    rows live in the XToolHookCacheEntry table, the least recently used are evicted past maxEntries,
+    hits only touch memory, their access times are written by flush once a hook call is done
+    """
+
+    def __init__(self, db, maxEntries : int = 4096) -> None:
+        self._db = db
+        self.maxEntries = maxEntries
+        # key -> time.time_ns() of hits not written yet
+        self._touched : typing.Dict[str, int] = {}
+        # the row count, counted on the first store and kept up to date after
+        self._count : typing.Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(ext, hook : str, kwargs : dict, outputs : typing.Iterable[str]) -> typing.Optional[str]:
+        manifest = kwargs.get("manifest")
+        if manifest is None:
+            return None
+
+        mfd = kwargs.get("mfd")
+        package = mfd.pkgName if mfd is not None else kwargs.get("package")
+        hasher = newHasher()
+        hasher.update(json.dumps(
+            [
+                ext.name,
+                str(getattr(ext, "VERSION", None)),
+                hook,
+                package,
+                manifestDigest(manifest),
+                {x : kwargs.get(x) for x in outputs},
+            ],
+            sort_keys=True,
+            default=str,
+        ).encode())
+        return hasher.hexdigest()
+
+    def lookup(self, key : str) -> typing.Optional[dict]:
+        """
+        returns the memoized outputs of a call and marks them as used
+
+        Returns:
+            dict: {output name : value}, None on a miss
+        """
+
+        table = self._db.XToolHookCacheEntry
+        with self._db.makeSession() as session:
+            session : Session
+            outputs = session.query(table.outputs).filter(table.key == key).scalar()
+        if outputs is None:
+            return None
+
+        with self._lock:
+            self._touched[key] = time.time_ns()
+        return outputs
+
+    def _writeTouched(self, session : Session) -> None:
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+
+        table = self._db.XToolHookCacheEntry.__table__
+        session.execute(
+            table.update().where(table.c.key == sqlalchemy.bindparam("_key")).values(lastUsed=sqlalchemy.bindparam("_lastUsed")),
+            [{"_key" : key, "_lastUsed" : lastUsed} for key, lastUsed in touched.items()],
+        )
+
+    def flush(self) -> None:
+        """
+        writes the access times of the hits since the last flush in one transaction
+        """
+
+        with self._lock:
+            if not self._touched:
+                return
+
+        with self._db.makeSession() as session:
+            self._writeTouched(session)
+            session.commit()
+
+    def store(self, key : str, ext, hook : str, outputs : dict) -> None:
+        table = self._db.XToolHookCacheEntry
+        with self._db.makeSession() as session:
+            session : Session
+            # eviction goes by the access times, pending hits are written first
+            self._writeTouched(session)
+            isNew = session.get(table, key) is None
+            session.merge(table(
+                key=key,
+                extension=ext.name,
+                hook=hook,
+                # a json round trip detaches the stored value from the live dicts
+                outputs=json.loads(json.dumps(outputs, default=str)),
+                lastUsed=time.time_ns(),
+            ))
+            session.flush()
+
+            with self._lock:
+                if self._count is None:
+                    self._count = session.query(table).count()
+                elif isNew:
+                    self._count += 1
+                excess = self._count - self.maxEntries
+
+            if excess > 0:
+                oldest = session.query(table.key).order_by(table.lastUsed).limit(excess).subquery()
+                deleted = session.query(table).filter(table.key.in_(sqlalchemy.select(oldest.c.key))).delete(synchronize_session=False)
+                with self._lock:
+                    self._count -= deleted
+            session.commit()
+
+    def apply(self, kwargs : dict, outputs : dict) -> None:
+        """
+        replays memoized outputs onto the dicts of a call
+        """
+
+        for name, value in outputs.items():
+            target = kwargs[name]
+            target.clear()
+            target.update(json.loads(json.dumps(value)))
+
+    def clear(self) -> None:
+        with self._db.makeSession() as session:
+            session.query(self._db.XToolHookCacheEntry).delete()
+            session.commit()
+
+        with self._lock:
+            self._touched.clear()
+            self._count = 0
@@ -1,8 +1,14 @@
+from __future__ import annotations
 from abc import abstractmethod
-import sqlalchemy
+import typing
 from xtool.ctx import XToolContext
 from xtool.exception import XToolNotImplementedException
-from xtool.entry import XToolEntry
+
+# only needed for the annotations of XToolDBMockInterface, extensions import this module without sqlalchemy
+if typing.TYPE_CHECKING:
+    import sqlalchemy
+    from xtool.entry import XToolEntry, XToolFileEntry, XToolHookCacheEntry
+
 class XToolManageInterface:
     """
     this interface defines the intent for each method
@@ -25,10 +31,20 @@ class XToolManageInterface:
 
         raise XToolNotImplementedException("installPackage")
 
+    @abstractmethod
+    def updatePackage(self, source : str) -> None:
+        """
+        replace a package with a new version, writing only the files that changed
+        """
+
+        raise XToolNotImplementedException("updatePackage")
+
     @abstractmethod
     def verifyPackage(self, package : str) -> None:
         """
         verify if a package is consistent to information provided in database
+
+        XToolDB returns a VerifyReport listing missing, modified and extra files
         """
 
         raise XToolNotImplementedException("verifyPackage")
@@ -43,7 +59,7 @@ class XToolManageInterface:
 
 
     @abstractmethod
-    def exportPackage(self, package : str, target : str) -> None:
+    def exportPackage(self, package : str, target : str, fmt : str = "zip") -> None:
         """
         export a package to a target folder
         """
@@ -51,7 +67,7 @@ class XToolManageInterface:
         raise XToolNotImplementedException("exportPackage")
 
     @abstractmethod
-    def backupPackageUsrData(self, package : str, target : str) -> None:
+    def backupPackageUsrData(self, package : str, target : str = None) -> None:
         """
         backup user data of a package to a target folder
         """
@@ -76,5 +92,9 @@ class XToolDBMockInterface(XToolManageInterface):
     _sourcePath : str
     _targetPath : str
     XToolEntry : XToolEntry 
+    XToolFileEntry : XToolFileEntry
+    XToolHookCacheEntry : XToolHookCacheEntry
     extensions : dict
+    hookTable : dict
+    hookPlans : dict
     globalContext : XToolContext
\ No newline at end of file
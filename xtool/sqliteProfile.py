@@ -0,0 +1,79 @@
+from dataclasses import dataclass, fields
+import typing
+import sqlalchemy
+
+@dataclass
+class SQLiteProfile:
+    """
+    connection level settings applied to every sqlite connection of XToolDB
+
+    each field maps to the pragma of the same (snake cased) name, None leaves the sqlite default
+    """
+
+    journalMode : str = "WAL"
+    synchronous : str = "NORMAL"
+    mmapSize : int = 256 * 1024 * 1024
+    cacheSize : int = -64 * 1024          # negative values are KiB
+    busyTimeout : int = 5000              # milliseconds
+    tempStore : str = "MEMORY"
+
+    def pragmas(self) -> typing.List[str]:
+        statements = []
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if value is None:
+                continue
+            name = "".join(f"_{x.lower()}" if x.isupper() else x for x in field.name)
+            statements.append(f"PRAGMA {name}={value}")
+        return statements
+
+# profiles selectable by name
+PROFILES : typing.Dict[str, SQLiteProfile] = {
+    "default" : SQLiteProfile(),
+    # durable on power loss, still allows readers during writes
+    "safe" : SQLiteProfile(synchronous="FULL"),
+    # for throwaway deployments (ci, image builds)
+    "fast" : SQLiteProfile(synchronous="OFF", mmapSize=1024 * 1024 * 1024, cacheSize=-256 * 1024),
+    # plain sqlite defaults
+    "legacy" : SQLiteProfile(None, None, None, None, None, None),
+}
+
+def resolveProfile(profile : typing.Union[str, SQLiteProfile, None]) -> SQLiteProfile:
+    if profile is None:
+        return PROFILES["legacy"]
+    if isinstance(profile, SQLiteProfile):
+        return profile
+    if profile not in PROFILES:
+        raise Exception(f"Unknown sqlite profile {profile}")
+    return PROFILES[profile]
+
+def createEngine(dbPath : str, profile : typing.Union[str, SQLiteProfile, None] = "default", echo : bool = False) -> sqlalchemy.engine.Engine:
+    """
+    creates a pooled sqlite engine with the profile applied on every new connection
+
+    Args:
+        dbPath (str): the database file
+        profile (str | SQLiteProfile, optional): a PROFILES key or a profile. Defaults to "default".
+        echo (bool, optional): log sql statements. Defaults to False.
+    """
+
+    statements = resolveProfile(profile).pragmas()
+
+    # connections are kept open so the pragmas and the page cache survive between sessions
+    engine = sqlalchemy.create_engine(
+        f"sqlite:///{dbPath}",
+        echo=echo,
+        poolclass=sqlalchemy.pool.QueuePool,
+        connect_args={"check_same_thread" : False},
+    )
+
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def _applyPragmas(dbapiConnection, connectionRecord):
+        cursor = dbapiConnection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return engine
@@ -1,2 +1,15 @@
-from xtool.utils.folderInterface import FileDeliveryInterface, ZipMFD, FolderMFD, createMFD
-from xtool.utils.misc import getAllFiles
\ No newline at end of file
+from xtool.utils.misc import lazyModule
+
+lazyModule(__name__, {
+    "FileDeliveryInterface" : "xtool.utils.folderInterface",
+    "ZipMFD" : "xtool.utils.folderInterface",
+    "FolderMFD" : "xtool.utils.folderInterface",
+    "createMFD" : "xtool.utils.folderInterface",
+    "ZipArchivePool" : "xtool.utils.archivePool",
+    "zipPool" : "xtool.utils.archivePool",
+    "ZstdMFD" : "xtool.utils.zstdInterface",
+    "repackToZstd" : "xtool.utils.zstdInterface",
+    "BlobStore" : "xtool.utils.blobStore",
+    "BlobMFD" : "xtool.utils.blobStore",
+    "getAllFiles" : "xtool.utils.misc",
+})
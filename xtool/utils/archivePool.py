@@ -0,0 +1,209 @@
+from collections import OrderedDict
+import contextlib
+import io
+import mmap
+import os
+import threading
+import typing
+import zipfile
+
+class _MmapFile(io.RawIOBase):
+    """
+    a minimal read-only file object over a mmap
+
+    zipfile expects seekable() which mmap itself does not provide
+    """
+
+    def __init__(self, buffer : mmap.mmap, name : str = None) -> None:
+        self._buffer = buffer
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset : int, whence : int = os.SEEK_SET) -> int:
+        self._buffer.seek(offset, whence)
+        return self._buffer.tell()
+
+    def tell(self) -> int:
+        return self._buffer.tell()
+
+    def read(self, size : int = -1) -> bytes:
+        if size is None or size < 0:
+            return self._buffer.read()
+        return self._buffer.read(size)
+
+    def readinto(self, b) -> int:
+        data = self._buffer.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+class ZipHandle:
+    """
+    an open zip archive whose central directory is parsed once
+
+    members are indexed by name so lookups are a dict hit
+
+    handles are shared through ZipArchivePool, do not close them directly
+    """
+
+    def __init__(self, file_path : str, useMmap : bool = True) -> None:
+        self.file_path = file_path
+        self.signature = _fileSignature(file_path)
+
+        self._fp = open(file_path, "rb")
+        self._mmap = None
+        source = self._fp
+        if useMmap and self.signature[0] > 0:
+            try:
+                self._mmap = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+                source = _MmapFile(self._mmap, file_path)
+            except (OSError, ValueError):
+                self._mmap = None
+
+        try:
+            self.zipFile = zipfile.ZipFile(source)
+        except:
+            self._closeFiles()
+            raise
+
+        self.members : typing.Dict[str, zipfile.ZipInfo] = {
+            info.filename : info for info in self.zipFile.infolist()
+        }
+
+        self.users = 0
+        self.retired = False
+        self.closed = False
+
+    def open(self, name : str):
+        """
+        opens a member for reading
+
+        Args:
+            name (str): the member name
+
+        Raises:
+            KeyError: if the member does not exist
+        """
+
+        return self.zipFile.open(self.members[name])
+
+    def read(self, name : str) -> bytes:
+        with self.open(name) as f:
+            return f.read()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.zipFile.close()
+        self._closeFiles()
+
+    def _closeFiles(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        self._fp.close()
+
+class ZipArchivePool:
+    """
+    a bounded LRU of open ZipHandle shared across ZipMFD instances
+
+    handles that are still leased are never closed, they are closed as soon as
+    the last lease is released once they fall out of the LRU or get discarded
+    """
+
+    def __init__(self, maxSize : int = 16, useMmap : bool = True) -> None:
+        self.maxSize = maxSize
+        self.useMmap = useMmap
+        self._handles : typing.Dict[str, ZipHandle] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def acquire(self, file_path : str) -> ZipHandle:
+        """
+        returns a handle for file_path and registers one user on it
+
+        every acquire must be paired with release
+
+        Args:
+            file_path (str): the path to the zip file
+        """
+
+        key = os.path.abspath(file_path)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and handle.signature != _fileSignature(key):
+                self._retire(key)
+                handle = None
+
+            if handle is None:
+                handle = ZipHandle(key, self.useMmap)
+                self._handles[key] = handle
+            else:
+                self._handles.move_to_end(key)
+
+            handle.users += 1
+            self._evict()
+            return handle
+
+    def release(self, handle : ZipHandle) -> None:
+        with self._lock:
+            handle.users -= 1
+            if handle.users <= 0 and handle.retired:
+                handle.close()
+            self._evict()
+
+    @contextlib.contextmanager
+    def lease(self, file_path : str) -> typing.Iterator[ZipHandle]:
+        """
+        context manager version of acquire/release
+        """
+
+        handle = self.acquire(file_path)
+        try:
+            yield handle
+        finally:
+            self.release(handle)
+
+    def discard(self, file_path : str) -> None:
+        """
+        drops the cached handle of file_path, used before the archive is modified
+        """
+
+        with self._lock:
+            self._retire(os.path.abspath(file_path))
+
+    def closeAll(self) -> None:
+        with self._lock:
+            for key in list(self._handles.keys()):
+                self._retire(key)
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def _retire(self, key : str) -> None:
+        handle = self._handles.pop(key, None)
+        if handle is None:
+            return
+        handle.retired = True
+        if handle.users <= 0:
+            handle.close()
+
+    def _evict(self) -> None:
+        if len(self._handles) <= self.maxSize:
+            return
+
+        for key in list(self._handles.keys()):
+            if len(self._handles) <= self.maxSize:
+                break
+            if self._handles[key].users <= 0:
+                self._retire(key)
+
+def _fileSignature(file_path : str) -> typing.Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+# the default pool shared by every ZipMFD
+zipPool = ZipArchivePool()
@@ -0,0 +1,253 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+import json
+import os
+import typing
+import zipfile
+import shutil
+from xtool.exception import XToolException
+from xtool.utils.cas import ContentStore
+from xtool.utils.folderInterface import FileDeliveryInterface, FolderMFD, ZipMFD
+from xtool.utils.linkInstall import INSTALL_MODES, cloneWritable, placeFile
+from xtool.utils.zipExtract import BUFFER_SIZE, memberTarget
+
+BLOB_SUFFIX = ".xblob.json"
+BLOB_FOLDER = ".blobs"
+BLOB_VERSION = 1
+
+class BlobStore:
+    """
+    a deduplicating source store
+
+    every file is kept once in <root>/.blobs, addressed by its content hash,
+    a package is a <root>/<package>.xblob.json manifest mapping its paths to blobs
+
+    blobs are referenced by manifests only, removing a package drops its references
+    and collectGarbage deletes the blobs no manifest points at anymore
+    """
+
+    def __init__(self, root : str) -> None:
+        self.root = root
+        self.objects = ContentStore(os.path.join(root, BLOB_FOLDER))
+
+    def manifestPath(self, package : str) -> str:
+        return os.path.join(self.root, package + BLOB_SUFFIX)
+
+    def packages(self) -> typing.List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(x[:-len(BLOB_SUFFIX)] for x in os.listdir(self.root) if x.endswith(BLOB_SUFFIX))
+
+    def ingest(self, mfd : FileDeliveryInterface, package : str = None) -> "BlobMFD":
+        """
+        stores every file of a medium, files already in the store are not written again
+
+        Args:
+            mfd (FileDeliveryInterface): the medium to store
+            package (str, optional): the package name. Defaults to mfd.pkgName.
+
+        Returns:
+            BlobMFD: the stored package
+        """
+
+        package = package or mfd.pkgName
+        files = {}
+        for name in mfd.allFiles:
+            if name.endswith("/"):
+                continue
+            if isinstance(mfd, FolderMFD):
+                # hashed in place, only new content is copied
+                digest, _ = self.objects.putFile(os.path.join(mfd.file_path, *name.split("/")))
+            else:
+                with mfd.openFile(name) as src:
+                    digest, _ = self.objects.putStream(src)
+            files[name] = {"size" : self.objects.size(digest), "hash" : digest}
+
+        writeBlobManifest(self.manifestPath(package), files)
+        return BlobMFD(self.manifestPath(package))
+
+    def remove(self, package : str) -> None:
+        """
+        drops the manifest of a package, its blobs stay until the next collectGarbage
+        """
+
+        path = self.manifestPath(package)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def references(self) -> typing.Counter[str]:
+        """
+        counts how many package files point at each blob
+        """
+
+        counts = Counter()
+        for package in self.packages():
+            for entry in readBlobManifest(self.manifestPath(package)).values():
+                counts[entry["hash"]] += 1
+        return counts
+
+    def collectGarbage(self) -> typing.Tuple[int, int]:
+        """
+        deletes the blobs no package references and leftovers of interrupted writes
+
+        Returns:
+            tuple: (removed blobs, freed bytes)
+        """
+
+        referenced = self.references()
+        removed = 0
+        freed = 0
+        for digest in list(self.objects):
+            if referenced[digest] > 0:
+                continue
+            freed += self.objects.size(digest)
+            self.objects.remove(digest)
+            removed += 1
+
+        for root, dirs, files in os.walk(self.objects.root):
+            for name in files:
+                if name.startswith(".") and name.endswith(".part"):
+                    os.remove(os.path.join(root, name))
+
+        return removed, freed
+
+def readBlobManifest(path : str) -> typing.Dict[str, dict]:
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    if data.get("version") != BLOB_VERSION:
+        raise XToolException(f"unsupported blob manifest version for {path}")
+
+    return data["files"]
+
+def writeBlobManifest(path : str, files : typing.Dict[str, dict]) -> None:
+    with open(path + ".part", "w") as f:
+        json.dump({"version" : BLOB_VERSION, "files" : files}, f)
+    os.replace(path + ".part", path)
+
+class BlobMFD(FileDeliveryInterface):
+    """
+    a package of the blob store, file_path is its .xblob.json manifest
+
+    files are plain files in the store, so reads need no decompression and
+    installs can clone or hardlink them directly
+    """
+
+    @cached_property
+    def store(self) -> ContentStore:
+        return ContentStore(os.path.join(os.path.dirname(self.file_path), BLOB_FOLDER))
+
+    @cached_property
+    def files(self) -> typing.Dict[str, dict]:
+        return readBlobManifest(self.file_path)
+
+    @cached_property
+    def allFiles(self):
+        return list(self.files.keys())
+
+    def _invalidate(self):
+        super()._invalidate()
+        self.__dict__.pop("files", None)
+
+    def blobPath(self, fileName : str) -> str:
+        entry = self.files.get(fileName)
+        if entry is None:
+            raise KeyError(f"There is no item named {fileName!r} in the package")
+        return self.store.path(entry["hash"])
+
+    def contentManifest(self) -> typing.Dict[str, dict]:
+        """
+        the {path : {"size", "hash"}} manifest, known without reading any blob
+        """
+
+        return {name : {"size" : x["size"], "hash" : x["hash"]} for name, x in self.files.items()}
+
+    def openFile(self, fileName):
+        return open(self.blobPath(fileName), "rb")
+
+    def getFile(self, fileName):
+        with self.openFile(fileName) as f:
+            return f.read()
+
+    def readJsonFile(self, fileName):
+        return json.loads(self.getFile(fileName))
+
+    def writeFile(self, fileName, data):
+        if isinstance(data, str):
+            data = data.encode()
+        digest, _ = self.store.putBytes(data)
+        files = dict(self.files)
+        files[fileName] = {"size" : len(data), "hash" : digest}
+        writeBlobManifest(self.file_path, files)
+        self._invalidate()
+
+    def writeJsonFile(self, fileName, data):
+        self.writeFile(fileName, json.dumps(data).encode())
+
+    def copyFile(self, fileName, destPath):
+        cloneWritable(self.blobPath(fileName), destPath)
+
+    def _copyFiles(self, target_path, names, record):
+        manifest = {}
+        for name in names:
+            dest = memberTarget(target_path, name)
+            cloneWritable(self.blobPath(name), dest)
+            if record:
+                entry = self.files[name]
+                manifest[name] = {"size" : entry["size"], "hash" : entry["hash"], "mtime" : os.stat(dest).st_mtime_ns}
+        return manifest
+
+    def unpack(self, target_path, workers : int = None, record : bool = False):
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        names = self.allFiles
+        for folder in sorted({os.path.dirname(memberTarget(target_path, x)) for x in names} | {target_path}):
+            os.makedirs(folder, exist_ok=True)
+
+        batches = [names[i::workers] for i in range(min(workers, len(names)))]
+        if len(batches) <= 1:
+            return self._copyFiles(target_path, names, record)
+
+        manifest = {}
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            futures = [executor.submit(self._copyFiles, target_path, x, record) for x in batches]
+            for future in futures:
+                manifest.update(future.result())
+
+        return manifest
+
+    def linkTo(self, target_path : str, mode : str = "hardlink", private : typing.List[str] = None) -> None:
+        """
+        materializes the package from the shared blobs
+
+        hardlink mode links every blob except the private files, which are cloned
+        so the store is never written through, blobs are read-only so a stray
+        in-place write to a linked file fails instead of reaching other packages
+
+        Args:
+            target_path (str): the install target
+            mode (str, optional): one of INSTALL_MODES. Defaults to "hardlink".
+            private (list, optional): globs of files the package writes to, see privatePatterns. Defaults to None.
+        """
+
+        if mode not in INSTALL_MODES:
+            raise ValueError(f"unknown install mode {mode}")
+
+        for name in self.allFiles:
+            dest = memberTarget(target_path, name)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            placeFile(self.blobPath(name), dest, name, mode, private)
+
+    def copyTo(self, destPath, workers : int = None):
+        self.unpack(destPath, workers)
+        return FolderMFD(destPath)
+
+    def zipTo(self, destPath):
+        with zipfile.ZipFile(destPath + ".zip", "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for name in self.allFiles:
+                with self.openFile(name) as src, zf.open(name, "w", force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, BUFFER_SIZE)
+
+        return ZipMFD(destPath + ".zip")
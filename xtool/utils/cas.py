@@ -0,0 +1,258 @@
+import hashlib
+import os
+import stat
+import typing
+import uuid
+from xtool.utils.hashing import HASH_BUFFER_SIZE, hashFile, newHasher
+from xtool.utils.linkInstall import cloneFile
+
+# content defined chunking bounds
+MIN_CHUNK = 16 * 1024
+AVG_CHUNK = 64 * 1024
+MAX_CHUNK = 256 * 1024
+
+# stored objects are never written again
+OBJECT_MODE = 0o444
+
+def _gearTable() -> typing.List[int]:
+    # fixed pseudo random values, chunk boundaries must never change between runs
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([x]), digest_size=4).digest(), "little")
+        for x in range(256)
+    ]
+
+GEAR = _gearTable()
+
+# bytes hashed per step of _findBoundary, a boundary usually lies within the first few blocks
+BOUNDARY_BLOCK = 32 * 1024
+
+# bits of the mask -> (field size, byte tables, mask table), see _boundaryTables
+_BOUNDARY_TABLES : typing.Dict[int, typing.Tuple[int, typing.List[bytes], bytes]] = {}
+
+def _boundaryTables(bits : int) -> typing.Tuple[int, typing.List[bytes], bytes]:
+    tables = _BOUNDARY_TABLES.get(bits)
+    if tables is None:
+        # the masked digest sums bits terms below 2 ** bits shifted by up to bits - 1,
+        # so a field of 2 * bits never carries into the next one
+        fieldSize = max(1, (2 * bits + 7) // 8)
+        gear = [x & ((1 << bits) - 1) for x in GEAR]
+        byteTables = [bytes((x >> (8 * i)) & 0xFF for x in gear) for i in range((bits + 7) // 8)]
+        lastMask = bytes(x & ((1 << (bits - 8 * (len(byteTables) - 1))) - 1) for x in range(256))
+        tables = _BOUNDARY_TABLES[bits] = fieldSize, byteTables, lastMask
+    return tables
+
+def _gearDigests(data : bytes, bits : int) -> bytes:
+    """
+    the gear digest after every byte of data, masked to bits
+
+    a masked digest only depends on the last bits bytes, it is the sum of their
+    gear values shifted by their distance, so every digest is computed at once:
+    the gear values are packed into fields of one big integer and the shifted
+    copies are added by doubling
+
+    Returns:
+        bytes: one byte per byte of data, zero where the masked digest is zero
+    """
+
+    fieldSize, byteTables, lastMask = _boundaryTables(bits)
+    size = len(data)
+    packed = bytearray(size * fieldSize)
+    for i, table in enumerate(byteTables):
+        packed[i::fieldSize] = data.translate(table)
+
+    # digests = sum(values << (step * k) for k in range(bits)), one field further and one bit higher per byte
+    values = int.from_bytes(packed, "little")
+    step = 8 * fieldSize + 1
+    digests, terms = values, 1
+    for bit in bin(bits)[3:]:
+        digests += digests << (step * terms)
+        terms *= 2
+        if bit == "1":
+            digests = values + (digests << step)
+            terms += 1
+
+    digests = digests.to_bytes(size * fieldSize + bits * step // 8 + 1, "little")
+    hits = 0
+    for i in range(len(byteTables)):
+        field = digests[i:size * fieldSize:fieldSize]
+        if i == len(byteTables) - 1:
+            field = field.translate(lastMask)
+        hits |= int.from_bytes(field, "little")
+    return hits.to_bytes(size, "little")
+
+def _findBoundary(buffer : bytearray, minSize : int, maxSize : int, mask : int) -> int:
+    size = len(buffer)
+    if size <= minSize:
+        return size
+
+    end = min(size, maxSize)
+    bits = mask.bit_length()
+    view = memoryview(buffer)
+    # the first minSize bytes can never hold a boundary and are skipped,
+    # the hash starts over at minSize so later blocks only look back that far
+    start = minSize
+    while start < end:
+        stop = min(end, start + BOUNDARY_BLOCK)
+        head = max(minSize, start - max(bits - 1, 0))
+        index = _gearDigests(bytes(view[head:stop]), bits).find(0, start - head)
+        if index >= 0:
+            return head + index + 1
+        start = stop
+
+    return end
+
+def iterChunks(
+    stream : typing.BinaryIO,
+    minSize : int = MIN_CHUNK,
+    avgSize : int = AVG_CHUNK,
+    maxSize : int = MAX_CHUNK,
+) -> typing.Iterator[bytes]:
+    """
+    splits a stream into content defined chunks (gear rolling hash)
+
+    boundaries depend on the surrounding bytes only, so an insertion changes
+    the chunks around it and leaves the rest of the stream deduplicated
+
+    Args:
+        stream (typing.BinaryIO): the stream to split
+        minSize (int, optional): the smallest chunk. Defaults to MIN_CHUNK.
+        avgSize (int, optional): the expected chunk size, a power of two. Defaults to AVG_CHUNK.
+        maxSize (int, optional): the largest chunk. Defaults to MAX_CHUNK.
+    """
+
+    mask = (1 << (avgSize.bit_length() - 1)) - 1
+    buffer = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buffer) < maxSize:
+            data = stream.read(HASH_BUFFER_SIZE)
+            if not data:
+                eof = True
+            else:
+                buffer += data
+
+        if len(buffer) == 0:
+            return
+
+        cut = _findBoundary(buffer, minSize, maxSize, mask)
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
+
+class ContentStore:
+    """
+    a folder of immutable objects addressed by their content hash
+
+    objects live at <root>/<first 2 hex digits>/<digest>, writes go through
+    a temporary file and a rename so a crash never leaves a partial object,
+    objects are read-only as installs may hardlink them
+    """
+
+    def __init__(self, root : str) -> None:
+        self.root = root
+
+    def path(self, digest : str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest : str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def _commit(self, partPath : str, digest : str) -> bool:
+        dest = self.path(digest)
+        if os.path.exists(dest):
+            os.remove(partPath)
+            return False
+
+        os.chmod(partPath, OBJECT_MODE)
+        os.replace(partPath, dest)
+        return True
+
+    def _partPath(self, digest : str = None) -> str:
+        folder = os.path.join(self.root, digest[:2]) if digest else self.root
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f".{uuid.uuid4().hex}.part")
+
+    def putBytes(self, data : bytes) -> typing.Tuple[str, bool]:
+        """
+        stores data once
+
+        Returns:
+            tuple: (digest, True if the object was new)
+        """
+
+        hasher = newHasher()
+        hasher.update(data)
+        digest = hasher.hexdigest()
+        if self.has(digest):
+            return digest, False
+
+        partPath = self._partPath(digest)
+        with open(partPath, "wb") as f:
+            f.write(data)
+        return digest, self._commit(partPath, digest)
+
+    def putStream(self, stream : typing.BinaryIO) -> typing.Tuple[str, bool]:
+        """
+        stores a stream once, hashing it while it is copied
+
+        Returns:
+            tuple: (digest, True if the object was new)
+        """
+
+        partPath = self._partPath()
+        hasher = newHasher()
+        with open(partPath, "wb") as dst:
+            while True:
+                chunk = stream.read(HASH_BUFFER_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                dst.write(chunk)
+
+        digest = hasher.hexdigest()
+        os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+        return digest, self._commit(partPath, digest)
+
+    def putFile(self, path : str) -> typing.Tuple[str, bool]:
+        """
+        stores a file once, the file is hashed first and only copied when its content is new
+
+        Returns:
+            tuple: (digest, True if the object was new)
+        """
+
+        digest = hashFile(path)[1]
+        if self.has(digest):
+            return digest, False
+
+        partPath = self._partPath(digest)
+        cloneFile(path, partPath)
+        return digest, self._commit(partPath, digest)
+
+    def read(self, digest : str) -> bytes:
+        with open(self.path(digest), "rb") as f:
+            return f.read()
+
+    def remove(self, digest : str) -> None:
+        path = self.path(digest)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except PermissionError:
+            # read-only files cannot be removed on windows
+            os.chmod(path, stat.S_IWRITE)
+            os.remove(path)
+
+    def size(self, digest : str) -> int:
+        return os.path.getsize(self.path(digest))
+
+    def __iter__(self) -> typing.Iterator[str]:
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.startswith("."):
+                    yield name
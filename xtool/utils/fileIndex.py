@@ -0,0 +1,106 @@
+import threading
+import typing
+
+# only these files are accepted as fuzzy matches
+EXECUTABLE_EXTENSIONS = (".exe", ".py", ".bat", ".sh")
+
+def _ngrams(text : str, n : int) -> typing.Set[str]:
+    # fuzzywuzzy is only imported once a fuzzy lookup happens
+    from fuzzywuzzy.utils import full_process
+
+    text = full_process(text)
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class FileLookupIndex:
+    """
+    a lookup index over the file list of a medium
+
+    exact lookups hit a set, fuzzy lookups first narrow the executable files
+    down to the ones sharing the most n-grams with the query and only score those,
+    when none qualifies every file is scored and the winner still has to be an executable
+
+    fuzzy results are remembered per query since the file list does not change
+    """
+
+    def __init__(
+        self,
+        files : typing.Iterable[str],
+        extensions : typing.Tuple[str] = EXECUTABLE_EXTENSIONS,
+        n : int = 3,
+        candidateLimit : int = 16,
+    ) -> None:
+        self.n = n
+        self.candidateLimit = candidateLimit
+        self.extensions = extensions
+        self.names = list(files)
+        self.files = set(self.names)
+        self.candidates = sorted(x for x in self.files if x.endswith(extensions))
+        self._matches : typing.Dict[typing.Tuple[str, int], typing.Tuple[bool, str]] = {}
+        self._lock = threading.Lock()
+
+        # built on the first fuzzy lookup, exact lookups never need it
+        self._grams : typing.Dict[str, typing.List[int]] = None
+
+    def __contains__(self, filename : str) -> bool:
+        return filename in self.files
+
+    def _gramIndex(self) -> typing.Dict[str, typing.List[int]]:
+        with self._lock:
+            if self._grams is None:
+                grams = {}
+                for i, name in enumerate(self.candidates):
+                    for gram in _ngrams(name, self.n):
+                        grams.setdefault(gram, []).append(i)
+                self._grams = grams
+            return self._grams
+
+    def fuzzyCandidates(self, filename : str) -> typing.List[str]:
+        """
+        returns the executable files sharing the most n-grams with filename
+        """
+
+        if len(self.candidates) <= self.candidateLimit:
+            return self.candidates
+
+        grams = _ngrams(filename, self.n)
+        if len(grams) == 0:
+            return self.candidates
+
+        index = self._gramIndex()
+        hits : typing.Dict[int, int] = {}
+        for gram in grams:
+            for i in index.get(gram, ()):
+                hits[i] = hits.get(i, 0) + 1
+
+        best = sorted(hits.items(), key=lambda x: (-x[1], x[0]))[:self.candidateLimit]
+        return [self.candidates[i] for i, _ in best]
+
+    def match(self, filename : str, fuzzy : bool = True, threshold : int = 80) -> typing.Tuple[bool, str]:
+        """
+        see FileDeliveryInterface.hasFile
+        """
+
+        if filename in self.files:
+            return True, filename
+        if not fuzzy or len(self.candidates) == 0:
+            # without executables no winner could be accepted
+            return False, None
+
+        key = (filename, threshold)
+        with self._lock:
+            result = self._matches.get(key)
+        if result is not None:
+            return result
+
+        from fuzzywuzzy import process
+
+        candidates = self.fuzzyCandidates(filename)
+        match = process.extractOne(filename, candidates or self.names)
+        if match is not None and match[1] > threshold and match[0].endswith(self.extensions):
+            result = True, match[0]
+        else:
+            result = False, None
+
+        with self._lock:
+            self._matches[key] = result
+        return result
@@ -1,11 +1,18 @@
-from abc import abstractmethod, abstractproperty
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
 import json
 import os
 import typing
+import weakref
 import zipfile
-from fuzzywuzzy import process
 import shutil
+from xtool.utils.archivePool import ZipArchivePool, ZipHandle, zipPool
+from xtool.utils.zipExtract import extractZip, memberTarget
+from xtool.utils.hashing import streamToFile
+from xtool.utils.zipPack import packFolder
+from xtool.utils.manifest import FolderManifest
+from xtool.utils.fileIndex import FileLookupIndex
 
 class FileDeliveryInterface:
     """
@@ -63,19 +70,15 @@ class FileDeliveryInterface:
             str: filename, None if not available
         """
 
-        if filename in self.allFiles:
-            return True, filename
-        if not fuzzy:
-            return False, None
+        return self.lookupIndex.match(filename, fuzzy)
 
-        match = process.extractOne(filename, self.allFiles)
-        if match is None:
-            return False, None
-
-        if  match[1] > 80 and any(match[0].endswith(ext) for ext in [".exe", ".py",".bat",".sh"]):
-            return True, match[0]
+    @cached_property
+    def lookupIndex(self) -> FileLookupIndex:
+        """
+        the lookup index over allFiles, built once per medium
+        """
 
-        return False, None
+        return FileLookupIndex(self.allFiles)
 
 
     @abstractmethod
@@ -89,6 +92,17 @@ class FileDeliveryInterface:
 
         raise NotImplementedError("getFile is not implemented")
 
+    @abstractmethod
+    def openFile(self, fileName : str) -> typing.BinaryIO:
+        """
+        opens a file of the medium as a binary stream
+
+        Args:
+            fileName (str): the filename to open
+        """
+
+        raise NotImplementedError("openFile is not implemented")
+
     @abstractmethod
     def writeFile(self, fileName, data):
         """
@@ -150,6 +164,21 @@ class FileDeliveryInterface:
         """
         raise NotImplementedError("copyTo is not implemented")
 
+    @abstractmethod
+    def unpack(self, target_path : str, workers : int = None, record : bool = False) -> dict:
+        """
+        streams every file of the medium into target_path
+
+        Args:
+            target_path (str): the folder to write to
+            workers (int, optional): the worker count. Defaults to os.cpu_count().
+            record (bool, optional): hash every file on the way. Defaults to False.
+
+        Returns:
+            dict: {name : {"size", "hash", "mtime"}} of the written files if record
+        """
+        raise NotImplementedError("unpack is not implemented")
+
     @abstractmethod
     def zipTo(self, destPath : str):
         """
@@ -167,7 +196,29 @@ class FileDeliveryInterface:
         """
         return os.path.basename(self.file_path).split(".")[0]
 
-    def __getattribute__(self, name: str):
+    def close(self):
+        """
+        releases any resource held by the medium
+        """
+
+        pass
+
+    def _invalidate(self):
+        """
+        drops cached properties derived from the medium content
+        """
+
+        self.__dict__.pop("allFiles", None)
+        self.__dict__.pop("lookupIndex", None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, name: str):
+        # only reached when regular attribute lookup fails
         if (
             name.startswith("hasFile_") 
         ):
@@ -178,59 +229,127 @@ class FileDeliveryInterface:
                 name, ext = name.rsplit("_",1)
                 name = f"{name}.{ext}"
             
-            return name in self.allFiles
+            return name in self.lookupIndex
 
-        return super().__getattribute__(name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
 
 
 class ZipMFD(FileDeliveryInterface):
+    """
+    a zip archive medium
+
+    the archive is opened once through a shared ZipArchivePool and kept open
+    until close is called (or the instance is garbage collected)
+
+    unpack and copyTo extract in parallel, see xtool.utils.zipExtract
+    """
+
+    pool : ZipArchivePool = zipPool
+    extractWorkers : int = None     # None uses os.cpu_count()
+    extractMode : str = "thread"    # "thread" or "process"
+
+    _handle : ZipHandle = None
+    _finalizer = None
+
+    @property
+    def handle(self) -> ZipHandle:
+        """
+        the pooled archive handle, acquired on first use
+        """
+
+        if self._handle is None or self._handle.closed:
+            # the user registered on a closed handle is released once, here, not again at collection
+            if self._finalizer is not None:
+                self._finalizer()
+            self._handle = self.pool.acquire(self.file_path)
+            self._finalizer = weakref.finalize(self, self.pool.release, self._handle)
+        return self._handle
+
+    def close(self):
+        if self._finalizer is not None:
+            self._finalizer()
+        self._handle = None
+        self._finalizer = None
+
+    def _prepareWrite(self):
+        # an archive can not be appended to while it is mapped
+        self.close()
+        self.pool.discard(self.file_path)
+        self._invalidate()
+
     @cached_property
     def allFiles(self):
-        with zipfile.ZipFile(self.file_path) as zf:
-            return zf.namelist()
+        return list(self.handle.members.keys())
 
     def readJsonFile(self, fileName):
-        with zipfile.ZipFile(self.file_path) as zip_file:
-            with zip_file.open(fileName) as f:
-                return json.load(f)
+        with self.handle.open(fileName) as f:
+            return json.load(f)
 
     def writeJsonFile(self, fileName, data):
+        self._prepareWrite()
         with zipfile.ZipFile(self.file_path, "a") as zip_file:
             with zip_file.open(fileName, "w") as f:
-                json.dump(data, f)
+                f.write(json.dumps(data).encode())
+
+    def openFile(self, fileName):
+        return self.handle.open(fileName)
 
     def getFile(self, fileName):
-        with zipfile.ZipFile(self.file_path) as zip_file:
-            with zip_file.open(fileName) as f:
-                return f.read()     
+        return self.handle.read(fileName)
 
     def writeFile(self, fileName, data):
+        self._prepareWrite()
         with zipfile.ZipFile(self.file_path, "a") as zip_file:
             zip_file.write(fileName, data)
    
-    def unpack(self, target_path):
-        with zipfile.ZipFile(self.file_path) as zip_file:
-            zip_file.extractall(target_path)
+    def unpack(self, target_path, workers : int = None, record : bool = False):
+        return extractZip(
+            self.file_path,
+            target_path,
+            list(self.handle.members.values()),
+            workers=workers if workers is not None else self.extractWorkers,
+            mode=self.extractMode,
+            record=record,
+        )
 
     def copyFile(self, fileName, destPath):
-        with zipfile.ZipFile(self.file_path) as zip_file:
-            destPath = os.path.dirname(destPath)
-            zip_file.extract(fileName, destPath)
+        destPath = os.path.dirname(destPath)
+        self.handle.zipFile.extract(self.handle.members[fileName], destPath)
 
-    def copyTo(self, destPath):
-        with zipfile.ZipFile(self.file_path) as zip_file:
-            zip_file.extractall(destPath)
+    def copyTo(self, destPath, workers : int = None):
+        self.unpack(destPath, workers)
         return FolderMFD(destPath)
 
     def zipTo(self, destPath):
         shutil.copy(self.file_path, destPath)
 
 class FolderMFD(FileDeliveryInterface):
+    """
+    a plain folder medium
+
+    allFiles lists every nested file ("/" separated, like ZipMFD) from a FolderManifest,
+    cached in manifestCacheDir when one is given
+    """
+
+    def __init__(self, file_path : str, *args, manifestCacheDir : str = None, **kwargs):
+        self.manifestCacheDir = manifestCacheDir
+        super().__init__(file_path, *args, **kwargs)
+
+    @cached_property
+    def manifest(self) -> FolderManifest:
+        return FolderManifest.load(self.file_path, self.manifestCacheDir)
 
     @cached_property
     def allFiles(self):
-        return os.listdir(self.file_path)        
+        return list(self.manifest.files.keys())
+
+    def _invalidate(self):
+        super()._invalidate()
+        self.__dict__.pop("manifest", None)
     
+    def openFile(self, fileName):
+        return open(os.path.join(self.file_path, fileName), "rb")
+
     def readJsonFile(self, fileName):
         with open(os.path.join(self.file_path, fileName), "r") as f:
             return json.load(f)
@@ -238,45 +357,95 @@ class FolderMFD(FileDeliveryInterface):
     def writeJsonFile(self, fileName, data):
         with open(os.path.join(self.file_path, fileName), "w") as f:
             json.dump(data, f)
+        self._invalidate()
 
 
-    def pack(self, target_path = None, remove_source = False):
+    def pack(self, target_path = None, remove_source = False, workers : int = None):
         if target_path is None:
             target_path = self.file_path
 
-        shutil.make_archive(target_path, "zip", self.file_path)
+        packFolder(self.file_path, target_path + ".zip", workers=workers)
 
         zmfd = ZipMFD(target_path+".zip")
         if remove_source:
-            os.remove(self.file_path)
+            shutil.rmtree(self.file_path)
         return zmfd
 
     def copyFile(self, fileName, destPath):
         shutil.copyfile(os.path.join(self.file_path, fileName), destPath)
 
+    def _copyFiles(self, target_path, names, record):
+        manifest = {}
+        for name in names:
+            with self.openFile(name) as src:
+                entry = streamToFile(src, memberTarget(target_path, name), record)
+            if record:
+                manifest[name] = entry
+        return manifest
+
+    def unpack(self, target_path, workers : int = None, record : bool = False):
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        names = self.allFiles
+        for folder in sorted({os.path.dirname(memberTarget(target_path, x)) for x in names} | {target_path}):
+            os.makedirs(folder, exist_ok=True)
+
+        batches = [names[i::workers] for i in range(min(workers, len(names)))]
+        if len(batches) <= 1:
+            return self._copyFiles(target_path, names, record)
+
+        manifest = {}
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            futures = [executor.submit(self._copyFiles, target_path, x, record) for x in batches]
+            for future in futures:
+                manifest.update(future.result())
+
+        return manifest
+
     def copyTo(self, destPath):
         shutil.copytree(self.file_path, destPath)
         return FolderMFD(destPath)
 
-    def zipTo(self, destPath):
-        shutil.make_archive(destPath, "zip", self.file_path)
+    def zipTo(self, destPath, workers : int = None):
+        packFolder(self.file_path, destPath + ".zip", workers=workers)
         return ZipMFD(destPath+".zip")
 
-def createMFD( path : str)-> FileDeliveryInterface:
+def sourcePackageName(path : str) -> str:
+    """
+    the package name createMFD(path).pkgName resolves to, without opening the source
+    """
+
+    return os.path.basename(os.path.normpath(path)).split(".")[0]
+
+def createMFD( path : str, manifestCacheDir : str = None)-> FileDeliveryInterface:
     """
     creates a FileDeliveryInterface from a path
 
-    it may resolve itself to either a ZipMFD or FolderMFD depending on the path
+    it may resolve itself to either a ZipMFD, ZstdMFD, BlobMFD or FolderMFD depending on the path
 
+    Args:
+        path (str): the medium
+        manifestCacheDir (str, optional): where a FolderMFD caches its manifest. Defaults to None.
     """
+    from xtool.utils.zstdInterface import ZstdMFD, ZSTD_SUFFIX
+    from xtool.utils.blobStore import BlobMFD, BLOB_SUFFIX
 
     if os.path.exists(path) and os.path.isdir(path):
-        return FolderMFD(path)
+        return FolderMFD(path, manifestCacheDir=manifestCacheDir)
+    elif os.path.exists(path) and path.endswith(BLOB_SUFFIX):
+        return BlobMFD(path)
+    elif os.path.exists(path) and path.endswith(ZSTD_SUFFIX):
+        return ZstdMFD(path)
     elif os.path.exists(path) and zipfile.is_zipfile(path):
         return ZipMFD(path)
+    elif not path.endswith(BLOB_SUFFIX) and os.path.exists(path + BLOB_SUFFIX):
+        return BlobMFD(path + BLOB_SUFFIX)
+    elif not path.endswith(ZSTD_SUFFIX) and os.path.exists(path + ZSTD_SUFFIX):
+        return ZstdMFD(path + ZSTD_SUFFIX)
     elif ".zip" not in path and os.path.exists(path + ".zip"):
         return ZipMFD(path + ".zip")
     elif ".zip" in path and os.path.exists(path[:-4]) and os.path.isdir(path[:-4]):
-        return FolderMFD(path[:-4])
+        return FolderMFD(path[:-4], manifestCacheDir=manifestCacheDir)
 
     return None
\ No newline at end of file
@@ -0,0 +1,128 @@
+import hashlib
+import mmap
+import os
+import typing
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+def newHasher():
+    """
+    the content hash used for package manifests
+    """
+
+    return hashlib.blake2b(digest_size=20)
+
+def hashStream(stream : typing.BinaryIO) -> typing.Tuple[int, str]:
+    """
+    hashes a binary stream
+
+    Returns:
+        tuple: (size, hex digest)
+    """
+
+    hasher = newHasher()
+    size = 0
+    while True:
+        chunk = stream.read(HASH_BUFFER_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        size += len(chunk)
+
+    return size, hasher.hexdigest()
+
+def hashFile(path : str) -> typing.Tuple[int, str]:
+    with open(path, "rb") as f:
+        return hashStream(f)
+
+def hashFileMapped(path : str) -> typing.Tuple[int, str]:
+    """
+    hashes a file through a read-only mmap
+
+    the hasher releases the gil on large buffers, so this scales across threads
+    """
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        hasher = newHasher()
+        if size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+
+    return size, hasher.hexdigest()
+
+def streamToFile(src : typing.BinaryIO, destPath : str, record : bool = False) -> dict:
+    """
+    writes a binary stream to destPath with a fixed size buffer
+
+    Args:
+        src (typing.BinaryIO): the stream to copy
+        destPath (str): the file to write
+        record (bool, optional): hash the data on the way. Defaults to False.
+
+    Returns:
+        dict: {"size", "hash", "mtime"} of the written file if record, else None
+    """
+
+    hasher = newHasher() if record else None
+    size = 0
+    with open(destPath, "wb") as dst:
+        while True:
+            chunk = src.read(HASH_BUFFER_SIZE)
+            if not chunk:
+                break
+            if hasher is not None:
+                hasher.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+
+    if not record:
+        return None
+
+    return {"size" : size, "hash" : hasher.hexdigest(), "mtime" : os.stat(destPath).st_mtime_ns}
+
+def hashMFD(mfd) -> typing.Dict[str, dict]:
+    """
+    builds the content manifest of a medium
+
+    Args:
+        mfd (FileDeliveryInterface): the medium
+
+    Returns:
+        dict: {relative path : {"size" : int, "hash" : str}}
+    """
+
+    manifest = {}
+    for name in mfd.allFiles:
+        if name.endswith("/"):
+            continue
+        with mfd.openFile(name) as f:
+            size, digest = hashStream(f)
+        manifest[name] = {"size" : size, "hash" : digest}
+
+    return manifest
+
+def manifestDigest(manifest : typing.Dict[str, dict]) -> str:
+    """
+    a single hash identifying the content of a whole package
+    """
+
+    hasher = newHasher()
+    for name in sorted(manifest):
+        hasher.update(f"{name}\0{manifest[name].get('hash')}\n".encode())
+    return hasher.hexdigest()
+
+def diffManifests(old : typing.Dict[str, dict], new : typing.Dict[str, dict]) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    """
+    compares two content manifests
+
+    Returns:
+        tuple: (added or changed paths, removed paths)
+    """
+
+    changed = [
+        name for name, entry in new.items()
+        if name not in old or old[name].get("hash") != entry["hash"]
+    ]
+    removed = [name for name in old if name not in new]
+    return changed, removed
@@ -0,0 +1,177 @@
+import errno
+import fnmatch
+import os
+import shutil
+import stat
+import typing
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INSTALL_MODES = ("copy", "reflink", "hardlink")
+
+# linux/fs.h FICLONE
+FICLONE = 0x40049409
+
+_COPY_CHUNK = 64 * 1024 * 1024
+
+def _reflink(src : typing.BinaryIO, dst : typing.BinaryIO) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        return False
+
+def _copyRange(src : typing.BinaryIO, dst : typing.BinaryIO) -> bool:
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    try:
+        while os.copy_file_range(src.fileno(), dst.fileno(), _COPY_CHUNK) > 0:
+            pass
+        return True
+    except OSError as e:
+        if e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            return False
+        raise
+
+def _sendfile(src : typing.BinaryIO, dst : typing.BinaryIO) -> bool:
+    if not hasattr(os, "sendfile"):
+        return False
+
+    size = os.fstat(src.fileno()).st_size
+    offset = 0
+    try:
+        while offset < size:
+            sent = os.sendfile(dst.fileno(), src.fileno(), offset, min(_COPY_CHUNK, size - offset))
+            if sent == 0:
+                break
+            offset += sent
+        return True
+    except OSError as e:
+        if offset == 0 and e.errno in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+            dst.seek(0)
+            dst.truncate()
+            return False
+        raise
+
+def cloneFile(src : str, dst : str) -> str:
+    """
+    copies a file using the cheapest mechanism the filesystem offers
+
+    a reflink (FICLONE) is tried first, then copy_file_range, sendfile and finally a byte copy
+
+    Args:
+        src (str): the source file
+        dst (str): the destination file
+
+    Returns:
+        str: "reflink", "copy_file_range", "sendfile" or "copy"
+    """
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if _reflink(fsrc, fdst):
+            method = "reflink"
+        elif _copyRange(fsrc, fdst):
+            method = "copy_file_range"
+        elif _sendfile(fsrc, fdst):
+            method = "sendfile"
+        else:
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            method = "copy"
+
+    shutil.copystat(src, dst)
+    return method
+
+def cloneWritable(src : str, dst : str) -> str:
+    """
+    cloneFile for a private copy, the copy is writable by its owner even if src is read-only
+    """
+
+    method = cloneFile(src, dst)
+    mode = os.stat(dst).st_mode
+    if not mode & stat.S_IWUSR:
+        os.chmod(dst, mode | stat.S_IWUSR)
+    return method
+
+def isMutable(name : str, patterns : typing.List[str]) -> bool:
+    """
+    checks a "/" separated relative path against the mutable globs of xtool.json
+    """
+
+    return any(fnmatch.fnmatch(name, x) or name.startswith(x.rstrip("/") + "/") for x in patterns)
+
+def privatePatterns(config : dict) -> typing.List[str]:
+    """
+    globs of the files an install never shares with the cache or the blob store
+
+    the "mutable" and "usrData" entries of xtool.json, both are written by the app
+    """
+
+    return list(config.get("mutable") or []) + list(config.get("usrData") or [])
+
+def placeFile(src : str, dst : str, name : str, mode : str, private : typing.List[str] = None) -> None:
+    """
+    puts one file of a package into an install
+
+    hardlink mode links src unless name matches a private glob, private files and
+    every other mode get their own copy so writes never reach src
+
+    Args:
+        src (str): the shared file (unpacked cache, source folder or blob)
+        dst (str): the installed file
+        name (str): the "/" separated path of the file in the package
+        mode (str): one of INSTALL_MODES
+        private (list, optional): see privatePatterns. Defaults to None.
+    """
+
+    if mode == "copy":
+        shutil.copy2(src, dst)
+        return
+
+    if mode == "hardlink" and not isMutable(name, private or []):
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+
+    cloneWritable(src, dst)
+
+def materializeTree(
+    srcDir : str,
+    destDir : str,
+    mode : str = "reflink",
+    private : typing.List[str] = None,
+) -> None:
+    """
+    recreates srcDir at destDir without copying bytes where possible
+
+    in hardlink mode every file is linked except the private ones, which are
+    cloned so writes never reach srcDir, reflink mode clones everything
+
+    Args:
+        srcDir (str): an unpacked package
+        destDir (str): the install target
+        mode (str, optional): one of INSTALL_MODES. Defaults to "reflink".
+        private (list, optional): globs of files the package writes to, see privatePatterns. Defaults to None.
+    """
+
+    if mode not in INSTALL_MODES:
+        raise ValueError(f"unknown install mode {mode}")
+
+    for root, dirs, files in os.walk(srcDir):
+        rel = os.path.relpath(root, srcDir)
+        target = destDir if rel == "." else os.path.join(destDir, rel)
+        os.makedirs(target, exist_ok=True)
+        prefix = "" if rel == "." else rel.replace(os.sep, "/") + "/"
+
+        for name in files:
+            placeFile(os.path.join(root, name), os.path.join(target, name), prefix + name, mode, private)
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import typing
+
+MANIFEST_VERSION = 2
+
+def manifestCachePath(root : str, cacheDir : typing.Optional[str]) -> typing.Optional[str]:
+    """
+    the on-disk cache of a folder manifest, keyed by the realpath of the folder
+
+    Args:
+        root (str): the folder
+        cacheDir (str): the folder caches are kept in, XToolDB uses <deploy>/cache/.manifests
+
+    Returns:
+        str: the cache file, None without a cacheDir
+    """
+
+    if cacheDir is None:
+        return None
+
+    digest = hashlib.blake2b(os.fsencode(os.path.realpath(root)), digest_size=16).hexdigest()
+    return os.path.join(cacheDir, digest + ".json")
+
+class FolderManifest:
+    """
+    a recursive listing of a folder with the size and mtime of every file
+
+    files maps "/" separated relative paths to [size, mtime_ns]
+    dirs maps relative folder paths ("" is the root) to their mtime_ns
+
+    the manifest can be cached in a cacheDir, a cached folder is only listed again when its
+    own mtime changed and the entries of unchanged folders are trusted as they are,
+    so an in-place edit that leaves every folder mtime alone is not seen
+    (sourceSignature scans without a cache for that reason), without a cacheDir
+    the manifest lives in memory only and nothing is written beside the folder
+    """
+
+    def __init__(self, root : str, cacheDir : str = None) -> None:
+        self.root = os.path.abspath(root)
+        self.cachePath = manifestCachePath(self.root, cacheDir)
+        self.files : typing.Dict[str, typing.List[int]] = {}
+        self.dirs : typing.Dict[str, int] = {}
+
+    @classmethod
+    def load(cls, root : str, cacheDir : str = None) -> "FolderManifest":
+        """
+        loads the cached manifest of root and revalidates it
+
+        Args:
+            root (str): the folder
+            cacheDir (str, optional): the folder caches are kept in. Defaults to None, no cache.
+        """
+
+        manifest = cls(root, cacheDir)
+        cached = manifest._readCache()
+        if manifest.refresh(cached):
+            manifest.save()
+        return manifest
+
+    def _readCache(self) -> dict:
+        if self.cachePath is None:
+            return None
+
+        try:
+            with open(self.cachePath, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return data
+
+    def refresh(self, cached : dict = None) -> bool:
+        """
+        rebuilds the manifest, reusing cached folders whose mtime did not change
+
+        Returns:
+            bool: True if anything differs from the cache
+        """
+
+        cachedDirs = cached["dirs"] if cached else {}
+        cachedFiles = cached["files"] if cached else {}
+
+        childDirs : typing.Dict[str, typing.List[str]] = {}
+        for name in cachedDirs:
+            if name:
+                childDirs.setdefault(name.rpartition("/")[0], []).append(name)
+
+        # only folders whose mtime moved are listed, the files of the others come from the cache
+        scanned = {}
+        reused = []
+        dirs = {}
+        changed = cached is None
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(self.root, rel) if rel else self.root
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                changed = True
+                continue
+
+            dirs[rel] = mtime
+            if cachedDirs.get(rel) == mtime:
+                reused.append(rel)
+                stack.extend(childDirs.get(rel, []))
+                continue
+
+            changed = True
+            prefix = rel + "/" if rel else ""
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(prefix + entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        scanned[prefix + entry.name] = [stat.st_size, stat.st_mtime_ns]
+
+        if len(dirs) != len(cachedDirs):
+            changed = True
+
+        if not changed:
+            # the cache was saved sorted
+            self.files = cachedFiles
+        else:
+            reused = set(reused)
+            files = {x : y for x, y in cachedFiles.items() if x.rpartition("/")[0] in reused}
+            files.update(scanned)
+            self.files = dict(sorted(files.items()))
+        self.dirs = dirs
+        return changed
+
+    def save(self) -> None:
+        """
+        writes the cache, a read-only location is silently skipped
+        """
+
+        if self.cachePath is None:
+            return
+
+        try:
+            with open(self.cachePath + ".part", "w") as f:
+                json.dump({"version" : MANIFEST_VERSION, "dirs" : self.dirs, "files" : self.files}, f)
+            os.replace(self.cachePath + ".part", self.cachePath)
+        except OSError:
+            pass
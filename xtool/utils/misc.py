@@ -1,7 +1,7 @@
+import contextlib
+import importlib
 import os
-import inspect
-from xtool.exception import XToolNotImplementedException
-from xtool.ext import XToolExtension
+import sys
 
 def getAllFiles(path :str, exclude_prefixes : list = ["_"], exclude_suffixes : list = [".pyc"]):
     """
@@ -31,24 +31,64 @@ def getAllFiles(path :str, exclude_prefixes : list = ["_"], exclude_suffixes : l
 
     return allFilesInPath
 
-def callExtensions(**kwargs):
+def lazyModule(name : str, mapping : dict) -> None:
     """
-    this is a method that originally belongs to a method of XToolExtension 
-    
-    currently, it is used as a boilerplate solution to avoid self being passed into the extension twice
+    imports the names of a package on first access (PEP 562), importing the package stays cheap
+
+    Args:
+        name (str): the module name, usually __name__
+        mapping (dict): {attribute name : module it is imported from}
+    """
+
+    module = sys.modules[name]
+
+    def __getattr__(attr : str):
+        source = mapping.get(attr)
+        if source is None:
+            raise AttributeError(f"module {name!r} has no attribute {attr!r}")
+
+        value = getattr(importlib.import_module(source), attr)
+        setattr(module, attr, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(module)) | set(mapping))
+
+    module.__getattr__ = __getattr__
+    module.__dir__ = __dir__
+    module.__all__ = list(mapping)
+
+def callExtensions(_hook : str, /, **kwargs):
+    """
+    fires a hook on every extension of kwargs["self"] that implements it
+
+    the plan of a hook (dependency order and concurrent waves, see xtool.dispatch)
+    comes from the parent's hookPlans, built once when extensions are added, extensions
+    registered by spec are imported on the first hook fired
+
+    hooks an extension declares in MEMOIZE are served from the parent's hookCache when
+    the same package content was seen before
+
+    Args:
+        _hook (str): the hook name, usually the name of the calling method
     """ 
 
-    # method name
-    callerMethodName = inspect.stack()[1].function
-
-    for ext in kwargs.get('self').extensions.keys():
-        ext : XToolExtension
-        if callerMethodName in ext._METHODS_NOT_AVAILABLE:
-            continue
-        try:
-            ext.callMethod(callerMethodName, **{k : v for k, v in kwargs.items() if k != 'self'})
-        except XToolNotImplementedException:
-            ext._METHODS_NOT_AVAILABLE.append(callerMethodName)
-            continue
-        except:
-            raise
\ No newline at end of file
+    # imported here, xtool/__init__.py loads this module for lazyModule
+    from xtool.dispatch import runHook
+
+    parent = kwargs.pop('self')
+    if getattr(parent, "_pendingExtensions", None):
+        parent._resolveExtensions()
+    plan = parent.hookPlans.get(_hook)
+    if plan is None:
+        return
+
+    # package operations running concurrently take turns here, the waves of one call still run in parallel
+    with getattr(parent, "hookLock", None) or contextlib.nullcontext():
+        runHook(
+            _hook, 
+            plan, 
+            kwargs, 
+            getattr(parent, "hookCache", None), 
+            getattr(parent, "hookExecutor", None),
+        )
@@ -0,0 +1,196 @@
+import io
+import json
+import os
+import time
+import typing
+from xtool.exception import XToolException
+from xtool.utils.cas import ContentStore, iterChunks
+from xtool.utils.zipExtract import memberTarget
+
+class _ChunkReader(io.RawIOBase):
+    """
+    a read-only stream over the chunks of a snapshot file, one chunk in memory at a time
+    """
+
+    def __init__(self, store : ContentStore, chunks : typing.List[str]) -> None:
+        self._store = store
+        self._chunks = iter(chunks)
+        self._current = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while len(self._current) == 0:
+            digest = next(self._chunks, None)
+            if digest is None:
+                return 0
+            self._current = memoryview(self._store.read(digest))
+
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+class SnapshotStore:
+    """
+    deduplicated snapshots of package files
+
+    files are split into content defined chunks stored once in <root>/chunks for every
+    package and snapshot, a snapshot is a json file listing the chunks of each file
+    at <root>/snapshots/<package>/<snapshot id>.json
+    """
+
+    def __init__(self, root : str) -> None:
+        self.root = root
+        self.chunks = ContentStore(os.path.join(root, "chunks"))
+
+    def _snapshotFolder(self, package : str) -> str:
+        return os.path.join(self.root, "snapshots", package)
+
+    def listSnapshots(self, package : str) -> typing.List[str]:
+        """
+        returns the snapshot ids of a package, oldest first
+        """
+
+        folder = self._snapshotFolder(package)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(x[:-5] for x in os.listdir(folder) if x.endswith(".json"))
+
+    def load(self, package : str, snapshot : str = None) -> dict:
+        """
+        loads a snapshot, the latest one by default
+
+        Returns:
+            dict: {"package", "created", "files" : {path : {"size", "mtime", "mode", "chunks"}}}, None if there is none
+        """
+
+        if snapshot is None:
+            snapshots = self.listSnapshots(package)
+            if len(snapshots) == 0:
+                return None
+            snapshot = snapshots[-1]
+
+        path = os.path.join(self._snapshotFolder(package), snapshot + ".json")
+        if not os.path.exists(path):
+            raise XToolException(f"snapshot {snapshot} of {package} does not exist")
+
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def backup(self, package : str, root : str, files : typing.Dict[str, os.stat_result]) -> dict:
+        """
+        snapshots files of root
+
+        files whose size and mtime match the previous snapshot reuse its chunks without being read,
+        the others are chunked and only chunks missing from the store are written
+
+        Args:
+            package (str): the package name
+            root (str): the folder holding the files
+            files (dict): {"/" separated relative path : stat}
+
+        Returns:
+            dict: {"snapshot", "files", "reused", "newChunks", "newBytes"}
+        """
+
+        previous = self.load(package)
+        previousFiles = previous["files"] if previous else {}
+
+        entries = {}
+        stats = {"files" : len(files), "reused" : 0, "newChunks" : 0, "newBytes" : 0}
+        for name, stat in sorted(files.items()):
+            old = previousFiles.get(name)
+            if old is not None and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime_ns:
+                entries[name] = old
+                stats["reused"] += 1
+                continue
+
+            chunks = []
+            with open(os.path.join(root, *name.split("/")), "rb") as f:
+                for chunk in iterChunks(f):
+                    digest, isNew = self.chunks.putBytes(chunk)
+                    chunks.append(digest)
+                    if isNew:
+                        stats["newChunks"] += 1
+                        stats["newBytes"] += len(chunk)
+
+            entries[name] = {
+                "size" : stat.st_size,
+                "mtime" : stat.st_mtime_ns,
+                "mode" : stat.st_mode & 0o777,
+                "chunks" : chunks,
+            }
+
+        # chunks are all written before the snapshot that references them
+        snapshot = f"{time.time_ns():020d}"
+        folder = self._snapshotFolder(package)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, snapshot + ".json")
+        with open(path + ".part", "w") as f:
+            json.dump({"package" : package, "created" : time.time(), "files" : entries}, f)
+        os.replace(path + ".part", path)
+
+        stats["snapshot"] = snapshot
+        return stats
+
+    def openFile(self, package : str, name : str, snapshot : str = None) -> typing.BinaryIO:
+        """
+        streams one file of a snapshot
+
+        Args:
+            package (str): the package name
+            name (str): the "/" separated relative path
+            snapshot (str, optional): the snapshot id. Defaults to the latest.
+        """
+
+        data = self.load(package, snapshot)
+        if data is None or name not in data["files"]:
+            raise XToolException(f"{name} is not in the snapshot of {package}")
+
+        return io.BufferedReader(_ChunkReader(self.chunks, data["files"][name]["chunks"]))
+
+    def restore(
+        self,
+        package : str,
+        target : str,
+        snapshot : str = None,
+        names : typing.List[str] = None,
+    ) -> typing.List[str]:
+        """
+        writes files of a snapshot back into target, restoring their mtime
+
+        Args:
+            package (str): the package name
+            target (str): the folder to restore into
+            snapshot (str, optional): the snapshot id. Defaults to the latest.
+            names (list, optional): the files to restore. Defaults to every file.
+
+        Returns:
+            list: the restored paths
+        """
+
+        data = self.load(package, snapshot)
+        if data is None:
+            raise XToolException(f"{package} has no snapshot")
+
+        files = data["files"]
+        names = sorted(files) if names is None else names
+        for name in names:
+            if name not in files:
+                raise XToolException(f"{name} is not in the snapshot of {package}")
+
+            entry = files[name]
+            dest = memberTarget(target, name)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            # replace instead of overwrite, dest may be hardlinked to the unpacked cache or a blob
+            part = dest + ".xtool-part"
+            with open(part, "wb") as f:
+                for digest in entry["chunks"]:
+                    f.write(self.chunks.read(digest))
+            os.chmod(part, entry["mode"] or 0o644)
+            os.utime(part, ns=(entry["mtime"], entry["mtime"]))
+            os.replace(part, dest)
+
+        return names
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import typing
+from xtool.utils.manifest import FolderManifest
+
+SNAPSHOT_VERSION = 2
+
+def sourceSignature(path : str) -> typing.List[int]:
+    """
+    the [size, mtime_ns, inode, digest] of a source
+
+    archives use their own stat and a digest of 0, folders sum the sizes and take the newest mtime
+    of a fresh FolderManifest, the digest covers the path, size and mtime_ns of every file so an
+    in-place edit anywhere below the folder changes the signature, no manifest cache is used
+    since it only revalidates by folder mtime
+    """
+
+    stat = os.stat(path)
+    if not os.path.isdir(path):
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino, 0]
+
+    manifest = FolderManifest(path)
+    manifest.refresh()
+    digest = hashlib.blake2b(digest_size=8)
+    for name, (size, mtime) in sorted(manifest.files.items()):
+        digest.update(f"{name}\0{size}\0{mtime}\n".encode("utf-8", "surrogateescape"))
+
+    size = sum(x[0] for x in manifest.files.values())
+    mtime = max([stat.st_mtime_ns, *manifest.dirs.values(), *(x[1] for x in manifest.files.values())])
+    return [size, mtime, stat.st_ino, int.from_bytes(digest.digest(), "big")]
+
+class SourceSnapshot:
+    """
+    the signatures of every source of a folder at the last rescan
+
+    entries maps absolute source paths to their sourceSignature
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self.entries : typing.Dict[str, typing.List[int]] = {}
+        self.exists = False
+
+    @classmethod
+    def load(cls, path : str) -> "SourceSnapshot":
+        snapshot = cls(path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return snapshot
+
+        if data.get("version") == SNAPSHOT_VERSION:
+            snapshot.entries = data["entries"]
+            snapshot.exists = True
+        return snapshot
+
+    @staticmethod
+    def scan(sources : typing.List[str]) -> typing.Dict[str, typing.List[int]]:
+        """
+        signs every source, sources that vanish while scanning are left out
+        """
+
+        entries = {}
+        for source in sources:
+            try:
+                entries[source] = sourceSignature(source)
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def diff(self, current : typing.Dict[str, typing.List[int]]) -> typing.Tuple[typing.List[str], typing.List[str], typing.List[str]]:
+        """
+        compares current signatures against the snapshot
+
+        Returns:
+            tuple: (added, changed, removed) source paths
+        """
+
+        added = [x for x in current if x not in self.entries]
+        changed = [x for x in current if x in self.entries and list(self.entries[x]) != current[x]]
+        removed = [x for x in self.entries if x not in current]
+        return added, changed, removed
+
+    def save(self) -> None:
+        with open(self.path + ".part", "w") as f:
+            json.dump({"version" : SNAPSHOT_VERSION, "entries" : self.entries}, f)
+        os.replace(self.path + ".part", self.path)
+        self.exists = True
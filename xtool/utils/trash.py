@@ -0,0 +1,207 @@
+import errno
+import os
+import queue
+import stat
+import threading
+import typing
+import uuid
+from xtool.logger import xtoolLogger
+
+def _removeFiles(folder : str) -> typing.List[str]:
+    """
+    unlinks every non directory entry of folder
+
+    Returns:
+        list: the sub folders left to process
+    """
+
+    folders = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                folders.append(entry.path)
+                continue
+            try:
+                os.unlink(entry.path)
+            except PermissionError:
+                # read-only files cannot be unlinked on windows
+                os.chmod(entry.path, stat.S_IWRITE)
+                os.unlink(entry.path)
+
+    return folders
+
+def _mapDaemon(fn : typing.Callable, items : typing.List, workers : int = None) -> typing.List:
+    """
+    fn over items on daemon threads, results in item order
+
+    unlike a ThreadPoolExecutor the threads are not joined at interpreter exit,
+    so an interrupted level is simply left for the next reclaim
+    """
+
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) + 4)
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        return [fn(x) for x in items]
+
+    results = [None] * len(items)
+    errors = []
+    work = iter(enumerate(items))
+    lock = threading.Lock()
+
+    def run():
+        while not errors:
+            with lock:
+                item = next(work, None)
+            if item is None:
+                return
+            try:
+                results[item[0]] = fn(item[1])
+            except BaseException as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=run, name="xtool-trash-level", daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+def removeTree(path : str, workers : int = None) -> None:
+    """
+    removes a folder, unlinking the files of each level in parallel
+
+    Args:
+        path (str): the folder to remove
+        workers (int, optional): the thread count. Defaults to min(32, cpu count + 4).
+    """
+
+    visited = []
+    level = [path]
+    while level:
+        visited.extend(level)
+        nextLevel = []
+        for folders in _mapDaemon(_removeFiles, level, workers):
+            nextLevel.extend(folders)
+        level = nextLevel
+
+    # breadth first order, children always come after their parent
+    for folder in reversed(visited):
+        os.rmdir(folder)
+
+class TrashBin:
+    """
+    a folder that removed trees are renamed into before being deleted in the background
+
+    the rename is atomic, so callers can consider the tree gone as soon as discard returns,
+    every deleting thread is a daemon so a one-shot command never waits for it at exit,
+    whatever it did not get to stays in the trash until the next reclaim
+    """
+
+    def __init__(self, root : str, workers : int = None) -> None:
+        self.root = root
+        self.workers = workers
+        self._queue : queue.Queue = queue.Queue()
+        self._thread : threading.Thread = None
+        self._lock = threading.Lock()
+        # entries queued or being removed, reclaim skips them
+        self._scheduled : typing.Set[str] = set()
+
+    def discard(self, path : str) -> typing.Optional[str]:
+        """
+        moves path into the trash and schedules its removal
+
+        falls back to a synchronous removal when path is on another filesystem
+
+        Returns:
+            str: the trashed path, None if path did not exist
+        """
+
+        if not os.path.lexists(path):
+            return None
+
+        os.makedirs(self.root, exist_ok=True)
+        dest = os.path.join(self.root, f"{os.path.basename(os.path.normpath(path))}.{uuid.uuid4().hex}")
+        try:
+            os.rename(path, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            removeTree(path, self.workers)
+            return None
+
+        self._schedule(dest)
+        return dest
+
+    def reclaim(self) -> int:
+        """
+        schedules the removal of everything already in the trash,
+        e.g. left behind by a process that exited before its removals finished
+
+        Returns:
+            int: the number of entries waiting for removal
+        """
+
+        if not os.path.isdir(self.root):
+            return 0
+
+        entries = [os.path.join(self.root, x) for x in os.listdir(self.root)]
+        for entry in entries:
+            self._schedule(entry)
+        return len(entries)
+
+    def _schedule(self, path : str) -> bool:
+        with self._lock:
+            if path in self._scheduled:
+                return False
+            self._scheduled.add(path)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="xtool-trash", daemon=True)
+                self._thread.start()
+
+        self._queue.put(path)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            path = self._queue.get()
+            try:
+                if path is None:
+                    return
+                self._remove(path)
+                with self._lock:
+                    self._scheduled.discard(path)
+            finally:
+                self._queue.task_done()
+
+    def _remove(self, path : str) -> None:
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                removeTree(path, self.workers)
+            else:
+                os.unlink(path)
+        except OSError as e:
+            # left for the next reclaim
+            xtoolLogger.error(f"failed to empty {path}: {e}")
+
+    def wait(self) -> None:
+        """
+        blocks until every scheduled removal finished
+        """
+
+        self._queue.join()
+
+    def close(self) -> None:
+        """
+        finishes the scheduled removals and stops the thread
+        """
+
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
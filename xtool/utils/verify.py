@@ -0,0 +1,116 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+import os
+import typing
+from xtool.utils.hashing import hashFileMapped
+
+@dataclass
+class VerifyReport:
+    """
+    the differences between an installed tree and its stored manifest
+    """
+
+    package : str
+    missing : typing.List[str] = field(default_factory=list)
+    modified : typing.List[str] = field(default_factory=list)
+    extra : typing.List[str] = field(default_factory=list)
+    checked : int = 0       # files compared against the manifest
+    hashed : int = 0        # files whose stat did not settle the comparison
+
+    @property
+    def ok(self) -> bool:
+        return not (self.missing or self.modified or self.extra)
+
+    def toDict(self) -> dict:
+        return {
+            "package" : self.package,
+            "ok" : self.ok,
+            "missing" : self.missing,
+            "modified" : self.modified,
+            "extra" : self.extra,
+            "checked" : self.checked,
+            "hashed" : self.hashed,
+        }
+
+def scanTree(root : str) -> typing.Dict[str, os.stat_result]:
+    """
+    lists the files below root as {"/" separated relative path : stat}
+    """
+
+    found = {}
+    stack = [("", root)]
+    while stack:
+        rel, path = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                name = rel + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((name + "/", entry.path))
+                elif entry.is_file():
+                    found[name] = entry.stat()
+
+    return found
+
+def verifyTree(
+    package : str,
+    root : str,
+    manifest : typing.Dict[str, dict],
+    executor : Executor = None,
+) -> VerifyReport:
+    """
+    compares an installed tree against its manifest
+
+    size and mtime are compared first, only files whose mtime moved are hashed
+
+    Args:
+        package (str): the package name
+        root (str): the installed folder
+        manifest (dict): {path : {"size", "hash", "mtime"}}
+        executor (Executor, optional): the pool hashing suspects. Defaults to a private thread pool.
+
+    Returns:
+        VerifyReport
+    """
+
+    report = VerifyReport(package)
+    found = scanTree(root) if os.path.isdir(root) else {}
+
+    suspects = []
+    for name, entry in manifest.items():
+        stat = found.get(name)
+        if stat is None:
+            report.missing.append(name)
+            continue
+
+        report.checked += 1
+        if entry.get("size") is not None and stat.st_size != entry["size"]:
+            report.modified.append(name)
+        elif entry.get("mtime") is not None and stat.st_mtime_ns == entry["mtime"]:
+            continue
+        elif entry.get("hash") is None:
+            report.modified.append(name)
+        else:
+            suspects.append(name)
+
+    report.extra = sorted(x for x in found if x not in manifest)
+
+    if suspects:
+        ownExecutor = executor is None
+        if ownExecutor:
+            executor = ThreadPoolExecutor()
+        try:
+            futures = {
+                name : executor.submit(hashFileMapped, os.path.join(root, name))
+                for name in suspects
+            }
+            for name, future in futures.items():
+                report.hashed += 1
+                if future.result()[1] != manifest[name]["hash"]:
+                    report.modified.append(name)
+        finally:
+            if ownExecutor:
+                executor.shutdown()
+
+    report.missing.sort()
+    report.modified.sort()
+    return report
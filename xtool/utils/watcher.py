@@ -0,0 +1,216 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+import typing
+from xtool.logger import xtoolLogger
+
+# linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+def _loadInotify():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class FolderWatcher:
+    """
+    calls a callback in a background thread after the content of a folder changed
+
+    inotify is used on linux, the folder and every visible folder below it are watched so
+    in-place edits inside folder sources are seen too, folders created later are added
+    as they appear, other platforms poll every interval
+
+    bursts of events are merged, the callback runs once the folder was quiet for debounce seconds
+    """
+
+    def __init__(
+        self,
+        folder : str,
+        callback : typing.Callable[[], None],
+        interval : float = 5.0,
+        debounce : float = 0.5,
+        useInotify : bool = True,
+    ) -> None:
+        self.folder = folder
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self._libc = _loadInotify() if useInotify else None
+        self._stop = threading.Event()
+        self._thread : threading.Thread = None
+        # inotify watch descriptor -> watched folder
+        self._watches : typing.Dict[int, str] = {}
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._libc is not None else "poll"
+
+    def start(self) -> "FolderWatcher":
+        if self._thread is not None:
+            return self
+
+        self._stop.clear()
+        # the watch is in place before start returns, so no change made afterwards is missed
+        fd = self._openInotify()
+        self._thread = threading.Thread(target=self._run, args=(fd,), name="xtool-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _notify(self) -> None:
+        try:
+            self.callback()
+        except Exception as e:
+            xtoolLogger.error(f"watch callback failed for {self.folder}: {e}")
+
+    def _openInotify(self) -> int:
+        if self._libc is None:
+            return -1
+
+        self._watches = {}
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd >= 0 and not self._addWatches(fd, self.folder):
+            os.close(fd)
+            fd = -1
+        if fd < 0:
+            xtoolLogger.debug(f"inotify unavailable for {self.folder}, polling")
+        return fd
+
+    def _addWatches(self, fd : int, folder : str) -> bool:
+        """
+        watches folder and every visible folder below it
+
+        Returns:
+            bool: False if folder itself could not be watched
+        """
+
+        wd = self._libc.inotify_add_watch(fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            return False
+        self._watches[wd] = folder
+
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return True
+
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                continue
+            if not self._addWatches(fd, entry.path):
+                xtoolLogger.debug(f"can not watch {entry.path}")
+        return True
+
+    def _run(self, fd : int) -> None:
+        try:
+            if fd < 0:
+                self._poll()
+            else:
+                self._watch(fd)
+        finally:
+            if fd >= 0:
+                os.close(fd)
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._notify()
+
+    def _drain(self, fd : int) -> bool:
+        """
+        reads pending events
+
+        folders created or moved in are watched right away, their content is already
+        covered by the rescan the event triggers
+
+        Returns:
+            bool: True if any event is about a visible entry (hidden ones are xtool's own caches)
+        """
+
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        relevant = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, anything may have changed
+                relevant = True
+                continue
+            if mask & IN_IGNORED:
+                # the folder is gone, the kernel removed its watch
+                self._watches.pop(wd, None)
+                continue
+            if name.startswith(b"."):
+                continue
+
+            relevant = True
+            folder = self._watches.get(wd)
+            if folder is not None and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self._addWatches(fd, os.path.join(folder, os.fsdecode(name)))
+        return relevant
+
+    def _watch(self, fd : int) -> None:
+        while not self._stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 0.2)
+            if not ready or not self._drain(fd):
+                continue
+
+            # wait for the folder to settle
+            quietSince = time.monotonic()
+            while not self._stop.is_set() and time.monotonic() - quietSince < self.debounce:
+                ready, _, _ = select.select([fd], [], [], self.debounce)
+                if ready and self._drain(fd):
+                    quietSince = time.monotonic()
+
+            if not self._stop.is_set():
+                self._notify()
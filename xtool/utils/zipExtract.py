@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import typing
+import zipfile
+from xtool.exception import XToolException
+from xtool.utils.hashing import streamToFile
+
+# archives below both limits are extracted serially
+PARALLEL_MIN_MEMBERS = 16
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+BUFFER_SIZE = 1024 * 1024
+
+def memberTarget(target_path : str, name : str) -> str:
+    """
+    resolves where a member is written inside target_path
+
+    absolute paths, drive letters and parent references are stripped the same way zipfile.extract does
+
+    Args:
+        target_path (str): the extraction root
+        name (str): the member name
+
+    Returns:
+        str: the absolute destination path
+    """
+
+    name = name.replace("\\", "/")
+    parts = [
+        part for part in (os.path.splitdrive(x)[1] for x in name.split("/"))
+        if part not in ("", ".", os.path.curdir, os.path.pardir)
+    ]
+    if len(parts) == 0:
+        raise XToolException(f"invalid member name {name}")
+
+    return os.path.join(target_path, *parts)
+
+def _extractMembers(file_path : str, target_path : str, names : typing.List[str], record : bool = False) -> dict:
+    """
+    extracts names with a handle owned by the calling worker
+
+    Returns:
+        dict: the manifest of the written files if record
+    """
+
+    manifest = {}
+    with zipfile.ZipFile(file_path) as zf:
+        for name in names:
+            with zf.open(name) as src:
+                entry = streamToFile(src, memberTarget(target_path, name), record)
+            if record:
+                manifest[name] = entry
+
+    return manifest
+
+def _splitBalanced(infos : typing.List[zipfile.ZipInfo], count : int) -> typing.List[typing.List[str]]:
+    buckets = [[] for _ in range(count)]
+    sizes = [0] * count
+    for info in sorted(infos, key=lambda x: x.file_size, reverse=True):
+        index = sizes.index(min(sizes))
+        buckets[index].append(info.filename)
+        sizes[index] += info.file_size
+
+    return [x for x in buckets if len(x) > 0]
+
+def extractZip(
+    file_path : str,
+    target_path : str,
+    infos : typing.List[zipfile.ZipInfo] = None,
+    workers : int = None,
+    mode : str = "thread",
+    record : bool = False,
+) -> dict:
+    """
+    extracts a zip archive, splitting members across a worker pool
+
+    every worker opens its own handle and streams directly into target_path with
+    a fixed size buffer (zip64 members included), small archives fall back to a serial extraction
+
+    Args:
+        file_path (str): the zip archive
+        target_path (str): the folder to extract to
+        infos (list, optional): the members to extract. Defaults to every member.
+        workers (int, optional): the worker count. Defaults to os.cpu_count().
+        mode (str, optional): "thread" or "process". Defaults to "thread".
+        record (bool, optional): hash the files while writing them. Defaults to False.
+
+    Returns:
+        dict: {name : {"size", "hash", "mtime"}} if record, else an empty dict
+    """
+
+    if mode not in ("thread", "process"):
+        raise XToolException(f"unknown extraction mode {mode}")
+
+    if infos is None:
+        with zipfile.ZipFile(file_path) as zf:
+            infos = zf.infolist()
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # directories are created upfront so workers never race on makedirs
+    os.makedirs(target_path, exist_ok=True)
+    files = []
+    folders = set()
+    for info in infos:
+        dest = memberTarget(target_path, info.filename)
+        if info.is_dir():
+            folders.add(dest)
+            continue
+        folders.add(os.path.dirname(dest))
+        files.append(info)
+
+    for folder in sorted(folders):
+        os.makedirs(folder, exist_ok=True)
+
+    totalSize = sum(x.file_size for x in files)
+    if (
+        workers <= 1
+        or len(files) < 2
+        or (len(files) < PARALLEL_MIN_MEMBERS and totalSize < PARALLEL_MIN_BYTES)
+    ):
+        return _extractMembers(file_path, target_path, [x.filename for x in files], record)
+
+    batches = _splitBalanced(files, min(workers, len(files)))
+    executorCls = ThreadPoolExecutor if mode == "thread" else ProcessPoolExecutor
+    manifest = {}
+    with executorCls(max_workers=len(batches)) as executor:
+        futures = [executor.submit(_extractMembers, file_path, target_path, x, record) for x in batches]
+        for future in futures:
+            manifest.update(future.result())
+
+    return manifest
@@ -0,0 +1,412 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import struct
+import typing
+import zipfile
+import zlib
+
+# payloads that are already compressed are stored as is
+STORED_EXTENSIONS = {
+    ".7z", ".bz2", ".cab", ".exe", ".gz", ".jar", ".jpeg", ".jpg", ".msi",
+    ".mp3", ".mp4", ".png", ".rar", ".whl", ".xz", ".zip", ".zst",
+}
+
+# files at or above this size are split into chunks that are compressed in parallel
+LARGE_FILE_SIZE = 16 * 1024 * 1024
+
+# the chunk size of large files, every chunk after the first is primed with the
+# last 32 KiB before it so the ratio stays close to a single deflate stream
+CHUNK_SIZE = 4 * 1024 * 1024
+
+_WINDOW_SIZE = 32 * 1024
+
+# upper bound of file bytes held by pending compression jobs
+MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+
+def defaultPolicy(name : str, size : int) -> int:
+    """
+    the default per-file compression policy
+
+    Args:
+        name (str): the member name
+        size (int): the file size
+
+    Returns:
+        int: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+    """
+
+    if size < 64 or os.path.splitext(name)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+
+    return zipfile.ZIP_DEFLATED
+
+def _walk(folder : str) -> typing.Iterator[typing.Tuple[str, str, bool]]:
+    """
+    yields (member name, path, isDir) in a stable order
+    """
+
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        rel = os.path.relpath(root, folder).replace(os.sep, "/")
+        prefix = "" if rel == "." else rel + "/"
+        if prefix:
+            yield prefix, root, True
+
+        for name in sorted(files):
+            yield prefix + name, os.path.join(root, name), False
+
+def _compressFile(path : str, name : str, compressType : int, level : int) -> typing.Tuple[zipfile.ZipInfo, bytes]:
+    zinfo = zipfile.ZipInfo.from_file(path, name)
+    zinfo.compress_type = compressType
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data)
+    if compressType == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+
+    zinfo.compress_size = len(data)
+    return zinfo, data
+
+def _compressChunk(path : str, offset : int, size : int, compressType : int, level : int, last : bool) -> typing.Tuple[bytes, int, int]:
+    """
+    compresses one chunk of a large file into a piece of a raw deflate stream
+
+    chunks but the last end with Z_SYNC_FLUSH, which ends on a byte boundary without
+    a final block, so the pieces concatenate into one valid stream
+
+    Returns:
+        tuple: (data, crc32 of the raw chunk, raw chunk size)
+    """
+
+    with open(path, "rb") as f:
+        window = b""
+        if offset > 0 and compressType == zipfile.ZIP_DEFLATED:
+            f.seek(max(0, offset - _WINDOW_SIZE))
+            window = f.read(offset - f.tell())
+        else:
+            f.seek(offset)
+        data = f.read(size)
+
+    crc = zlib.crc32(data)
+    rawSize = len(data)
+    if compressType == zipfile.ZIP_DEFLATED:
+        if window:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=window)
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    return data, crc, rawSize
+
+def _gf2Times(mat : typing.List[int], vec : int) -> int:
+    result = 0
+    for row in mat:
+        if not vec:
+            break
+        if vec & 1:
+            result ^= row
+        vec >>= 1
+    return result
+
+def _gf2Square(mat : typing.List[int]) -> typing.List[int]:
+    return [_gf2Times(mat, row) for row in mat]
+
+def crc32Combine(crc1 : int, crc2 : int, len2 : int) -> int:
+    """
+    the crc32 of a + b from crc32(a), crc32(b) and len(b), as zlib's crc32_combine
+    """
+
+    if len2 <= 0:
+        return crc1
+
+    # operator for one zero bit, then two and four
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = _gf2Square(odd)
+    odd = _gf2Square(even)
+
+    # apply len2 zero bytes to crc1
+    while True:
+        even = _gf2Square(odd)
+        if len2 & 1:
+            crc1 = _gf2Times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+
+        odd = _gf2Square(even)
+        if len2 & 1:
+            crc1 = _gf2Times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+
+    return crc1 ^ crc2
+
+# the archive is written by _ZipWriter below, zipfile has no public api for members compressed
+# elsewhere, only its ZipInfo records and constants are used, no ZipFile internals
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_ZIP64_END_RECORD = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+
+_DEFAULT_VERSION = 20
+_ZIP64_VERSION = 45
+_UTF8_FLAG = 0x800
+
+# sizes, offsets and member counts past these need zip64 records
+ZIP64_LIMIT = zipfile.ZIP64_LIMIT
+ZIP_FILECOUNT_LIMIT = zipfile.ZIP_FILECOUNT_LIMIT
+
+def _zip64Extra(*values : int) -> bytes:
+    return struct.pack(f"<HH{len(values)}Q", 1, 8 * len(values), *values)
+
+class _ZipWriter:
+    """
+    a minimal zip writer for members compressed elsewhere
+
+    members are appended in order, the local header of a member is written first and
+    rewritten with its crc and sizes once its data is complete, close writes the central
+    directory with zip64 records when sizes, offsets or the member count need them
+    """
+
+    def __init__(self, path : str) -> None:
+        self.fp = open(path, "wb")
+        self.members : typing.List[zipfile.ZipInfo] = []
+
+    @staticmethod
+    def _encode(zinfo : zipfile.ZipInfo) -> typing.Tuple[bytes, int, int, int]:
+        """
+        Returns:
+            tuple: (encoded name, flag bits, dos time, dos date)
+        """
+
+        try:
+            name, flags = zinfo.filename.encode("ascii"), 0
+        except UnicodeEncodeError:
+            name, flags = zinfo.filename.encode("utf-8"), _UTF8_FLAG
+
+        year, month, day, hour, minute, second = zinfo.date_time
+        return name, flags, hour << 11 | minute << 5 | second // 2, (year - 1980) << 9 | month << 5 | day
+
+    def _localHeader(self, zinfo : zipfile.ZipInfo, zip64 : bool) -> bytes:
+        name, flags, dosTime, dosDate = self._encode(zinfo)
+        fileSize, compressSize, extra, version = zinfo.file_size, zinfo.compress_size, b"", _DEFAULT_VERSION
+        if zip64:
+            extra = _zip64Extra(fileSize, compressSize)
+            fileSize = compressSize = 0xFFFFFFFF
+            version = _ZIP64_VERSION
+
+        return _LOCAL_HEADER.pack(
+            b"PK\003\004", version, 0, flags, zinfo.compress_type, dosTime, dosDate,
+            zinfo.CRC, compressSize, fileSize, len(name), len(extra),
+        ) + name + extra
+
+    def begin(self, zinfo : zipfile.ZipInfo) -> bool:
+        """
+        writes the local header of a member, sizes and crc are filled in by end
+
+        Returns:
+            bool: whether the header has zip64 sizes, decided up front so the rewritten header keeps its length
+        """
+
+        zip64 = zinfo.file_size * 1.05 > ZIP64_LIMIT
+        zinfo.header_offset = self.fp.tell()
+        self.fp.write(self._localHeader(zinfo, zip64))
+        return zip64
+
+    def append(self, data : bytes) -> None:
+        self.fp.write(data)
+
+    def end(self, zinfo : zipfile.ZipInfo, zip64 : bool) -> None:
+        """
+        rewrites the local header with the final sizes and crc and registers the member
+        """
+
+        if not zip64 and (zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT):
+            raise zipfile.LargeZipFile(f"{zinfo.filename} grew past the zip64 limit while packing")
+
+        end = self.fp.tell()
+        self.fp.seek(zinfo.header_offset)
+        self.fp.write(self._localHeader(zinfo, zip64))
+        self.fp.seek(end)
+        self.members.append(zinfo)
+
+    def write(self, zinfo : zipfile.ZipInfo, data : bytes) -> None:
+        """
+        appends an already compressed member
+        """
+
+        zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+        zinfo.header_offset = self.fp.tell()
+        self.fp.write(self._localHeader(zinfo, zip64))
+        self.fp.write(data)
+        self.members.append(zinfo)
+
+    def _centralHeader(self, zinfo : zipfile.ZipInfo) -> bytes:
+        name, flags, dosTime, dosDate = self._encode(zinfo)
+        fields = []
+        values = []
+        for value in (zinfo.file_size, zinfo.compress_size, zinfo.header_offset):
+            if value > ZIP64_LIMIT:
+                fields.append(value)
+                value = 0xFFFFFFFF
+            values.append(value)
+        fileSize, compressSize, offset = values
+
+        extra = _zip64Extra(*fields) if fields else b""
+        version = _ZIP64_VERSION if fields else _DEFAULT_VERSION
+        return _CENTRAL_HEADER.pack(
+            b"PK\001\002", version, zinfo.create_system, version, 0, flags, zinfo.compress_type,
+            dosTime, dosDate, zinfo.CRC, compressSize, fileSize, len(name), len(extra), 0, 0, 0,
+            zinfo.external_attr, offset,
+        ) + name + extra
+
+    def close(self) -> None:
+        """
+        writes the central directory and closes the file
+        """
+
+        start = self.fp.tell()
+        for zinfo in self.members:
+            self.fp.write(self._centralHeader(zinfo))
+        end = self.fp.tell()
+
+        count, size = len(self.members), end - start
+        if count > ZIP_FILECOUNT_LIMIT or size > ZIP64_LIMIT or start > ZIP64_LIMIT:
+            self.fp.write(_ZIP64_END_RECORD.pack(
+                b"PK\006\006", _ZIP64_END_RECORD.size - 12, _ZIP64_VERSION, _ZIP64_VERSION,
+                0, 0, count, count, size, start,
+            ))
+            self.fp.write(_ZIP64_LOCATOR.pack(b"PK\006\007", 0, end, 1))
+
+        count = min(count, 0xFFFF)
+        self.fp.write(_END_RECORD.pack(b"PK\005\006", 0, 0, count, count, min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF), 0))
+        self.fp.close()
+
+class _LargeMember:
+    """
+    a large file whose compressed chunks are appended in order as they arrive
+    """
+
+    def __init__(self, zinfo : zipfile.ZipInfo) -> None:
+        self.zinfo = zinfo
+        self.zip64 = False
+        self.rawSize = 0
+
+    def begin(self, writer : _ZipWriter) -> None:
+        self.zinfo.CRC = 0
+        self.zinfo.compress_size = 0
+        self.zip64 = writer.begin(self.zinfo)
+
+    def append(self, writer : _ZipWriter, data : bytes, crc : int, rawSize : int) -> None:
+        writer.append(data)
+        self.zinfo.CRC = crc32Combine(self.zinfo.CRC, crc, rawSize)
+        self.zinfo.compress_size += len(data)
+        self.rawSize += rawSize
+
+    def end(self, writer : _ZipWriter) -> None:
+        if self.rawSize != self.zinfo.file_size:
+            raise zipfile.BadZipFile(f"{self.zinfo.filename} changed while packing")
+        writer.end(self.zinfo, self.zip64)
+
+def packFolder(
+    folder : str,
+    destPath : str,
+    workers : int = None,
+    policy : typing.Callable[[str, int], int] = defaultPolicy,
+    compresslevel : int = 6,
+) -> str:
+    """
+    packs a folder into a zip archive
+
+    files are compressed concurrently and written in a stable order, large files are split
+    into chunks compressed in parallel as well, memory stays bounded by MAX_INFLIGHT_BYTES
+
+    the archive is written next to destPath and moved into place when complete
+
+    Args:
+        folder (str): the folder to pack
+        destPath (str): the archive path
+        workers (int, optional): the compression thread count. Defaults to os.cpu_count().
+        policy (callable, optional): maps (name, size) to a zipfile compression type. Defaults to defaultPolicy.
+        compresslevel (int, optional): the deflate level. Defaults to 6.
+
+    Returns:
+        str: destPath
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    partPath = destPath + ".part"
+    # (bytes held, future or None, write) in archive order, write takes the result of the future
+    pending = deque()
+    inflight = 0
+
+    writer = _ZipWriter(partPath)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+
+            def drain(limit):
+                nonlocal inflight
+                while pending and inflight > limit:
+                    size, future, write = pending.popleft()
+                    write(future.result() if future is not None else None)
+                    inflight -= size
+
+            for name, path, isDir in _walk(folder):
+                if isDir:
+                    zinfo = zipfile.ZipInfo.from_file(path, name)
+                    zinfo.CRC = zinfo.compress_size = 0
+                    pending.append((0, None, lambda _, zinfo=zinfo: writer.write(zinfo, b"")))
+                    continue
+
+                if os.path.abspath(path) == os.path.abspath(partPath):
+                    continue
+
+                size = os.path.getsize(path)
+                compressType = policy(name, size)
+                if size < LARGE_FILE_SIZE:
+                    pending.append((
+                        size,
+                        executor.submit(_compressFile, path, name, compressType, compresslevel),
+                        lambda result: writer.write(*result),
+                    ))
+                    inflight += size
+                    drain(MAX_INFLIGHT_BYTES)
+                    continue
+
+                zinfo = zipfile.ZipInfo.from_file(path, name)
+                zinfo.compress_type = compressType
+                zinfo.file_size = size
+                member = _LargeMember(zinfo)
+                pending.append((0, None, lambda _, member=member: member.begin(writer)))
+                for offset in range(0, size, CHUNK_SIZE):
+                    chunk = min(CHUNK_SIZE, size - offset)
+                    last = offset + chunk >= size
+                    pending.append((
+                        chunk,
+                        executor.submit(_compressChunk, path, offset, chunk, compressType, compresslevel, last),
+                        lambda result, member=member: member.append(writer, *result),
+                    ))
+                    inflight += chunk
+                    drain(MAX_INFLIGHT_BYTES)
+                pending.append((0, None, lambda _, member=member: member.end(writer)))
+
+            drain(-1)
+        writer.close()
+    except:
+        writer.fp.close()
+        if os.path.exists(partPath):
+            os.remove(partPath)
+        raise
+
+    os.replace(partPath, destPath)
+    return destPath
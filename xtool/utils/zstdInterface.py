@@ -0,0 +1,361 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import typing
+import zipfile
+from xtool.exception import XToolException
+from xtool.utils.blobStore import BlobMFD
+from xtool.utils.folderInterface import FileDeliveryInterface, FolderMFD, ZipMFD
+from xtool.utils.hashing import streamToFile
+from xtool.utils.zipExtract import BUFFER_SIZE, memberTarget
+
+# zstandard is optional and slow to import, it is only looked up here
+HAS_ZSTANDARD = importlib.util.find_spec("zstandard") is not None
+
+ZSTD_SUFFIX = ".tar.zst"
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+def _requireZstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise XToolException("the zstandard package is required for .tar.zst sources")
+    return zstandard
+
+class _MemberReader(io.RawIOBase):
+    """
+    reads the payload of one member out of its own zstd frame
+    """
+
+    def __init__(self, file_path : str, entry : dict) -> None:
+        zstandard = _requireZstd()
+        self._fp = open(file_path, "rb")
+        self._fp.seek(entry["offset"])
+        self._reader = zstandard.ZstdDecompressor().stream_reader(self._fp, read_across_frames=False)
+        self._skip(entry["header"])
+        self._remaining = entry["size"]
+
+    def _skip(self, count : int) -> None:
+        while count > 0:
+            chunk = self._reader.read(min(count, BUFFER_SIZE))
+            if not chunk:
+                raise XToolException("truncated zstd member")
+            count -= len(chunk)
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size : int = -1) -> bytes:
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        if size == 0:
+            return b""
+
+        data = self._reader.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self) -> bytes:
+        chunks = []
+        while self._remaining > 0:
+            chunk = self.read(BUFFER_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._reader.close()
+            self._fp.close()
+        super().close()
+
+class ZstdArchiveWriter:
+    """
+    writes a tar stream where every member lives in its own zstd frame
+
+    the output is a regular .tar.zst (frames concatenate), the sidecar index
+    records the frame offsets so members can be read without a full decompress
+    """
+
+    def __init__(self, file_path : str, level : int = 3, append : bool = False) -> None:
+        zstandard = _requireZstd()
+        self.file_path = file_path
+        self._compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+
+        if append:
+            index = _loadIndex(file_path)
+            self.members = index["members"]
+            self._fp = open(file_path, "r+b")
+            self._fp.seek(index["eof"])
+            self._fp.truncate()
+        else:
+            self.members = {}
+            self._fp = open(file_path, "wb")
+
+    def _addFrame(self, tarinfo : tarfile.TarInfo, stream : typing.BinaryIO = None) -> None:
+        header = tarinfo.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        offset = self._fp.tell()
+        with self._compressor.stream_writer(self._fp, closefd=False) as writer:
+            writer.write(header)
+            if stream is not None:
+                copied = 0
+                while True:
+                    chunk = stream.read(BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+                    copied += len(chunk)
+                if copied != tarinfo.size:
+                    raise XToolException(f"size mismatch while packing {tarinfo.name}")
+                remainder = tarinfo.size % tarfile.BLOCKSIZE
+                if remainder:
+                    writer.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+        name = tarinfo.name + "/" if tarinfo.isdir() else tarinfo.name
+        self.members[name] = {
+            "offset" : offset,
+            "length" : self._fp.tell() - offset,
+            "header" : len(header),
+            "size" : tarinfo.size,
+            "mtime" : tarinfo.mtime,
+            "mode" : tarinfo.mode,
+        }
+
+    def addStream(self, name : str, stream : typing.BinaryIO, size : int, mtime : float = None, mode : int = 0o644) -> None:
+        """
+        adds a member from a binary stream of a known size
+        """
+
+        tarinfo = tarfile.TarInfo(name)
+        tarinfo.size = size
+        tarinfo.mtime = time.time() if mtime is None else mtime
+        tarinfo.mode = mode
+        self._addFrame(tarinfo, stream)
+
+    def addBytes(self, name : str, data : bytes) -> None:
+        self.addStream(name, io.BytesIO(data), len(data))
+
+    def addDir(self, name : str, mtime : float = None) -> None:
+        tarinfo = tarfile.TarInfo(name.rstrip("/"))
+        tarinfo.type = tarfile.DIRTYPE
+        tarinfo.mode = 0o755
+        tarinfo.mtime = time.time() if mtime is None else mtime
+        self._addFrame(tarinfo)
+
+    def close(self) -> None:
+        # end of archive marker in its own frame
+        eof = self._fp.tell()
+        with self._compressor.stream_writer(self._fp, closefd=False) as writer:
+            writer.write(tarfile.NUL * (tarfile.BLOCKSIZE * 2))
+        self._fp.close()
+
+        indexPath = self.file_path + INDEX_SUFFIX
+        with open(indexPath + ".part", "w") as f:
+            json.dump({"version" : INDEX_VERSION, "eof" : eof, "members" : self.members}, f)
+        os.replace(indexPath + ".part", indexPath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, *args):
+        if excType is None:
+            self.close()
+        else:
+            self._fp.close()
+
+def _loadIndex(file_path : str) -> dict:
+    indexPath = file_path + INDEX_SUFFIX
+    if not os.path.exists(indexPath):
+        raise XToolException(f"{file_path} has no member index")
+
+    with open(indexPath, "r") as f:
+        index = json.load(f)
+
+    if index.get("version") != INDEX_VERSION:
+        raise XToolException(f"unsupported index version for {file_path}")
+
+    return index
+
+def _extractMembers(file_path : str, target_path : str, members : typing.List[typing.Tuple[str, dict]], record : bool = False) -> dict:
+    manifest = {}
+    for name, entry in members:
+        with _MemberReader(file_path, entry) as src:
+            written = streamToFile(src, memberTarget(target_path, name), record)
+        if record:
+            manifest[name] = written
+
+    return manifest
+
+class ZstdMFD(FileDeliveryInterface):
+    """
+    a .tar.zst medium with a sidecar member index
+
+    each member is an independent zstd frame, so single files are read
+    with a seek and one frame decompress, and unpack runs in parallel
+    """
+
+    extractWorkers : int = None     # None uses os.cpu_count()
+
+    @cached_property
+    def index(self) -> dict:
+        return _loadIndex(self.file_path)
+
+    @cached_property
+    def allFiles(self):
+        return list(self.index["members"].keys())
+
+    def _invalidate(self):
+        super()._invalidate()
+        self.__dict__.pop("index", None)
+
+    def _entry(self, fileName : str) -> dict:
+        entry = self.index["members"].get(fileName)
+        if entry is None:
+            raise KeyError(f"There is no item named {fileName!r} in the archive")
+        return entry
+
+    def openFile(self, fileName):
+        return _MemberReader(self.file_path, self._entry(fileName))
+
+    def getFile(self, fileName):
+        with self.openFile(fileName) as f:
+            return f.readall()
+
+    def readJsonFile(self, fileName):
+        return json.loads(self.getFile(fileName))
+
+    def writeFile(self, fileName, data):
+        self._invalidate()
+        with ZstdArchiveWriter(self.file_path, append=True) as writer:
+            writer.addBytes(fileName, data)
+
+    def writeJsonFile(self, fileName, data):
+        self.writeFile(fileName, json.dumps(data).encode())
+
+    def copyFile(self, fileName, destPath):
+        with self.openFile(fileName) as src, open(destPath, "wb") as dst:
+            shutil.copyfileobj(src, dst, BUFFER_SIZE)
+
+    def unpack(self, target_path, workers : int = None, record : bool = False):
+        if workers is None:
+            workers = self.extractWorkers or os.cpu_count() or 1
+
+        os.makedirs(target_path, exist_ok=True)
+        files = []
+        for name, entry in self.index["members"].items():
+            dest = memberTarget(target_path, name)
+            if name.endswith("/"):
+                os.makedirs(dest, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            files.append((name, entry))
+
+        # size balanced batches, one file handle per worker
+        batches = [[] for _ in range(max(1, min(workers, len(files))))]
+        sizes = [0] * len(batches)
+        for name, entry in sorted(files, key=lambda x: x[1]["size"], reverse=True):
+            i = sizes.index(min(sizes))
+            batches[i].append((name, entry))
+            sizes[i] += entry["size"]
+
+        if len(batches) == 1:
+            return _extractMembers(self.file_path, target_path, batches[0], record)
+
+        manifest = {}
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            futures = [executor.submit(_extractMembers, self.file_path, target_path, x, record) for x in batches]
+            for future in futures:
+                manifest.update(future.result())
+
+        return manifest
+
+    def copyTo(self, destPath, workers : int = None):
+        self.unpack(destPath, workers)
+        return FolderMFD(destPath)
+
+    def zipTo(self, destPath):
+        with zipfile.ZipFile(destPath + ".zip", "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for name, entry in self.index["members"].items():
+                zinfo = zipfile.ZipInfo(name, time.localtime(entry["mtime"])[:6])
+                zinfo.external_attr = (entry["mode"] & 0xFFFF) << 16
+                if name.endswith("/"):
+                    zf.writestr(zinfo, b"")
+                    continue
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+                zinfo.file_size = entry["size"]
+                with self.openFile(name) as src, zf.open(zinfo, "w") as dst:
+                    shutil.copyfileobj(src, dst, BUFFER_SIZE)
+
+        return ZipMFD(destPath + ".zip")
+
+def repackToZstd(mfd : FileDeliveryInterface, destPath : str, level : int = 3) -> "ZstdMFD":
+    """
+    converts a zip, folder, blob or zstd medium into a .tar.zst with a member index
+
+    members are streamed one at a time, nothing is unpacked to disk first
+
+    Args:
+        mfd (FileDeliveryInterface): the medium to convert
+        destPath (str): the archive path without suffix
+        level (int, optional): the zstd level. Defaults to 3.
+
+    Returns:
+        ZstdMFD: the new medium
+    """
+
+    archivePath = destPath + ZSTD_SUFFIX
+    partPath = archivePath + ".part"
+
+    with ZstdArchiveWriter(partPath, level) as writer:
+        if isinstance(mfd, ZipMFD):
+            for info in mfd.handle.members.values():
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                if info.is_dir():
+                    writer.addDir(info.filename, mtime)
+                    continue
+                with mfd.handle.open(info.filename) as src:
+                    writer.addStream(info.filename, src, info.file_size, mtime, (info.external_attr >> 16) & 0o777 or 0o644)
+        elif isinstance(mfd, FolderMFD):
+            for root, dirs, files in os.walk(mfd.file_path):
+                dirs.sort()
+                rel = os.path.relpath(root, mfd.file_path).replace(os.sep, "/")
+                prefix = "" if rel == "." else rel + "/"
+                if prefix:
+                    writer.addDir(prefix, os.path.getmtime(root))
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    with open(path, "rb") as src:
+                        writer.addStream(prefix + name, src, stat.st_size, stat.st_mtime, stat.st_mode & 0o777)
+        elif isinstance(mfd, BlobMFD):
+            # the store keeps no mtime or mode, blobs themselves are read-only
+            for name in sorted(mfd.allFiles):
+                with mfd.openFile(name) as src:
+                    stat = os.fstat(src.fileno())
+                    writer.addStream(name, src, stat.st_size, stat.st_mtime)
+        elif isinstance(mfd, ZstdMFD):
+            for name, entry in mfd.index["members"].items():
+                if name.endswith("/"):
+                    writer.addDir(name, entry["mtime"])
+                    continue
+                with mfd.openFile(name) as src:
+                    writer.addStream(name, src, entry["size"], entry["mtime"], entry["mode"])
+        else:
+            raise XToolException(f"can not repack {type(mfd).__name__}")
+
+    os.replace(partPath + INDEX_SUFFIX, archivePath + INDEX_SUFFIX)
+    os.replace(partPath, archivePath)
+    return ZstdMFD(archivePath)
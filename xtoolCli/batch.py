@@ -0,0 +1,231 @@
+import shlex
+import time
+import typing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import click
+
+# the commands a script may use, they are parsed with the options of the cli command of the same name
+BATCH_COMMANDS = ("parse", "install", "uninstall", "update", "verify")
+
+# operations of these commands on different packages run in parallel within a phase
+CONCURRENT_COMMANDS = ("install", "uninstall", "verify")
+
+# phases of these commands take more operations as long as each package appears once
+GROUPED_COMMANDS = ("parse",) + CONCURRENT_COMMANDS
+
+@dataclass
+class BatchOp:
+    """
+    one line of a batch script
+    """
+
+    lineno : int
+    command : str
+    params : dict
+    # the packages the line operates on, None for verify --all
+    targets : typing.Optional[typing.List[str]]
+    # the source path of each target for parse and update
+    sources : typing.Optional[typing.List[str]] = None
+
+    def toDict(self) -> dict:
+        return {"line" : self.lineno, "command" : self.command, "targets" : self.targets}
+
+def readScript(lines : typing.Iterable[str], commands : click.Group) -> typing.List[BatchOp]:
+    """
+    parses a batch script, one cli command per line, "#" starts a comment
+
+    Args:
+        lines (iterable): the script
+        commands (click.Group): the cli the commands are looked up in
+
+    Raises:
+        click.UsageError: naming the line that can't be used
+
+    Returns:
+        list: the operations in script order
+    """
+
+    from xtool.utils.folderInterface import sourcePackageName
+
+    ops = []
+    for lineno, line in enumerate(lines, 1):
+        try:
+            args = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise click.UsageError(f"line {lineno}: {e}")
+        if len(args) == 0:
+            continue
+
+        name = args[0]
+        command = commands.get_command(None, name)
+        if name not in BATCH_COMMANDS or command is None:
+            raise click.UsageError(f"line {lineno}: {name} is not available in a batch, use one of {', '.join(BATCH_COMMANDS)}")
+
+        try:
+            with command.make_context(name, args[1:]) as ctx:
+                params = dict(ctx.params)
+        except click.ClickException as e:
+            raise click.UsageError(f"line {lineno}: {e.format_message()}")
+
+        sources = None
+        if name == "parse":
+            sources = list(params["sources"])
+            targets = [sourcePackageName(x) for x in sources]
+        elif name == "update":
+            sources = [params["source"]]
+            targets = [sourcePackageName(params["source"])]
+        elif name == "verify" and params["verifyAll"]:
+            targets = None
+        else:
+            targets = list(params["packages"])
+
+        ops.append(BatchOp(lineno, name, params, targets, sources))
+
+    return ops
+
+def planBatch(ops : typing.List[BatchOp]) -> typing.List[typing.List[BatchOp]]:
+    """
+    groups consecutive operations into phases
+
+    a phase holds operations of one command, a package appears in at most one operation
+    of a phase so they can run in parallel, every phase sees what the previous ones wrote
+
+    Returns:
+        list: the phases in execution order
+    """
+
+    phases = []
+    touched = set()
+    for op in ops:
+        phase = phases[-1] if phases else None
+        targets = set(op.targets or ())
+        if (
+            phase is not None
+            and op.command in GROUPED_COMMANDS
+            and phase[0].command == op.command
+            and (op.command == "verify" or not targets & touched)
+        ):
+            phase.append(op)
+            touched |= targets
+            continue
+
+        phases.append([op])
+        touched = targets
+
+    return phases
+
+class BatchRunner:
+    """
+    runs planned phases against a db and collects one result per package operation
+
+    the catalog writes of a phase are committed in one transaction when the phase ends,
+    operations on a package that failed earlier in the script are skipped
+    """
+
+    def __init__(self, db, jobs : int = 4) -> None:
+        """
+        Args:
+            db (XToolDB): the database
+            jobs (int, optional): package operations running at the same time. Defaults to 4.
+        """
+
+        self.db = db
+        self.jobs = jobs
+        self.failed = set()
+        self.results = []
+
+    def _result(self, op : BatchOp, target : str, status : str, **extra) -> None:
+        self.results.append({"line" : op.lineno, "command" : op.command, "target" : target, "status" : status, **extra})
+        if status in ("failed", "skipped"):
+            self.failed.add(target)
+
+    def _runParse(self, phase : typing.List[BatchOp]) -> None:
+        pending = []
+        for op in phase:
+            for source, target in zip(op.sources, op.targets):
+                if target in self.failed:
+                    self._result(op, target, "skipped", error="an earlier operation on the package failed")
+                else:
+                    pending.append((op, source, target))
+
+        if len(pending) == 0:
+            return
+
+        try:
+            result = self.db.parseSources([x[1] for x in pending], self.jobs)
+        except Exception as e:
+            result = {"parsed" : [], "skipped" : [], "failed" : {x[1] : str(e) for x in pending}}
+
+        for op, source, target in pending:
+            if source in result["failed"]:
+                self._result(op, target, "failed", error=result["failed"][source])
+            elif target in result["skipped"]:
+                self._result(op, target, "unchanged")
+            else:
+                self._result(op, target, "ok")
+
+    def _runOne(self, op : BatchOp, target : str) -> typing.Tuple[str, dict]:
+        if op.command == "install":
+            self.db.installPackage(target)
+        elif op.command == "uninstall":
+            self.db.uninstallPackage(target)
+        elif op.command == "update":
+            changed, removed = self.db.updatePackage(op.sources[0])
+            return "ok", {"changed" : len(changed), "removed" : len(removed)}
+        elif op.command == "verify":
+            report = self.db.verifyPackage(target)
+            return ("ok" if report.ok else "damaged"), {"report" : report.toDict()}
+        return "ok", {}
+
+    def _runConcurrent(self, phase : typing.List[BatchOp]) -> None:
+        work = []
+        for op in phase:
+            targets = op.targets
+            if targets is None:
+                targets = [x.pkgname for x in self.db.iterPackages(installed=True)]
+            for target in targets:
+                if target in self.failed:
+                    self._result(op, target, "skipped", error="an earlier operation on the package failed")
+                else:
+                    work.append((op, target))
+
+        def run(item):
+            try:
+                return self._runOne(*item)
+            except Exception as e:
+                return "failed", {"error" : str(e)}
+
+        workers = min(self.jobs, len(work)) if phase[0].command in CONCURRENT_COMMANDS else 1
+        if workers <= 1:
+            outcomes = [run(x) for x in work]
+        else:
+            with ThreadPoolExecutor(workers, thread_name_prefix="xtool-batch") as executor:
+                outcomes = list(executor.map(run, work))
+
+        for (op, target), (status, extra) in zip(work, outcomes):
+            self._result(op, target, status, **extra)
+
+    def run(self, phases : typing.List[typing.List[BatchOp]]) -> dict:
+        """
+        Returns:
+            dict: {"ok", "phases", "elapsed", "counts" : {status : n}, "results" : [...]}
+        """
+
+        started = time.monotonic()
+        for phase in phases:
+            with self.db.deferWrites():
+                if phase[0].command == "parse":
+                    self._runParse(phase)
+                else:
+                    self._runConcurrent(phase)
+
+        counts = Counter(x["status"] for x in self.results)
+        return {
+            "ok" : counts["failed"] == 0 and counts["damaged"] == 0,
+            "phases" : len(phases),
+            "elapsed" : round(time.monotonic() - started, 3),
+            "counts" : dict(counts),
+            "results" : self.results,
+        }
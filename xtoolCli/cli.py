@@ -1,15 +1,54 @@
+import json
+import os
+import threading
+import time
+import typing
 import click
 
 if __name__ == '__main__':
-    import os
     import sys
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from click_shell import shell
-from xtool.db import XToolDB
-from xtool_ext.shortcuts import XToolShortcuts
 
-@shell(prompt='xtoolCli> ', intro='Welcome to the xtoolCli shell.', invoke_without_command=True)
+if typing.TYPE_CHECKING:
+    # annotations only, xtool.db pulls in sqlalchemy and is imported once a command needs the catalog
+    from xtool.db import XToolDB
+
+# the daemon runs commands for clients in other working directories,
+# a worker sets .path to the client's cwd for the duration of a request
+requestCwd = threading.local()
+
+# ctx.meta key of the stream command output goes to, see commandOutput
+OUTPUT_META = "xtool.output"
+
+class CliPath(click.Path):
+    """
+    click.Path resolving relative paths against requestCwd when it is set
+    """
+
+    def convert(self, value, param, ctx):
+        cwd = getattr(requestCwd, "path", None)
+        if cwd is not None and isinstance(value, str) and not os.path.isabs(value):
+            value = os.path.join(cwd, value)
+        return super().convert(value, param, ctx)
+
+def openDB(path : str, source : str, sourceStore : str = "archive"):
+    """
+    the XToolDB used by the shell and the daemon
+
+    imported here so --help and shell completion don't pay for sqlalchemy
+    """
+
+    from xtool.db import XToolDB
+
+    db = XToolDB(path, source, sourceStore=sourceStore)
+    db._createAllTables()
+    # both resolved when the first hook fires
+    db._addExtension("xtool_ext.shortcuts:XToolShortcuts")
+    db.discoverExtensions()
+    return db
+
+@click.group(invoke_without_command=True)
 @click.option(
     '--path', 
     default="./deploy/", 
@@ -22,37 +61,262 @@ from xtool_ext.shortcuts import XToolShortcuts
     help="Path to the source folder.", 
     type=click.Path(file_okay=False, dir_okay=True, resolve_path=True)
 )
+@click.option(
+    '--source-store',
+    "sourceStore",
+    default="archive",
+    help="How sources are stored, blob deduplicates files across packages.",
+    type=click.Choice(["archive", "blob"]),
+)
 @click.pass_context
-def cliShell(ctx, path, source):
-    db : XToolDB = XToolDB(path, source)
-    db._addExtension(XToolShortcuts)
+def cliShell(ctx, path, source, sourceStore):
+    # one-shot commands open the catalog when they first need it, see contextDB
+    ctx.meta["xtool.open"] = (path, source, sourceStore)
+    if ctx.invoked_subcommand is not None:
+        return
 
-    ctx.obj = db
-    ctx.ensure_object(XToolDB)
-    
+    # the banner is for the shell only, one-shot commands keep stdout for their own output
+    ctx.obj = openDB(path, source, sourceStore)
     print("xtool initialized")
 
+    from click_shell import make_click_shell
+
+    make_click_shell(ctx, prompt='xtoolCli> ', intro='Welcome to the xtoolCli shell.').cmdloop()
+
+def commandOutput(ctx : click.Context) -> typing.Optional[typing.TextIO]:
+    """
+    the stream a command prints to, None for stdout
+
+    the daemon gives every request its own in ctx.meta[OUTPUT_META]
+    """
+
+    return ctx.meta.get(OUTPUT_META)
+
+def contextDB(ctx : click.Context) -> "XToolDB":
+    """
+    the XToolDB a command runs against
+
+    the shell and the daemon pass theirs as the root ctx.obj, a one-shot command opens
+    it here so --help, usage errors and dry runs never load sqlalchemy
+    """
+
+    root = ctx.find_root()
+    if root.obj is None:
+        root.obj = openDB(*root.meta["xtool.open"])
+    return root.obj
+
 
 @cliShell.command("list")
 @click.option("--installed", "-i", is_flag=True, help="List installed packages.")
 @click.option("--available", "-a", is_flag=True, help="List available packages.")
 @click.option("--complete", "-c", is_flag=True, help="List packages in a complete format.")
+@click.option("--format", "-f", "fmt", type=click.Choice(["text", "jsonl"]), default="text", help="Output format.")
+@click.pass_context
+def cliList(ctx, installed, available, complete, fmt):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+
+    pkgs = db.iterPackages(
+        installed=True if installed else None,
+        available=True if available else None,
+        withConfig=complete,
+    )
+    for pkg in pkgs:
+        if fmt == "jsonl":
+            click.echo(json.dumps(pkg.toDict(complete)), file=out)
+        elif complete:
+            click.echo(repr(pkg), file=out)
+        else:
+            click.echo(str(pkg), file=out)
+
+@cliShell.command("parse")
+@click.argument("sources", nargs=-1, type=CliPath(exists=True, resolve_path=True))
+@click.option("--workers", "-w", default=None, type=int, help="Scanning thread count.")
 @click.pass_context
-def cliList(ctx, installed, available, complete):
-    db : XToolDB = ctx.obj
-    query = {}
-    if installed:
-        query["isInstalled"] = True
-    if available:
-        query["isAvailable"] = True
-
-    with db.makeSession() as session:
-        pkgs = session.query(db.XToolEntry).filter_by(**query).all()
-        for pkg in pkgs:
-            if complete:
-                print(repr(pkg))
-            else:
-                print(pkg)
+def cliParse(ctx, sources, workers):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    if len(sources) == 0:
+        result = db.parseSourceFolder(workers=workers)
+    else:
+        result = db.parseSources(list(sources), workers)
+
+    click.echo(f"parsed {len(result['parsed'])}, skipped {len(result['skipped'])}, failed {len(result['failed'])}", file=out)
+    for source, error in result["failed"].items():
+        click.echo(f"  {source}: {error}", file=out)
+
+@cliShell.command("rescan")
+@click.option("--watch", "watch", is_flag=True, help="Keep rescanning on changes until interrupted.")
+@click.option("--workers", "-w", default=None, type=int, help="Scanning thread count.")
+@click.pass_context
+def cliRescan(ctx, watch, workers):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+
+    def report(result):
+        click.echo(f"parsed {len(result['parsed'])}, updated {len(result['updated'])}, removed {len(result['removed'])}, failed {len(result['failed'])}", file=out)
+        for source, error in result["failed"].items():
+            click.echo(f"  {source}: {error}", file=out)
+
+    report(db.rescan(workers))
+    if not watch:
+        return
+
+    watcher = db.watch(report)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+
+@cliShell.command("update")
+@click.argument("source", type=CliPath(exists=True, resolve_path=True))
+@click.pass_context
+def cliUpdate(ctx, source):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    changed, removed = db.updatePackage(source)
+    click.echo(f"{len(changed)} files written, {len(removed)} files removed", file=out)
+
+@cliShell.command("repack")
+@click.argument("packages", nargs=-1)
+@click.option("--all", "repackAll", is_flag=True, help="Repack every available package.")
+@click.option("--level", default=3, help="zstd compression level.")
+@click.pass_context
+def cliRepack(ctx, packages, repackAll, level):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    if repackAll:
+        with db.makeSession() as session:
+            packages = [x.pkgname for x in session.query(db.XToolEntry).filter_by(isAvailable=True).all()]
+
+    for package in packages:
+        db.repackSource(package, level)
+        click.echo(f"repacked {package}", file=out)
+
+@cliShell.command("install")
+@click.argument("packages", nargs=-1)
+@click.pass_context
+def cliInstall(ctx, packages):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    for package in packages:
+        db.installPackage(package)
+        click.echo(f"installed {package}", file=out)
+
+@cliShell.command("uninstall")
+@click.argument("packages", nargs=-1)
+@click.pass_context
+def cliUninstall(ctx, packages):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    for package in packages:
+        db.uninstallPackage(package)
+        click.echo(f"uninstalled {package}", file=out)
+
+@cliShell.command("export")
+@click.argument("packages", nargs=-1)
+@click.option("--target", "-t", required=True, type=CliPath(file_okay=False, resolve_path=True), help="Folder to export to.")
+@click.option("--format", "-f", "fmt", type=click.Choice(["zip", "zstd", "folder"]), default="zip", help="Export format.")
+@click.option("--workers", "-w", default=None, type=int, help="Compression thread count.")
+@click.pass_context
+def cliExport(ctx, packages, target, fmt, workers):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    for package in packages:
+        click.echo(f"exported {db.exportPackage(package, target, fmt, workers)}", file=out)
+
+@cliShell.command("backup")
+@click.argument("packages", nargs=-1)
+@click.option("--all", "backupAll", is_flag=True, help="Back up every installed package.")
+@click.option("--target", "-t", default=None, type=CliPath(file_okay=False, resolve_path=True), help="Snapshot store.")
+@click.pass_context
+def cliBackup(ctx, packages, backupAll, target):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    if backupAll:
+        packages = [x.pkgname for x in db.iterPackages(installed=True)]
+
+    for package in packages:
+        result = db.backupPackageUsrData(package, target)
+        click.echo(f"{package}: snapshot {result['snapshot']}, {result['files']} files, {result['newChunks']} new chunks ({result['newBytes']} bytes)", file=out)
+
+@cliShell.command("restore")
+@click.argument("package")
+@click.argument("files", nargs=-1)
+@click.option("--snapshot", "-s", default=None, help="Snapshot id, defaults to the latest.")
+@click.option("--target", "-t", default=None, type=CliPath(file_okay=False, resolve_path=True), help="Snapshot store.")
+@click.pass_context
+def cliRestore(ctx, package, files, snapshot, target):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    restored = db.restorePackageUsrData(package, snapshot, list(files) or None, target)
+    click.echo(f"restored {len(restored)} files", file=out)
+
+@cliShell.command("gc")
+@click.pass_context
+def cliGc(ctx):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    removed, freed = db.collectGarbage()
+    click.echo(f"removed {removed} blobs, freed {freed} bytes", file=out)
+    emptied = db.trash.reclaim()
+    db.trash.wait()
+    click.echo(f"emptied {emptied} trash entries", file=out)
+
+@cliShell.command("verify")
+@click.argument("packages", nargs=-1)
+@click.option("--all", "verifyAll", is_flag=True, help="Verify every installed package.")
+@click.option("--workers", "-w", default=None, type=int, help="Hashing thread count.")
+@click.option("--format", "-f", "fmt", type=click.Choice(["text", "jsonl"]), default="text", help="Output format.")
+@click.pass_context
+def cliVerify(ctx, packages, verifyAll, workers, fmt):
+    db : XToolDB = contextDB(ctx)
+    out = commandOutput(ctx)
+    if verifyAll:
+        reports = db.verifyAll(workers)
+    else:
+        reports = [db.verifyPackage(x) for x in packages]
+
+    for report in reports:
+        if fmt == "jsonl":
+            click.echo(json.dumps(report.toDict()), file=out)
+            continue
+
+        click.echo(f"{report.package}: {'ok' if report.ok else 'damaged'} ({report.checked} checked, {report.hashed} hashed)", file=out)
+        for label, names in (("missing", report.missing), ("modified", report.modified), ("extra", report.extra)):
+            for name in names:
+                click.echo(f"  {label} {name}", file=out)
+
+@cliShell.command("batch")
+@click.argument("script", default="-", type=CliPath(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--jobs", "-j", default=4, type=click.IntRange(min=1), help="Package operations running at the same time.")
+@click.option("--dry-run", "dryRun", is_flag=True, help="Print the plan without running it.")
+@click.pass_context
+def cliBatch(ctx, script, jobs, dryRun):
+    """
+    Runs parse, install, uninstall, update and verify commands from a file or stdin.
+
+    Consecutive commands of one kind form a phase, its package operations run
+    concurrently and its catalog writes are committed together. A JSON summary is printed.
+    """
+
+    from xtoolCli.batch import BatchRunner, planBatch, readScript
+
+    out = commandOutput(ctx)
+    with click.open_file(script) as f:
+        phases = planBatch(readScript(f, cliShell))
+
+    if dryRun:
+        click.echo(json.dumps({"phases" : [[op.toDict() for op in phase] for phase in phases]}), file=out)
+        return
+
+    summary = BatchRunner(contextDB(ctx), jobs).run(phases)
+    click.echo(json.dumps(summary), file=out)
+    if not summary["ok"]:
+        ctx.exit(1)
 
 if __name__ == '__main__':
     cliShell()
\ No newline at end of file
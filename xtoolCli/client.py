@@ -0,0 +1,288 @@
+import itertools
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import typing
+
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# sun_path is 108 bytes on linux, 104 on macos
+_MAX_SOCKET_PATH = 100
+
+SOCKET_NAME = "xtoolCli.sock"
+LOG_NAME = "xtoolCli.log"
+
+# idle seconds before an auto spawned daemon exits
+SPAWN_IDLE_TIMEOUT = 600.0
+
+class XToolDaemonError(Exception):
+    pass
+
+def defaultSocketPath(path : str) -> str:
+    """
+    the socket of the daemon serving the deployment folder path
+
+    it lives in the deployment folder, or in the temp folder when that path is too long for a socket
+    """
+
+    path = os.path.abspath(path)
+    socketPath = os.path.join(path, SOCKET_NAME)
+    if len(socketPath.encode()) <= _MAX_SOCKET_PATH:
+        return socketPath
+
+    # only needed for long paths, like subprocess for spawning they stay out of the client's startup
+    import hashlib
+    import tempfile
+
+    digest = hashlib.blake2b(path.encode(), digest_size=8).hexdigest()
+    return os.path.join(tempfile.gettempdir(), f"xtoolCli-{digest}.sock")
+
+class DaemonClient:
+    """
+    a connection to a running daemon (see xtoolCli.daemon)
+
+    call is thread safe, concurrent calls share the connection and are told apart by request id
+    """
+
+    def __init__(self, socketPath : str) -> None:
+        if not hasattr(socket, "AF_UNIX"):
+            raise XToolDaemonError("daemon mode needs unix domain sockets")
+
+        self.socketPath = socketPath
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(socketPath)
+        except OSError:
+            self._sock.close()
+            raise
+
+        self._rfile = self._sock.makefile("r", encoding="utf-8")
+        self._sendLock = threading.Lock()
+        self._ids = itertools.count(1)
+        # request id -> queue of its events
+        self._pending : typing.Dict[int, queue.Queue] = {}
+        self._pendingLock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._readEvents, name="xtool-client", daemon=True)
+        self._reader.start()
+
+    def _send(self, message : dict) -> None:
+        data = (json.dumps(message) + "\n").encode()
+        with self._sendLock:
+            self._sock.sendall(data)
+
+    def _readEvents(self) -> None:
+        try:
+            for line in self._rfile:
+                event = json.loads(line)
+                with self._pendingLock:
+                    events = self._pending.get(event.get("id"))
+                if events is not None:
+                    events.put(event)
+        except (OSError, ValueError):
+            pass
+
+        # the daemon went away, release every waiting call
+        self._closed = True
+        with self._pendingLock:
+            for events in self._pending.values():
+                events.put({"event" : "exit", "code" : 1, "error" : "lost the connection to the daemon"})
+
+    def request(self, message : dict, onOutput : typing.Callable[[str], None] = None) -> dict:
+        """
+        sends a request and waits for its exit event
+
+        Args:
+            message (dict): the request, an id is added
+            onOutput (callable, optional): called with every output line. Defaults to None.
+
+        Returns:
+            dict: the exit event
+        """
+
+        requestId = next(self._ids)
+        events = queue.Queue()
+        with self._pendingLock:
+            if self._closed:
+                raise XToolDaemonError("lost the connection to the daemon")
+            self._pending[requestId] = events
+
+        try:
+            self._send({**message, "id" : requestId})
+            while True:
+                event = events.get()
+                if event["event"] == "exit":
+                    return event
+                if event["event"] == "output" and onOutput is not None:
+                    onOutput(event["line"])
+        finally:
+            with self._pendingLock:
+                self._pending.pop(requestId, None)
+
+    def call(self, args : typing.List[str], onOutput : typing.Callable[[str], None] = None, cwd : str = None) -> typing.Tuple[int, str]:
+        """
+        runs a cli command (e.g. ["verify", "--all"]) in the daemon
+
+        Args:
+            args (list): the command and its arguments
+            onOutput (callable, optional): called with every line the command prints. Defaults to None.
+            cwd (str, optional): relative paths resolve against it. Defaults to os.getcwd().
+
+        Returns:
+            tuple: (exit code, error message or None)
+        """
+
+        event = self.request({"args" : list(args), "cwd" : cwd or os.getcwd()}, onOutput)
+        return event["code"], event.get("error")
+
+    def ping(self) -> dict:
+        return self.request({"op" : "ping"})
+
+    def shutdown(self) -> None:
+        """
+        asks the daemon to exit once the running requests are done
+        """
+
+        self.request({"op" : "shutdown"})
+
+    def close(self) -> None:
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._reader.join()
+        self._rfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def spawnDaemon(path : str, source : str = None, sourceStore : str = "archive", socketPath : str = None) -> "subprocess.Popen":
+    """
+    starts a detached daemon for the deployment folder path, its log goes to path/xtoolCli.log
+    """
+
+    import subprocess
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(x for x in (root, env.get("PYTHONPATH")) if x)
+
+    args = [
+        sys.executable, "-m", "xtoolCli.daemon",
+        "--path", os.path.abspath(path),
+        "--source-store", sourceStore,
+        "--idle-timeout", str(SPAWN_IDLE_TIMEOUT),
+    ]
+    if source is not None:
+        args += ["--source", os.path.abspath(source)]
+    if socketPath is not None:
+        args += ["--socket", socketPath]
+
+    with open(os.path.join(path, LOG_NAME), "ab") as log:
+        return subprocess.Popen(
+            args,
+            env=env,
+            cwd=root,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+def connect(
+    path : str,
+    source : str = None,
+    sourceStore : str = "archive",
+    socketPath : str = None,
+    spawn : bool = True,
+    timeout : float = 30.0,
+) -> DaemonClient:
+    """
+    connects to the daemon of the deployment folder path, starting one if none is running
+
+    Args:
+        path (str): the deployment folder
+        source (str, optional): the source folder of a spawned daemon. Defaults to None.
+        sourceStore (str, optional): the source store of a spawned daemon. Defaults to "archive".
+        socketPath (str, optional): Defaults to defaultSocketPath(path).
+        spawn (bool, optional): start a daemon if none answers. Defaults to True.
+        timeout (float, optional): seconds to wait for a spawned daemon. Defaults to 30.0.
+
+    Returns:
+        DaemonClient: the connection
+    """
+
+    socketPath = socketPath or defaultSocketPath(path)
+    try:
+        return DaemonClient(socketPath)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if not spawn:
+            raise XToolDaemonError(f"no daemon is listening on {socketPath}")
+
+    process = spawnDaemon(path, source, sourceStore, socketPath)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return DaemonClient(socketPath)
+        except (FileNotFoundError, ConnectionRefusedError):
+            pass
+
+        # another client may have won the race, then this daemon exits right away with 0
+        code = process.poll()
+        if code not in (None, 0):
+            raise XToolDaemonError(f"the daemon exited with {code}, see {os.path.join(path, LOG_NAME)}")
+        if time.monotonic() > deadline:
+            raise XToolDaemonError(f"the daemon did not start listening on {socketPath}")
+        time.sleep(0.02)
+
+def main(argv : typing.List[str] = None) -> int:
+    # argparse instead of click, importing click costs more than a round trip to the daemon,
+    # imported here as the daemon imports this module too
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="xtoolCli.client", description="Runs xtoolCli commands in a resident daemon.")
+    parser.add_argument("--path", default="./deploy/", help="Path to the deployment folder.")
+    parser.add_argument("--source", default="./source/", help="Path to the source folder.")
+    parser.add_argument("--source-store", dest="sourceStore", default="archive", choices=["archive", "blob"])
+    parser.add_argument("--socket", dest="socketPath", default=None, help="Socket of the daemon.")
+    parser.add_argument("--no-spawn", dest="spawn", action="store_false", help="Fail if no daemon is running.")
+    parser.add_argument("--stop", action="store_true", help="Stop the daemon.")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="The xtoolCli command and its arguments.")
+    options = parser.parse_args(argv)
+
+    if options.stop:
+        try:
+            client = connect(options.path, socketPath=options.socketPath, spawn=False)
+        except XToolDaemonError:
+            return 0
+        with client:
+            client.shutdown()
+        return 0
+
+    if len(options.command) == 0:
+        parser.error("a command is required")
+
+    try:
+        client = connect(options.path, options.source, options.sourceStore, options.socketPath, options.spawn)
+    except XToolDaemonError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    with client:
+        code, error = client.call(options.command, print)
+
+    if error:
+        print(error, file=sys.stderr)
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,341 @@
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+import click
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xtoolCli.client import XToolDaemonError, defaultSocketPath
+from xtool.logger import xtoolLogger
+
+# commands that only read the catalog, they share the daemon's lock with each other,
+# every other command holds it alone
+CONCURRENT_COMMANDS = ("list", "verify", "export")
+
+class _ReadWriteLock:
+    """
+    shared for readers, exclusive for writers
+
+    a waiting writer holds back new readers, a steady stream of list calls never starves an install
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waitingWriters = 0
+
+    @contextlib.contextmanager
+    def read(self) -> typing.Iterator[None]:
+        with self._condition:
+            while self._writing or self._waitingWriters:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self) -> typing.Iterator[None]:
+        with self._condition:
+            self._waitingWriters += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waitingWriters -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+class _LineStream:
+    """
+    the output stream of one request, every printed line becomes an output event
+    """
+
+    def __init__(self, send : typing.Callable[[dict], None], requestId) -> None:
+        self._send = send
+        self._id = requestId
+        self._buffer = ""
+
+    def write(self, data : str) -> int:
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._send({"id" : self._id, "event" : "output", "line" : line})
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        if self._buffer:
+            self._send({"id" : self._id, "event" : "output", "line" : self._buffer})
+            self._buffer = ""
+
+class _Connection(socketserver.StreamRequestHandler):
+    server : "_Server"
+
+    def setup(self) -> None:
+        super().setup()
+        self._writeLock = threading.Lock()
+        self._open = True
+
+    def send(self, message : dict) -> None:
+        data = (json.dumps(message) + "\n").encode()
+        with self._writeLock:
+            if not self._open:
+                return
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except (OSError, ValueError):
+                # the client is gone, the request still runs to completion
+                self._open = False
+
+    def handle(self) -> None:
+        daemon = self.server.daemon
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self.send({"id" : None, "event" : "exit", "code" : 2, "error" : "malformed request"})
+                continue
+
+            daemon.submit(request, self.send)
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socketPath : str, daemon : "XToolDaemon") -> None:
+        self.daemon = daemon
+        super().__init__(socketPath, _Connection)
+
+class XToolDaemon:
+    """
+    keeps one XToolDB warm and runs cli commands for clients over a unix domain socket
+
+    the protocol is one json object per line in both directions:
+
+        request  {"id" : 1, "args" : ["verify", "--all"], "cwd" : "/home/me"}
+        events   {"id" : 1, "event" : "output", "line" : "app: ok (12 checked, 0 hashed)"}
+                 {"id" : 1, "event" : "exit", "code" : 0, "error" : null}
+
+    every printed line is streamed as it is written, requests of a connection run
+    concurrently and are told apart by id, {"op" : "ping"} and {"op" : "shutdown"}
+    are answered by the daemon itself
+    """
+
+    def __init__(self, db, socketPath : str, workers : int = 8, idleTimeout : float = 0.0) -> None:
+        """
+        Args:
+            db (XToolDB): the database commands run against
+            socketPath (str): the socket to listen on
+            workers (int, optional): requests running at the same time. Defaults to 8.
+            idleTimeout (float, optional): seconds without requests before serve returns, 0 never. Defaults to 0.0.
+        """
+
+        self.db = db
+        self.socketPath = socketPath
+        self.idleTimeout = idleTimeout
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="xtool-daemon")
+        self._catalogLock = _ReadWriteLock()
+        self._stop = threading.Event()
+        self._active = 0
+        self._activeLock = threading.Lock()
+        self._lastActivity = time.monotonic()
+        # set once the socket accepts connections
+        self.ready = threading.Event()
+
+    def submit(self, request : dict, send : typing.Callable[[dict], None]) -> None:
+        with self._activeLock:
+            self._active += 1
+            self._lastActivity = time.monotonic()
+        self._executor.submit(self._handle, request, send)
+
+    def _handle(self, request : dict, send : typing.Callable[[dict], None]) -> None:
+        requestId = request.get("id")
+        try:
+            op = request.get("op", "call")
+            if op == "ping":
+                send({"id" : requestId, "event" : "exit", "code" : 0, "error" : None, "pid" : os.getpid()})
+            elif op == "shutdown":
+                self._stop.set()
+                send({"id" : requestId, "event" : "exit", "code" : 0, "error" : None})
+            elif op == "call":
+                code, error = self.runCommand(request.get("args") or [], request.get("cwd"), send, requestId)
+                send({"id" : requestId, "event" : "exit", "code" : code, "error" : error})
+            else:
+                send({"id" : requestId, "event" : "exit", "code" : 2, "error" : f"unknown op {op}"})
+        finally:
+            with self._activeLock:
+                self._active -= 1
+                self._lastActivity = time.monotonic()
+
+    def runCommand(
+        self,
+        args : typing.List[str],
+        cwd : typing.Optional[str],
+        send : typing.Callable[[dict], None],
+        requestId = None,
+    ) -> typing.Tuple[int, typing.Optional[str]]:
+        """
+        runs one cli command against the warm db, streaming what it prints
+
+        Returns:
+            tuple: (exit code, error message or None)
+        """
+
+        from xtoolCli.cli import OUTPUT_META, cliShell, requestCwd
+
+        if len(args) == 0:
+            return 2, "missing command"
+
+        name = args[0]
+        command = cliShell.get_command(None, name)
+        if command is None:
+            return 2, f"no such command {name}"
+        if name == "rescan" and "--watch" in args:
+            return 2, "rescan --watch runs until interrupted, use it from the shell"
+
+        # commands print to ctx.meta[OUTPUT_META], click's own help and errors are sent back here too
+        stream = _LineStream(send, requestId)
+        lock = self._catalogLock.read() if name in CONCURRENT_COMMANDS else self._catalogLock.write()
+        requestCwd.path = cwd
+        try:
+            if "--help" in args[1:]:
+                with click.Context(command, info_name=name) as ctx:
+                    click.echo(command.get_help(ctx), file=stream)
+                return 0, None
+
+            with command.make_context(name, list(args[1:]), obj=self.db) as ctx:
+                ctx.meta[OUTPUT_META] = stream
+                with lock:
+                    code = command.invoke(ctx)
+            return (code if isinstance(code, int) else 0), None
+        except click.exceptions.Exit as e:
+            return e.exit_code, None
+        except click.ClickException as e:
+            return e.exit_code, e.format_message()
+        except click.Abort:
+            return 1, "aborted"
+        except Exception as e:
+            xtoolLogger.exception(f"daemon command {args} failed")
+            return 1, str(e) or type(e).__name__
+        finally:
+            stream.close()
+            requestCwd.path = None
+
+    def _idle(self) -> bool:
+        if self.idleTimeout <= 0:
+            return False
+        with self._activeLock:
+            return self._active == 0 and time.monotonic() - self._lastActivity > self.idleTimeout
+
+    def serve(self, pollInterval : float = 0.2) -> None:
+        """
+        listens until a shutdown request or the idle timeout
+
+        only one daemon serves a socket, a second one raises XToolDaemonError
+        """
+
+        if not hasattr(socket, "AF_UNIX"):
+            raise XToolDaemonError("daemon mode needs unix domain sockets")
+
+        lockFile = open(self.socketPath + ".lock", "w")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    raise XToolDaemonError(f"a daemon already serves {self.socketPath}")
+
+            # a socket left by a daemon that was killed
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+
+            # the socket is created owner only, there is no window before a chmod
+            umask = os.umask(0o077)
+            try:
+                server = _Server(self.socketPath, self)
+            finally:
+                os.umask(umask)
+            server.timeout = pollInterval
+            self.ready.set()
+
+            try:
+                while not self._stop.is_set() and not self._idle():
+                    server.handle_request()
+            finally:
+                server.server_close()
+                os.remove(self.socketPath)
+                self._executor.shutdown(wait=True)
+        finally:
+            lockFile.close()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+
+@click.command()
+@click.option(
+    '--path',
+    default="./deploy/",
+    help="Path to the deployment folder.",
+    type=click.Path(exists=True, resolve_path=True)
+)
+@click.option(
+    '--source',
+    default="./source/",
+    help="Path to the source folder.",
+    type=click.Path(file_okay=False, dir_okay=True, resolve_path=True)
+)
+@click.option(
+    '--source-store',
+    "sourceStore",
+    default="archive",
+    help="How sources are stored, blob deduplicates files across packages.",
+    type=click.Choice(["archive", "blob"]),
+)
+@click.option("--socket", "socketPath", default=None, help="Socket to listen on, defaults to the deployment folder.")
+@click.option("--workers", "-w", default=8, help="Requests running at the same time.")
+@click.option("--idle-timeout", "idleTimeout", default=0.0, help="Exit after this many idle seconds, 0 never.")
+def daemonMain(path, source, sourceStore, socketPath, workers, idleTimeout):
+    from xtoolCli.cli import openDB
+
+    socketPath = socketPath or defaultSocketPath(path)
+    db = openDB(path, source, sourceStore)
+    try:
+        XToolDaemon(db, socketPath, workers, idleTimeout).serve()
+    except XToolDaemonError as e:
+        # lost the race against another client spawning a daemon
+        print(e)
+    finally:
+        if db.hookExecutor is not None:
+            db.hookExecutor.shutdown()
+        db.trash.close()
+        db.engine.dispose()
+
+if __name__ == '__main__':
+    daemonMain()
@@ -1 +1,6 @@
-from xtool_ext.shortcuts import XToolShortcuts
\ No newline at end of file
+from xtool.utils.misc import lazyModule
+
+# XToolShortcuts needs win32com
+lazyModule(__name__, {
+    "XToolShortcuts" : "xtool_ext.shortcuts",
+})
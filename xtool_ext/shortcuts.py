@@ -1,20 +1,34 @@
 import logging
 from xtool.entry import XToolEntry
-from xtool.ext import XToolExtension
-from fuzzywuzzy.fuzz import ratio
+from xtool.ext import FILESYSTEM, READS_CONFIG, WRITES_CONFIG, XToolExtension
 import os
-from win32com.client import Dispatch
 from xtool.interface import XToolDBMockInterface, XToolManageInterface
 
 class XToolShortcuts(XToolExtension):
+    VERSION = "1"
+    # the executable search only depends on the package content
+    MEMOIZE = {
+        "parseSource" : ("config",),
+        "updatePackage" : ("config",),
+    }
+    SCOPE = {
+        "parseSource" : (WRITES_CONFIG,),
+        "updatePackage" : (WRITES_CONFIG,),
+        # only touches its own .lnk files
+        "installPackage" : (READS_CONFIG, FILESYSTEM),
+        "uninstallPackage" : (READS_CONFIG, FILESYSTEM),
+    }
+
+    # the WScript.Shell dispatch, created on the first shortcut
+    dispatchShell = None
+
     @classmethod
-    def initCls(cls):
-        
-        super().initCls()
+    def _shell(cls):
+        if cls.dispatchShell is None:
+            from win32com.client import Dispatch
+            cls.dispatchShell = Dispatch("WScript.Shell")
+        return cls.dispatchShell
 
-        # initialize dispatch shell
-        cls.dispatchShell = Dispatch("WScript.Shell")
-        
     def __init__(self, parent: XToolManageInterface) -> None:
         super().__init__(parent)
 
@@ -39,6 +53,8 @@ class XToolShortcuts(XToolExtension):
             str: the path to the executable file, or None if no executable file was found.
         """
 
+        from fuzzywuzzy.fuzz import ratio
+
         potentiallyExecutable = (
             lambda name : "." not in name or any(name.endswith(ext) for ext in [".py", ".bat", ".exe", ".sh"])
         )
@@ -77,6 +93,10 @@ class XToolShortcuts(XToolExtension):
             if aPossibleExe is not None:
                 ctx.config["shortcuts"][ctx.mfd.pkgName] = aPossibleExe
 
+    def updatePackage(self, source: str) -> None:
+        # the new config comes straight from xtool.json, resolve the shortcuts again
+        self.parseSource(source)
+
     def _createShortcut(self, name: str, file : str) -> None:
         """
         Creates a shortcut in the shortcuts folder.
@@ -85,7 +105,7 @@ class XToolShortcuts(XToolExtension):
             name (str): the name of the shortcut
             file (str): the path to the file to create the shortcut for
         """
-        shortcut = self.dispatchShell.CreateShortCut(os.path.join(self.shortcutsFolder, name + ".lnk"))
+        shortcut = self._shell().CreateShortCut(os.path.join(self.shortcutsFolder, name + ".lnk"))
         shortcut.TargetPath = file
         shortcut.save()
         
@@ -97,4 +117,12 @@ class XToolShortcuts(XToolExtension):
             return
 
         for name, file in pkgObj.config["shortcuts"].items():
-            self._createShortcut(name, os.path.join(self._parent._targetPath, package, file))
\ No newline at end of file
+            self._createShortcut(name, os.path.join(self._parent._targetPath, package, file))
+
+    def uninstallPackage(self, package: str) -> None:
+        pkgObj : XToolEntry = self.extensionContext.pkgObj
+
+        for name in (pkgObj.config.get("shortcuts", None) or {}):
+            path = os.path.join(self.shortcutsFolder, name + ".lnk")
+            if os.path.exists(path):
+                os.remove(path)